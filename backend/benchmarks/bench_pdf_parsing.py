@@ -0,0 +1,141 @@
+"""Benchmark PDF parsing + chunking on a synthetic 1,000-page PDF.
+
+Compares the original whole-document path (``text +=`` per page, then
+slicing the full string) with the streaming, page-parallel parser.
+Each mode runs in a fresh interpreter with the same modules imported, so
+peak RSS, and its growth over that baseline, is measured separately.
+
+Usage (from backend/):
+    python benchmarks/bench_pdf_parsing.py [--pages 1000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LINE = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor."
+LINES_PER_PAGE = 45
+
+
+def write_synthetic_pdf(path: str, pages: int):
+    """Write a text-only PDF with one Helvetica content stream per page."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs = []
+    for page in range(pages):
+        lines = [f"BT /F1 9 Tf 40 {800 - 16 * i} Td (Page {page + 1} line {i + 1}: {LINE}) Tj ET"
+                 for i in range(LINES_PER_PAGE)]
+        stream = "\n".join(lines).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def run_before(path: str) -> int:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    text = ""
+    for page in reader.pages:
+        page_text = page.extract_text()
+        if page_text:
+            text += page_text + "\n"
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        chunk = text[start:start + 500]
+        if chunk.strip():
+            chunks.append(chunk.strip())
+        start += 450
+    return len(chunks)
+
+
+def run_after(path: str) -> int:
+    from services.document_parser import iter_pdf_pages, iter_chunks
+
+    return sum(1 for _ in iter_chunks(iter_pdf_pages(path)))
+
+
+def measure(mode: str, path: str):
+    import services.document_parser  # noqa: F401  same imports in both modes
+
+    runner = run_before if mode == "before" else run_after
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    chunk_count = runner(path)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux; workers are reported as children
+    rss_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    print(json.dumps({
+        "chunks": chunk_count,
+        "seconds": elapsed,
+        "peak_rss_mb": rss_self / 1024,
+        "rss_growth_mb": (rss_self - baseline) / 1024,
+        "peak_worker_rss_mb": rss_children / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per mode; the median time is shown")
+    parser.add_argument("--mode", choices=["before", "after"])
+    parser.add_argument("--pdf")
+    args = parser.parse_args()
+
+    if args.mode:
+        measure(args.mode, args.pdf)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pdf")
+        write_synthetic_pdf(path, args.pages)
+        print(f"{args.pages} pages, {os.path.getsize(path) / 1e6:.1f} MB")
+        for mode in ("before", "after"):
+            results = []
+            for _ in range(args.repeat):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--mode", mode, "--pdf", path],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                results.append(json.loads(output.strip().splitlines()[-1]))
+            result = max(results, key=lambda r: r["peak_rss_mb"])
+            print(
+                f"{mode:>6}: {statistics.median(r['seconds'] for r in results):.2f}s median "
+                f"of {args.repeat}, {result['chunks']} chunks, "
+                f"peak RSS {result['peak_rss_mb']:.0f} MB (+{result['rss_growth_mb']:.1f} MB while parsing, "
+                f"workers {result['peak_worker_rss_mb']:.0f} MB)"
+            )
+
+if __name__ == "__main__":
+    main()
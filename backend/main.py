@@ -1,11 +1,30 @@
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 load_dotenv()
+# Show the app's own INFO logs without configuring the root logger, which
+# belongs to uvicorn or to the deployer's logging config
+for _name in ("services", "routers"):
+    _app_logger = logging.getLogger(_name)
+    _app_logger.setLevel(logging.INFO)
+    if not logging.getLogger().handlers and not _app_logger.handlers:
+        _handler = logging.StreamHandler()
+        _handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        _app_logger.addHandler(_handler)
 
-from models.database import init_db
+from models.database import init_db, close_db
 from routers import chatbots, chat, documents, actions, settings
+from services.llm.factory import close_llm_providers
+from services.metrics import get_metrics
+from services.llm.limiter import get_limiter_stats
+from services.llm.failover import get_breaker_stats
+from services.ingestion_service import resume_pending_jobs, shutdown_ingestion
+from services.write_behind import start_write_behind, stop_write_behind
+from services.retrieval import REMOTE as RETRIEVAL_REMOTE
+from services.rag_service import save_keyword_indexes
 
 app = FastAPI(title="Chatbot Builder API", version="1.0.0")
 
@@ -26,9 +45,29 @@ app.include_router(settings.router, prefix="/api/settings", tags=["settings"])
 
 @app.on_event("startup")
 async def startup():
-    init_db()
+    if not RETRIEVAL_REMOTE:
+        init_db()
+        resume_pending_jobs()
+    # else the retrieval server has migrated the schema and owns ingestion
+    start_write_behind()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    shutdown_ingestion()
+    await asyncio.to_thread(save_keyword_indexes)
+    await close_llm_providers()
+    # Queued conversation rows are committed before the pools close
+    await asyncio.to_thread(stop_write_behind)
+    await close_db()
 
 
 @app.get("/api/health")
 async def health_check():
     return {"success": True, "data": None, "message": "Server is running"}
+
+
+@app.get("/api/metrics")
+async def metrics():
+    data = {**get_metrics(), "llm_limiters": get_limiter_stats(), "llm_breakers": get_breaker_stats()}
+    return {"success": True, "data": data, "message": "Metrics retrieved"}
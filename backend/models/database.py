@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import and_, cast, create_engine, event, exists, func, inspect, literal, select, text, Index, UniqueConstraint, Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, JSON
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -7,8 +10,86 @@ import uuid
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./chatbot_builder.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Connection pool settings, applied to both engines
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a pooled connection
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))  # seconds; SQLite: lock wait
+
+# SQLite pragmas applied to every new connection of a file database
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is durable across crashes in WAL mode
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", str(int(DB_CONNECT_TIMEOUT * 1000))))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # page cache per connection
+
+# Async drivers used for the async engine, by database backend
+_ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def _async_database_url(url: str):
+    """Derive the async-driver URL from DATABASE_URL (e.g. sqlite:// -> sqlite+aiosqlite://)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"Unsupported database for the async engine: {backend}")
+    return parsed.set(drivername=f"{backend}+{_ASYNC_DRIVERS[backend]}")
+
+
+def _engine_options(url) -> dict:
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False, "timeout": DB_CONNECT_TIMEOUT}}
+        if url.database in (None, "", ":memory:"):
+            # In-memory databases live in a single connection
+            return options
+        if url.get_driver_name() == "aiosqlite":
+            # aiosqlite defaults to opening a connection per checkout
+            options["poolclass"] = AsyncAdaptedQueuePool
+    elif url.get_backend_name() == "postgresql" and url.get_driver_name() == "asyncpg":
+        options = {"connect_args": {"timeout": DB_CONNECT_TIMEOUT}}
+    else:
+        options = {"connect_args": {"connect_timeout": int(DB_CONNECT_TIMEOUT)}}
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_pre_ping=url.get_backend_name() != "sqlite",
+    )
+    return options
+
+
+def _is_sqlite_file(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        # Negative values are in KiB rather than pages
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    finally:
+        cursor.close()
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(make_url(DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Async engine for request handlers that run on the event loop (chat routes)
+ASYNC_DATABASE_URL = _async_database_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+IS_SQLITE = _is_sqlite_file(ASYNC_DATABASE_URL)
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 Base = declarative_base()
 
 
@@ -23,13 +104,34 @@ class Chatbot(Base):
     llm_provider = Column(String, default="claude")
     llm_model = Column(String, default="claude-sonnet-4-5-20250929")
     api_key = Column(String, default="")
+    # [{"provider", "model"}, ...] tried after llm_provider when it is slow or failing
+    # None is stored as SQL NULL (not JSON 'null') so IS NOT NULL finds chains
+    fallback_providers = Column(JSON(none_as_null=True), nullable=True)
     is_active = Column(Boolean, default=True)
     share_token = Column(String, unique=True, index=True, default=lambda: str(uuid.uuid4()))
+    answer_cache_enabled = Column(Boolean, default=False)
+    answer_cache_threshold = Column(Float, default=0.92)  # min cosine similarity for a cache hit
+    chunk_strategy = Column(String, default="structured")  # structured, fixed
+    chunk_max_tokens = Column(Integer, default=256)
+    chunk_overlap_tokens = Column(Integer, default=32)
+    prompt_token_budget = Column(Integer, default=6000)  # input tokens per LLM call
+    config_version = Column(Integer, default=1)  # bumped on every change to settings, actions or keys
+    # Denormalized counters, updated in the transactions that add or remove the rows
+    document_count = Column(Integer, default=0)
+    action_count = Column(Integer, default=0)
+    total_chunks = Column(Integer, default=0)
+    conversation_count = Column(Integer, default=0)  # conversation rows (messages)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     documents = relationship("Document", back_populates="chatbot", cascade="all, delete-orphan")
     actions = relationship("Action", back_populates="chatbot", cascade="all, delete-orphan")
     conversations = relationship("Conversation", back_populates="chatbot", cascade="all, delete-orphan")
+    sessions = relationship("ChatSession", back_populates="chatbot", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Serves the chatbot listing, newest first
+        Index("ix_chatbots_created", "created_at", "id"),
+    )
 
 
 class Document(Base):
@@ -57,6 +159,7 @@ class Action(Base):
     description = Column(String, default="")
     config = Column(JSON, default={})  # action-specific configuration
     is_active = Column(Boolean, default=True)
+    is_deterministic = Column(Boolean, default=False)  # fire on a keyword match without the LLM
     created_at = Column(DateTime, default=datetime.utcnow)
 
     chatbot = relationship("Chatbot", back_populates="actions")
@@ -75,6 +178,33 @@ class Conversation(Base):
 
     chatbot = relationship("Chatbot", back_populates="conversations")
 
+    __table_args__ = (
+        # Serves the per-session history lookups (latest N turns of a session)
+        Index("ix_conversations_chatbot_session_created", "chatbot_id", "session_id", "created_at"),
+    )
+
+
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    chatbot_id = Column(Integer, ForeignKey("chatbots.id"), nullable=False)
+    session_id = Column(String, nullable=False)
+    summary = Column(Text, default="")  # rolling summary of turns no longer sent verbatim
+    summary_until = Column(DateTime, nullable=True)  # created_at of the last summarized message
+    message_count = Column(Integer, default=0)  # maintained with every saved turn
+    last_activity = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("chatbot_id", "session_id", name="uq_chat_sessions_chatbot_session"),
+        # Serves the session listing, most recently active first
+        Index("ix_chat_sessions_chatbot_activity", "chatbot_id", "last_activity", "id"),
+    )
+
+    chatbot = relationship("Chatbot", back_populates="sessions")
+
 
 class ActionSubmission(Base):
     __tablename__ = "action_submissions"
@@ -87,6 +217,29 @@ class ActionSubmission(Base):
     status = Column(String, default="submitted")  # submitted, processing, completed
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Serves the submission listing, newest first
+        Index("ix_action_submissions_chatbot_created", "chatbot_id", "created_at", "id"),
+    )
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    chatbot_id = Column(Integer, ForeignKey("chatbots.id"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
+    filename = Column(String, nullable=False)
+    file_type = Column(String)
+    file_path = Column(String, nullable=False)
+    file_size = Column(Integer, default=0)
+    status = Column(String, default="queued")  # queued, running, completed, failed
+    stage = Column(String, default="queued")  # queued, parsing, embedding, done
+    progress = Column(Float, default=0.0)  # percent done
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 class ApiKeySetting(Base):
     __tablename__ = "api_key_settings"
@@ -105,5 +258,122 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def close_db():
+    """Close pooled async connections on shutdown."""
+    await async_engine.dispose()
+
+
+def _add_missing_columns():
+    """Add columns introduced after a table was created; create_all skips existing tables.
+
+    Returns the added columns as (table, column) pairs.
+    """
+    added = []
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    default = literal(column.default.arg, type_=column.type).compile(
+                        dialect=engine.dialect, compile_kwargs={"literal_binds": True}
+                    )
+                    ddl += f" DEFAULT {default}"
+                conn.execute(text(ddl))
+                added.append((table.name, column.name))
+    return added
+
+
+def _create_missing_indexes():
+    """Create indexes declared after their table already existed."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def _backfill_chat_sessions():
+    """Derive message_count and last_activity of sessions from their conversations."""
+    conversations = Conversation.__table__
+    sessions = ChatSession.__table__
+    same_session = and_(
+        conversations.c.chatbot_id == sessions.c.chatbot_id,
+        conversations.c.session_id == sessions.c.session_id,
+    )
+    with engine.begin() as conn:
+        conn.execute(
+            sessions.update().values(
+                message_count=select(func.count()).where(same_session).scalar_subquery(),
+                last_activity=func.coalesce(
+                    select(func.max(conversations.c.created_at)).where(same_session).scalar_subquery(),
+                    sessions.c.created_at,
+                ),
+            )
+        )
+        # Sessions from before chat_sessions existed
+        missing = (
+            select(
+                conversations.c.chatbot_id,
+                conversations.c.session_id,
+                literal(""),
+                func.count(),
+                func.max(conversations.c.created_at),
+                func.min(conversations.c.created_at),
+                func.max(conversations.c.created_at),
+            )
+            .where(~exists().where(same_session))
+            .group_by(conversations.c.chatbot_id, conversations.c.session_id)
+        )
+        conn.execute(sessions.insert().from_select(
+            ["chatbot_id", "session_id", "summary", "message_count", "last_activity", "created_at", "updated_at"],
+            missing,
+        ))
+
+
+def _backfill_chatbot_counters():
+    """Compute the denormalized counters of every chatbot from its rows."""
+    chatbots = Chatbot.__table__
+
+    def count(table, column=None):
+        value = func.coalesce(func.sum(table.c[column]), 0) if column else func.count()
+        return select(value).where(table.c.chatbot_id == chatbots.c.id).scalar_subquery()
+
+    with engine.begin() as conn:
+        conn.execute(chatbots.update().values(
+            document_count=count(Document.__table__),
+            action_count=count(Action.__table__),
+            total_chunks=count(Document.__table__, "chunk_count"),
+            conversation_count=count(Conversation.__table__),
+        ))
+
+
+def _clear_json_null_fallbacks():
+    """Turn fallback chains stored as JSON 'null' by older versions into SQL NULL."""
+    chatbots = Chatbot.__table__
+    with engine.begin() as conn:
+        conn.execute(
+            chatbots.update()
+            .where(cast(chatbots.c.fallback_providers, String) == "null")
+            .values(fallback_providers=None)
+        )
+
+
 def init_db():
+    existing_tables = set(inspect(engine).get_table_names())
     Base.metadata.create_all(bind=engine)
+    added = _add_missing_columns()
+    _create_missing_indexes()
+    if "chat_sessions" not in existing_tables or ("chat_sessions", "message_count") in added:
+        _backfill_chat_sessions()
+    if ("chatbots", "document_count") in added:
+        _backfill_chatbot_counters()
+    _clear_json_null_fallbacks()
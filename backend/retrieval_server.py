@@ -0,0 +1,143 @@
+"""Retrieval and ingestion server for the multi-worker deployment.
+
+Owns Chroma, the keyword indexes and the embedding model, runs ingestion
+jobs and the schema migration, and serves the API workers over the Unix
+socket named by RETRIEVAL_SOCKET (see services/retrieval_protocol.py).
+Concurrent searches from all workers are embedded in batches.
+
+Usage (from backend/):
+    RETRIEVAL_SOCKET=/tmp/retrieval.sock python retrieval_server.py
+"""
+import asyncio
+import logging
+import os
+import signal
+
+from dotenv import load_dotenv
+
+load_dotenv()
+logging.basicConfig(level=logging.INFO)
+# This process serves the index itself rather than forwarding to the socket
+os.environ["RETRIEVAL_SERVER"] = "1"
+
+from models.database import init_db
+from services import rag_service
+from services import retrieval_protocol as protocol
+from services.ingestion_service import submit_ingestion_job, resume_pending_jobs, shutdown_ingestion
+
+logger = logging.getLogger("retrieval_server")
+
+RETRIEVAL_SOCKET = os.getenv("RETRIEVAL_SOCKET", "/tmp/chatbot-retrieval.sock")
+# Searches arriving within this window are embedded together
+BATCH_WINDOW = float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "2")) / 1000
+BATCH_MAX = int(os.getenv("RETRIEVAL_BATCH_MAX", "64"))
+# Batches searched at the same time
+BATCH_WORKERS = int(os.getenv("RETRIEVAL_BATCH_WORKERS", "2"))
+
+
+async def _batch_searches(queue: asyncio.Queue):
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + BATCH_WINDOW
+        while len(batch) < BATCH_MAX:
+            remaining = deadline - loop.time()
+            try:
+                batch.append(queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(queue.get(), remaining))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+
+        try:
+            results = await asyncio.to_thread(rag_service.search_batch, [request for request, _ in batch])
+        except Exception as e:
+            results = [e] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+async def _handle(op: int, payload: bytes, searches: asyncio.Queue) -> bytes:
+    if op == protocol.OP_SEARCH:
+        future = asyncio.get_running_loop().create_future()
+        await searches.put((protocol.decode_search_request(payload), future))
+        chunks, embedding = await future
+        return protocol.encode_search_response(chunks, embedding)
+    if op == protocol.OP_DELETE_DOCUMENT:
+        chatbot_id, document_id = protocol.decode_ids(payload)
+        await asyncio.to_thread(rag_service.delete_document_from_vectordb, chatbot_id, document_id)
+        return b""
+    if op == protocol.OP_DELETE_COLLECTION:
+        (chatbot_id,) = protocol.decode_ids(payload)
+        await asyncio.to_thread(rag_service.delete_chatbot_collection, chatbot_id)
+        return b""
+    if op == protocol.OP_INGEST:
+        submit_ingestion_job(protocol.decode_string(payload))
+        return b""
+    raise ValueError(f"Unknown op {op}")
+
+
+async def _serve_connection(reader, writer, searches: asyncio.Queue):
+    async def respond(request_id: int, op: int, payload: bytes):
+        try:
+            response = protocol.frame(request_id, op, await _handle(op, payload, searches))
+        except Exception as e:
+            logger.warning("Request %d (op %d) failed: %s", request_id, op, e)
+            response = protocol.frame(request_id, op, str(e).encode("utf-8"), protocol.STATUS_ERROR)
+        if not writer.is_closing():
+            writer.write(response)
+
+    tasks = set()
+    try:
+        while True:
+            request_id, op, _, payload = await protocol.read_frame(reader)
+            # Requests on one connection are served concurrently and answered out of order
+            task = asyncio.create_task(respond(request_id, op, payload))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except asyncio.IncompleteReadError:
+        pass
+    except Exception as e:
+        logger.warning("Closing worker connection: %s", e)
+    finally:
+        for task in tasks:
+            task.cancel()
+        writer.close()
+
+
+async def main():
+    init_db()
+    resume_pending_jobs()
+
+    searches = asyncio.Queue()
+    batchers = [asyncio.create_task(_batch_searches(searches)) for _ in range(BATCH_WORKERS)]
+
+    if os.path.exists(RETRIEVAL_SOCKET):
+        os.remove(RETRIEVAL_SOCKET)
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: _serve_connection(reader, writer, searches),
+        path=RETRIEVAL_SOCKET,
+    )
+    logger.info("Retrieval server listening on %s", RETRIEVAL_SOCKET)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    server.close()
+    await server.wait_closed()
+    for task in batchers:
+        task.cancel()
+    shutdown_ingestion()
+    await asyncio.to_thread(rag_service.save_keyword_indexes)
+    if os.path.exists(RETRIEVAL_SOCKET):
+        os.remove(RETRIEVAL_SOCKET)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
 from models.database import get_db, Action, ActionSubmission, Chatbot
+from services.answer_cache import invalidate_answer_cache
+from services.action_matcher import DETERMINISTIC_ACTION_TYPES
+from services.chatbot_config import bump_config_version, invalidate_chatbot_config
+from services.chatbot_counters import bump_chatbot_counters
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, after_cursor, split_page
 
 router = APIRouter()
 
@@ -15,6 +20,7 @@ class ActionCreate(BaseModel):
     description: Optional[str] = ""
     config: Optional[dict] = {}
     is_active: Optional[bool] = True
+    is_deterministic: Optional[bool] = False
 
 
 class ActionUpdate(BaseModel):
@@ -24,6 +30,15 @@ class ActionUpdate(BaseModel):
     description: Optional[str] = None
     config: Optional[dict] = None
     is_active: Optional[bool] = None
+    is_deterministic: Optional[bool] = None
+
+
+def _validate_deterministic(action_type: str, is_deterministic: bool):
+    if is_deterministic and action_type not in DETERMINISTIC_ACTION_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Only {', '.join(DETERMINISTIC_ACTION_TYPES)} actions can be deterministic",
+        )
 
 
 class ActionSubmissionCreate(BaseModel):
@@ -52,6 +67,7 @@ def list_actions(chatbot_id: int, db: Session = Depends(get_db)):
                 "description": a.description,
                 "config": a.config,
                 "is_active": a.is_active,
+                "is_deterministic": a.is_deterministic,
             }
             for a in actions
         ],
@@ -64,6 +80,7 @@ def create_action(data: ActionCreate, db: Session = Depends(get_db)):
     chatbot = db.query(Chatbot).filter(Chatbot.id == data.chatbot_id).first()
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
+    _validate_deterministic(data.action_type, data.is_deterministic)
 
     action = Action(
         chatbot_id=data.chatbot_id,
@@ -73,10 +90,15 @@ def create_action(data: ActionCreate, db: Session = Depends(get_db)):
         description=data.description,
         config=data.config,
         is_active=data.is_active,
+        is_deterministic=data.is_deterministic,
     )
     db.add(action)
+    bump_config_version(db, chatbot_id=data.chatbot_id)
+    bump_chatbot_counters(db, data.chatbot_id, action_count=1)
     db.commit()
     db.refresh(action)
+    invalidate_answer_cache(action.chatbot_id)
+    invalidate_chatbot_config(action.chatbot_id)
     return {
         "success": True,
         "data": {"id": action.id, "name": action.name},
@@ -91,11 +113,18 @@ def update_action(action_id: int, data: ActionUpdate, db: Session = Depends(get_
         raise HTTPException(status_code=404, detail="Action not found")
 
     update_data = data.model_dump(exclude_unset=True)
+    _validate_deterministic(
+        update_data.get("action_type", action.action_type),
+        update_data.get("is_deterministic", action.is_deterministic),
+    )
     for key, value in update_data.items():
         setattr(action, key, value)
 
+    bump_config_version(db, chatbot_id=action.chatbot_id)
     db.commit()
     db.refresh(action)
+    invalidate_answer_cache(action.chatbot_id)
+    invalidate_chatbot_config(action.chatbot_id)
     return {
         "success": True,
         "data": {"id": action.id, "name": action.name},
@@ -110,7 +139,11 @@ def delete_action(action_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Action not found")
 
     db.delete(action)
+    bump_config_version(db, chatbot_id=action.chatbot_id)
+    bump_chatbot_counters(db, action.chatbot_id, action_count=-1)
     db.commit()
+    invalidate_answer_cache(action.chatbot_id)
+    invalidate_chatbot_config(action.chatbot_id)
     return {
         "success": True,
         "data": None,
@@ -146,12 +179,27 @@ def submit_action(data: ActionSubmissionCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/submissions/{chatbot_id}")
-def list_submissions(chatbot_id: int, db: Session = Depends(get_db)):
-    submissions = (
+def list_submissions(
+    chatbot_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    query = (
         db.query(ActionSubmission)
         .filter(ActionSubmission.chatbot_id == chatbot_id)
-        .order_by(ActionSubmission.created_at.desc())
-        .all()
+        .order_by(ActionSubmission.created_at.desc(), ActionSubmission.id.desc())
+    )
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(
+            after_cursor([ActionSubmission.created_at, ActionSubmission.id], position, descending=True)
+        )
+    submissions, next_cursor = split_page(
+        query.limit(limit + 1).all(), limit, lambda s: (s.created_at, s.id)
     )
     return {
         "success": True,
@@ -166,5 +214,6 @@ def list_submissions(chatbot_id: int, db: Session = Depends(get_db)):
             }
             for s in submissions
         ],
+        "next_cursor": next_cursor,
         "message": "Submissions retrieved successfully",
     }
@@ -1,14 +1,33 @@
+import asyncio
+import json
+import logging
 import uuid
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional
-from models.database import get_db, Conversation
-from services.chat_service import process_chat
+from models.database import get_async_db, Conversation, ChatSession
+from services.chat_service import process_chat, stream_chat
+from services.llm.limiter import LLMOverloaded
+from services.write_behind import wait_for_writes
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, after_cursor, split_page
+from services import metrics
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+async def _wait_for_queued_turns(page: str):
+    """Let queued conversation rows reach the table before a page is read."""
+    if not await asyncio.to_thread(wait_for_writes):
+        # The page is served anyway; it may miss the newest messages
+        metrics.incr("write_behind.stale_reads")
+        logger.warning("Serving %s before queued messages were written", page)
+
+
 class ChatRequest(BaseModel):
     chatbot_id: int
     message: str
@@ -16,7 +35,7 @@ class ChatRequest(BaseModel):
 
 
 @router.post("")
-async def send_message(data: ChatRequest, db: Session = Depends(get_db)):
+async def send_message(data: ChatRequest, db: AsyncSession = Depends(get_async_db)):
     session_id = data.session_id or str(uuid.uuid4())
 
     try:
@@ -33,20 +52,83 @@ async def send_message(data: ChatRequest, db: Session = Depends(get_db)):
         }
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
+
+
+@router.post("/stream")
+async def stream_message(data: ChatRequest, db: AsyncSession = Depends(get_async_db)):
+    """Stream the reply as Server-Sent Events.
+
+    Emits ``delta`` events with visible text, then a single ``done`` event
+    with the final response and action, or an ``error`` event on failure.
+    The first event is awaited before the response starts: it waits for a
+    provider slot, so an overloaded provider is still answered with a 503.
+    """
+    session_id = data.session_id or str(uuid.uuid4())
+
+    try:
+        events = await stream_chat(
+            chatbot_id=data.chatbot_id,
+            message=data.message,
+            session_id=session_id,
+            db=db,
+        )
+        first = await events.__anext__()
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
 
+    def encode(event: dict) -> str:
+        return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    async def event_source():
+        try:
+            yield encode(first)
+            async for event in events:
+                yield encode(event)
+        except Exception as e:
+            yield encode({"type": "error", "detail": f"Chat processing failed: {str(e)}"})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 @router.get("/history/{chatbot_id}/{session_id}")
-def get_chat_history(chatbot_id: int, session_id: str, db: Session = Depends(get_db)):
-    conversations = (
-        db.query(Conversation)
-        .filter(
+async def get_chat_history(
+    chatbot_id: int,
+    session_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get a session's messages, oldest first, one page at a time."""
+    await _wait_for_queued_turns("chat history")
+    query = (
+        select(Conversation)
+        .where(
             Conversation.chatbot_id == chatbot_id,
             Conversation.session_id == session_id,
         )
-        .order_by(Conversation.created_at.asc())
-        .all()
+        .order_by(Conversation.created_at.asc(), Conversation.id.asc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(after_cursor([Conversation.created_at, Conversation.id], position, descending=False))
+    conversations, next_cursor = split_page(
+        (await db.execute(query)).scalars().all(), limit, lambda c: (c.created_at, c.id)
     )
     return {
         "success": True,
@@ -60,21 +142,45 @@ def get_chat_history(chatbot_id: int, session_id: str, db: Session = Depends(get
             }
             for c in conversations
         ],
+        "next_cursor": next_cursor,
         "message": "Chat history retrieved successfully",
     }
 
 
 @router.get("/sessions/{chatbot_id}")
-def get_sessions(chatbot_id: int, db: Session = Depends(get_db)):
-    """Get unique sessions for a chatbot."""
-    sessions = (
-        db.query(Conversation.session_id)
-        .filter(Conversation.chatbot_id == chatbot_id)
-        .distinct()
-        .all()
+async def get_sessions(
+    chatbot_id: int,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Get the sessions of a chatbot, most recently active first."""
+    await _wait_for_queued_turns("sessions")
+    query = (
+        select(ChatSession)
+        .where(ChatSession.chatbot_id == chatbot_id)
+        .order_by(ChatSession.last_activity.desc(), ChatSession.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(after_cursor([ChatSession.last_activity, ChatSession.id], position, descending=True))
+    sessions, next_cursor = split_page(
+        (await db.execute(query)).scalars().all(), limit, lambda s: (s.last_activity, s.id)
     )
     return {
         "success": True,
-        "data": [s[0] for s in sessions],
+        "data": [
+            {
+                "session_id": s.session_id,
+                "message_count": s.message_count,
+                "last_activity": s.last_activity.isoformat() if s.last_activity else None,
+            }
+            for s in sessions
+        ],
+        "next_cursor": next_cursor,
         "message": "Sessions retrieved successfully",
     }
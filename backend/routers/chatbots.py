@@ -1,12 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session, selectinload
 from pydantic import BaseModel
 from typing import Optional, List
 from models.database import get_db, Chatbot
+from services.llm.factory import PROVIDERS, invalidate_llm_providers
+from services.answer_cache import invalidate_answer_cache
+from services.chatbot_config import bump_config_version, invalidate_chatbot_config
+from services.retrieval import delete_chatbot_collection
+from services.chunking import CHUNK_STRATEGIES
+from services.session_cache import invalidate_chatbot_sessions
+from services.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, after_cursor, split_page
 
 router = APIRouter()
 
 
+# Longest fallback chain after the primary provider
+MAX_FALLBACK_PROVIDERS = 3
+
+
+class FallbackProvider(BaseModel):
+    provider: str
+    model: str
+
+
 class ChatbotCreate(BaseModel):
     name: str
     department: Optional[str] = ""
@@ -15,6 +31,13 @@ class ChatbotCreate(BaseModel):
     llm_provider: Optional[str] = "claude"
     llm_model: Optional[str] = "claude-sonnet-4-5-20250929"
     api_key: Optional[str] = ""
+    fallback_providers: Optional[List[FallbackProvider]] = None
+    answer_cache_enabled: Optional[bool] = False
+    answer_cache_threshold: Optional[float] = 0.92
+    chunk_strategy: Optional[str] = "structured"
+    chunk_max_tokens: Optional[int] = 256
+    chunk_overlap_tokens: Optional[int] = 32
+    prompt_token_budget: Optional[int] = 6000
 
 
 class ChatbotUpdate(BaseModel):
@@ -25,12 +48,59 @@ class ChatbotUpdate(BaseModel):
     llm_provider: Optional[str] = None
     llm_model: Optional[str] = None
     api_key: Optional[str] = None
+    fallback_providers: Optional[List[FallbackProvider]] = None
     is_active: Optional[bool] = None
+    answer_cache_enabled: Optional[bool] = None
+    answer_cache_threshold: Optional[float] = None
+    chunk_strategy: Optional[str] = None
+    chunk_max_tokens: Optional[int] = None
+    chunk_overlap_tokens: Optional[int] = None
+    prompt_token_budget: Optional[int] = None
+
+
+def _validate_settings(data):
+    if data.chunk_strategy is not None and data.chunk_strategy not in CHUNK_STRATEGIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported chunk strategy: {data.chunk_strategy}. Allowed: {', '.join(CHUNK_STRATEGIES)}",
+        )
+    if data.chunk_max_tokens is not None and data.chunk_max_tokens < 32:
+        raise HTTPException(status_code=400, detail="chunk_max_tokens must be at least 32")
+    if data.chunk_overlap_tokens is not None and data.chunk_overlap_tokens < 0:
+        raise HTTPException(status_code=400, detail="chunk_overlap_tokens must not be negative")
+    if data.prompt_token_budget is not None and data.prompt_token_budget < 1000:
+        raise HTTPException(status_code=400, detail="prompt_token_budget must be at least 1000")
+    if data.fallback_providers:
+        if len(data.fallback_providers) > MAX_FALLBACK_PROVIDERS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {MAX_FALLBACK_PROVIDERS} fallback providers are allowed",
+            )
+        for fallback in data.fallback_providers:
+            if fallback.provider not in PROVIDERS:
+                raise HTTPException(status_code=400, detail=f"Unsupported provider: {fallback.provider}")
+            if not fallback.model:
+                raise HTTPException(status_code=400, detail="Fallback providers need a model")
+
+
+def _fallback_providers(data) -> Optional[List[dict]]:
+    return [fallback.model_dump() for fallback in data.fallback_providers] if data.fallback_providers else None
 
 
 @router.get("")
-def list_chatbots(db: Session = Depends(get_db)):
-    chatbots = db.query(Chatbot).order_by(Chatbot.created_at.desc()).all()
+def list_chatbots(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    query = db.query(Chatbot).order_by(Chatbot.created_at.desc(), Chatbot.id.desc())
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(after_cursor([Chatbot.created_at, Chatbot.id], position, descending=True))
+    chatbots, next_cursor = split_page(query.limit(limit + 1).all(), limit, lambda c: (c.created_at, c.id))
     return {
         "success": True,
         "data": [
@@ -45,11 +115,14 @@ def list_chatbots(db: Session = Depends(get_db)):
                 "is_active": c.is_active,
                 "share_token": c.share_token,
                 "created_at": c.created_at.isoformat() if c.created_at else None,
-                "document_count": len(c.documents),
-                "action_count": len(c.actions),
+                "document_count": c.document_count,
+                "action_count": c.action_count,
+                "total_chunks": c.total_chunks,
+                "conversation_count": c.conversation_count,
             }
             for c in chatbots
         ],
+        "next_cursor": next_cursor,
         "message": "Chatbots retrieved successfully",
     }
 
@@ -76,7 +149,12 @@ def get_chatbot_by_share_token(share_token: str, db: Session = Depends(get_db)):
 
 @router.get("/{chatbot_id}")
 def get_chatbot(chatbot_id: int, db: Session = Depends(get_db)):
-    chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id).first()
+    chatbot = (
+        db.query(Chatbot)
+        .options(selectinload(Chatbot.documents), selectinload(Chatbot.actions))
+        .filter(Chatbot.id == chatbot_id)
+        .first()
+    )
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
     return {
@@ -90,8 +168,19 @@ def get_chatbot(chatbot_id: int, db: Session = Depends(get_db)):
             "llm_provider": chatbot.llm_provider,
             "llm_model": chatbot.llm_model,
             "api_key": "***" if chatbot.api_key else "",
+            "fallback_providers": chatbot.fallback_providers or [],
             "is_active": chatbot.is_active,
             "share_token": chatbot.share_token,
+            "answer_cache_enabled": chatbot.answer_cache_enabled,
+            "answer_cache_threshold": chatbot.answer_cache_threshold,
+            "chunk_strategy": chatbot.chunk_strategy,
+            "chunk_max_tokens": chatbot.chunk_max_tokens,
+            "chunk_overlap_tokens": chatbot.chunk_overlap_tokens,
+            "prompt_token_budget": chatbot.prompt_token_budget,
+            "document_count": chatbot.document_count,
+            "action_count": chatbot.action_count,
+            "total_chunks": chatbot.total_chunks,
+            "conversation_count": chatbot.conversation_count,
             "created_at": chatbot.created_at.isoformat() if chatbot.created_at else None,
             "documents": [
                 {
@@ -113,6 +202,7 @@ def get_chatbot(chatbot_id: int, db: Session = Depends(get_db)):
                     "description": a.description,
                     "config": a.config,
                     "is_active": a.is_active,
+                    "is_deterministic": a.is_deterministic,
                 }
                 for a in chatbot.actions
             ],
@@ -123,6 +213,7 @@ def get_chatbot(chatbot_id: int, db: Session = Depends(get_db)):
 
 @router.post("")
 def create_chatbot(data: ChatbotCreate, db: Session = Depends(get_db)):
+    _validate_settings(data)
     chatbot = Chatbot(
         name=data.name,
         department=data.department,
@@ -131,6 +222,13 @@ def create_chatbot(data: ChatbotCreate, db: Session = Depends(get_db)):
         llm_provider=data.llm_provider,
         llm_model=data.llm_model,
         api_key=data.api_key,
+        fallback_providers=_fallback_providers(data),
+        answer_cache_enabled=data.answer_cache_enabled,
+        answer_cache_threshold=data.answer_cache_threshold,
+        chunk_strategy=data.chunk_strategy,
+        chunk_max_tokens=data.chunk_max_tokens,
+        chunk_overlap_tokens=data.chunk_overlap_tokens,
+        prompt_token_budget=data.prompt_token_budget,
     )
     db.add(chatbot)
     db.commit()
@@ -144,16 +242,24 @@ def create_chatbot(data: ChatbotCreate, db: Session = Depends(get_db)):
 
 @router.put("/{chatbot_id}")
 def update_chatbot(chatbot_id: int, data: ChatbotUpdate, db: Session = Depends(get_db)):
+    _validate_settings(data)
     chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id).first()
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
 
     update_data = data.model_dump(exclude_unset=True)
+    if "api_key" in update_data and chatbot.api_key and update_data["api_key"] != chatbot.api_key:
+        invalidate_llm_providers(chatbot.llm_provider, api_key=chatbot.api_key)
+    if "fallback_providers" in update_data:
+        update_data["fallback_providers"] = _fallback_providers(data)
     for key, value in update_data.items():
         setattr(chatbot, key, value)
+    bump_config_version(db, chatbot_id=chatbot_id)
 
     db.commit()
     db.refresh(chatbot)
+    invalidate_answer_cache(chatbot_id)
+    invalidate_chatbot_config(chatbot_id)
     return {
         "success": True,
         "data": {"id": chatbot.id, "name": chatbot.name},
@@ -169,6 +275,10 @@ def delete_chatbot(chatbot_id: int, db: Session = Depends(get_db)):
 
     db.delete(chatbot)
     db.commit()
+    delete_chatbot_collection(chatbot_id)
+    invalidate_answer_cache(chatbot_id)
+    invalidate_chatbot_config(chatbot_id)
+    invalidate_chatbot_sessions(chatbot_id)
     return {
         "success": True,
         "data": None,
@@ -2,29 +2,49 @@ import os
 import shutil
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from sqlalchemy.orm import Session
-from models.database import get_db, Document, Chatbot
-from services.rag_service import (
-    parse_document,
-    add_document_to_vectordb,
-    delete_document_from_vectordb,
-    UPLOAD_DIR,
-)
+from models.database import get_db, Document, Chatbot, IngestionJob
+from services.rag_service import UPLOAD_DIR
+from services.retrieval import delete_document_from_vectordb, submit_ingestion_job
+from services.answer_cache import invalidate_answer_cache
+from services.chatbot_counters import bump_chatbot_counters
 
 router = APIRouter()
 
 ALLOWED_EXTENSIONS = {"pdf", "docx", "txt"}
+UPLOAD_READ_SIZE = 1024 * 1024
 
 
 def _get_file_extension(filename: str) -> str:
     return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
 
 
-@router.post("/upload")
-async def upload_document(
+def _serialize_job(job: IngestionJob) -> dict:
+    return {
+        "job_id": job.id,
+        "chatbot_id": job.chatbot_id,
+        "document_id": job.document_id,
+        "filename": job.filename,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": round(job.progress or 0.0, 1),
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+@router.post("/upload", status_code=202)
+def upload_document(
     chatbot_id: int = Form(...),
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
 ):
+    """Save the file and queue it for parsing and indexing; returns a job id.
+
+    A plain function on purpose: the copy, the commit and the hand-off to a
+    remote retrieval server all block, so FastAPI runs it in its threadpool
+    instead of on the event loop that serves chat streams.
+    """
     # Validate chatbot exists
     chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id).first()
     if not chatbot:
@@ -44,46 +64,40 @@ async def upload_document(
     file_path = os.path.join(chatbot_upload_dir, file.filename)
 
     with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+        shutil.copyfileobj(file.file, buffer, UPLOAD_READ_SIZE)
 
     file_size = os.path.getsize(file_path)
 
-    try:
-        # Parse document
-        text = parse_document(file_path, file_ext)
+    job = IngestionJob(
+        chatbot_id=chatbot_id,
+        filename=file.filename,
+        file_type=file_ext,
+        file_path=file_path,
+        file_size=file_size,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    submit_ingestion_job(job.id)
 
-        # Create DB record
-        document = Document(
-            chatbot_id=chatbot_id,
-            filename=file.filename,
-            file_type=file_ext,
-            file_size=file_size,
-        )
-        db.add(document)
-        db.commit()
-        db.refresh(document)
-
-        # Add to vector DB
-        chunk_count = add_document_to_vectordb(chatbot_id, document.id, text)
-        document.chunk_count = chunk_count
-        db.commit()
-
-        return {
-            "success": True,
-            "data": {
-                "id": document.id,
-                "filename": document.filename,
-                "file_type": document.file_type,
-                "file_size": document.file_size,
-                "chunk_count": chunk_count,
-            },
-            "message": "Document uploaded and processed successfully",
-        }
-    except Exception as e:
-        # Clean up file on failure
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        raise HTTPException(status_code=500, detail=f"Failed to process document: {str(e)}")
+    return {
+        "success": True,
+        "data": _serialize_job(job),
+        "message": "Document accepted for processing",
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_ingestion_job(job_id: str, db: Session = Depends(get_db)):
+    job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return {
+        "success": True,
+        "data": _serialize_job(job),
+        "message": "Ingestion job retrieved successfully",
+    }
 
 
 @router.delete("/{document_id}")
@@ -94,6 +108,7 @@ def delete_document(document_id: int, db: Session = Depends(get_db)):
 
     # Remove from vector DB
     delete_document_from_vectordb(document.chatbot_id, document.id)
+    invalidate_answer_cache(document.chatbot_id)
 
     # Remove file from disk
     file_path = os.path.join(UPLOAD_DIR, str(document.chatbot_id), document.filename)
@@ -101,7 +116,9 @@ def delete_document(document_id: int, db: Session = Depends(get_db)):
         os.remove(file_path)
 
     # Remove DB record
+    db.query(IngestionJob).filter(IngestionJob.document_id == document.id).update({"document_id": None})
     db.delete(document)
+    bump_chatbot_counters(db, document.chatbot_id, document_count=-1, total_chunks=-(document.chunk_count or 0))
     db.commit()
 
     return {
@@ -3,6 +3,8 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional, Dict
 from models.database import get_db, ApiKeySetting
+from services.llm.factory import invalidate_llm_providers
+from services.chatbot_config import bump_config_version, invalidate_chatbot_config
 
 router = APIRouter()
 
@@ -41,6 +43,11 @@ def update_api_keys(data: ApiKeyBulkUpdate, db: Session = Depends(get_db)):
             continue
 
         setting = db.query(ApiKeySetting).filter(ApiKeySetting.provider == provider).first()
+        if setting and setting.api_key != api_key:
+            invalidate_llm_providers(provider, api_key=setting.api_key)
+        if (setting.api_key if setting else "") != api_key:
+            # Chatbots without their own key resolve this one
+            bump_config_version(db, provider=provider)
         if api_key:
             if setting:
                 setting.api_key = api_key
@@ -53,6 +60,7 @@ def update_api_keys(data: ApiKeyBulkUpdate, db: Session = Depends(get_db)):
             updated.append(provider)
 
     db.commit()
+    invalidate_chatbot_config()
     return {
         "success": True,
         "data": {"updated": updated},
@@ -67,8 +75,11 @@ def delete_api_key(provider: str, db: Session = Depends(get_db)):
     if not setting:
         raise HTTPException(status_code=404, detail="API key not found for this provider")
 
+    invalidate_llm_providers(provider, api_key=setting.api_key)
     db.delete(setting)
+    bump_config_version(db, provider=provider)
     db.commit()
+    invalidate_chatbot_config()
     return {"success": True, "data": None, "message": f"API key for {provider} deleted"}
 
 
@@ -0,0 +1,120 @@
+from collections import deque
+from types import SimpleNamespace
+from typing import Dict, List, Set
+
+from models.database import Action
+
+
+# Action types that may fire on a keyword match without asking the LLM
+DETERMINISTIC_ACTION_TYPES = ("SHOW_FORM", "REDIRECT")
+
+
+def parse_keywords(trigger_keywords: str) -> List[str]:
+    """Split a comma-separated keyword list into normalized keywords."""
+    if not trigger_keywords:
+        return []
+    return [k.strip().lower() for k in trigger_keywords.split(",") if k.strip()]
+
+
+def snapshot_action(action: Action) -> SimpleNamespace:
+    """Copy the fields of an action so it can outlive its database session."""
+    return SimpleNamespace(
+        id=action.id,
+        name=action.name,
+        action_type=action.action_type,
+        trigger_keywords=action.trigger_keywords or "",
+        description=action.description or "",
+        config=dict(action.config or {}),
+        is_active=action.is_active,
+        is_deterministic=bool(action.is_deterministic),
+    )
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+
+class ActionMatcher:
+    """Aho-Corasick automaton over the trigger keywords of a chatbot's actions.
+
+    Matching is case-insensitive and runs in one pass over the message no
+    matter how many keywords there are. Keywords starting with a Latin
+    letter or digit must start at a word boundary ("it" does not match
+    "with"); other scripts match anywhere so Korean particles attached to a
+    keyword ("휴가를") still match. Built once per chatbot configuration
+    version as part of its ``ChatbotConfig`` snapshot.
+    """
+
+    def __init__(self, actions: List[Action]):
+        self.actions = [snapshot_action(a) for a in actions if a.is_active]
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # state -> [(keyword length, keyword, action id)] ending there
+        self._output: List[List[tuple]] = [[]]
+
+        for action in self.actions:
+            for keyword in parse_keywords(action.trigger_keywords):
+                self._add(keyword, action.id)
+        self._build_failure_links()
+
+    def _add(self, keyword: str, action_id: int):
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(keyword), keyword, action_id))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def match(self, text: str) -> Set[int]:
+        """Return the ids of actions with a trigger keyword in text."""
+        text = text.lower()
+        matched = set()
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, keyword, action_id in self._output[state]:
+                start = position - length + 1
+                if _is_word_char(keyword[0]) and start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                matched.add(action_id)
+        return matched
+
+    def candidates(self, text: str) -> Dict:
+        """Split the actions into what a message can trigger.
+
+        Returns ``matched`` (keyword matched), ``unkeyed`` (no keywords, so
+        only the LLM can tell) and ``deterministic``: the single matched
+        action flagged to fire without the LLM, or None when there is none
+        or more than one.
+        """
+        matched_ids = self.match(text)
+        matched = [a for a in self.actions if a.id in matched_ids]
+        unkeyed = [a for a in self.actions if not parse_keywords(a.trigger_keywords)]
+        deterministic = [
+            a for a in matched
+            if a.is_deterministic and a.action_type in DETERMINISTIC_ACTION_TYPES
+        ]
+        return {
+            "matched": matched,
+            "unkeyed": unkeyed,
+            "deterministic": deterministic[0] if len(deterministic) == 1 else None,
+        }
@@ -3,31 +3,43 @@ from typing import Optional, Dict, List
 from models.database import Action
 
 
-def build_action_prompt(actions: List[Action]) -> str:
-    """Build action detection instructions for the system prompt."""
-    if not actions:
-        return ""
-
-    active_actions = [a for a in actions if a.is_active]
-    if not active_actions:
-        return ""
-
+def _describe_actions(actions: List[Action]) -> str:
     action_descriptions = []
-    for action in active_actions:
+    for action in actions:
         keywords = action.trigger_keywords.split(",") if action.trigger_keywords else []
         keywords_str = ", ".join([k.strip() for k in keywords if k.strip()])
         action_descriptions.append(
             f"- Action '{action.name}' (type: {action.action_type}, id: {action.id}): "
             f"trigger keywords: [{keywords_str}]. {action.description}"
         )
+    return "\n".join(action_descriptions)
 
-    actions_text = "\n".join(action_descriptions)
 
-    return f"""
+def build_action_prompt(actions: List[Action]) -> str:
+    """Build action detection instructions for the static system prompt.
 
-You have the following actions available:
-{actions_text}
+    Only actions without trigger keywords are listed here; actions with
+    keywords are offered per request when the message matches one of them
+    (see ``build_matched_actions_prompt``).
+    """
+    if not actions:
+        return ""
 
+    active_actions = [a for a in actions if a.is_active]
+    if not active_actions:
+        return ""
+
+    unkeyed = [a for a in active_actions if not (a.trigger_keywords or "").strip()]
+    if unkeyed:
+        available = f"You have the following actions available:\n{_describe_actions(unkeyed)}\n"
+    else:
+        available = ""
+    if len(unkeyed) < len(active_actions):
+        available += "Actions whose trigger keywords appear in the user's message are listed before the reference documents.\n"
+
+    return f"""
+
+{available}
 IMPORTANT: When the user's intent matches any action's trigger keywords or description,
 you MUST include an action JSON block at the END of your response in this exact format:
 
@@ -42,6 +54,26 @@ Only trigger an action when the user's intent clearly matches. Always provide a
 """
 
 
+def build_matched_actions_prompt(actions: List[Action]) -> str:
+    """List the keyword-matched candidate actions of one request."""
+    if not actions:
+        return ""
+    return f"Actions matching the user's message:\n{_describe_actions(actions)}\n"
+
+
+def build_deterministic_response(action: Action) -> tuple:
+    """Answer with an action directly, without an LLM call. Returns (text, action_data)."""
+    config = action.config or {}
+    text = config.get("reply") or config.get("label") or action.name
+    action_data = {
+        "action_type": action.action_type,
+        "action_id": action.id,
+        "action_name": action.name,
+        "data": dict(config),
+    }
+    return text, action_data
+
+
 def parse_action_from_response(response: str) -> tuple:
     """Parse action data from LLM response. Returns (clean_text, action_data)."""
     action_data = None
@@ -63,3 +95,62 @@ def parse_action_from_response(response: str) -> tuple:
             clean_text += "\n" + remaining
 
     return clean_text, action_data
+
+
+class ActionStreamFilter:
+    """Hold back the [ACTION]...[/ACTION] block from a stream of text deltas.
+
+    Visible text is released as soon as it cannot be the start of an action
+    block; the block itself is buffered so the caller can parse it once the
+    stream is complete, and text after its closing marker is released again.
+    """
+
+    MARKER = "[ACTION]"
+    END_MARKER = "[/ACTION]"
+
+    def __init__(self):
+        self.raw = ""
+        self._emitted = 0
+        self._holding = False
+
+    def feed(self, delta: str) -> str:
+        """Add a delta and return the text that is safe to show."""
+        self.raw += delta
+        visible = ""
+        while True:
+            if self._holding:
+                end_pos = self.raw.find(self.END_MARKER, self._emitted)
+                if end_pos == -1:
+                    return visible
+                self._holding = False
+                self._emitted = end_pos + len(self.END_MARKER)
+
+            marker_pos = self.raw.find(self.MARKER, self._emitted)
+            if marker_pos == -1:
+                break
+            self._holding = True
+            visible += self.raw[self._emitted:marker_pos]
+            self._emitted = marker_pos
+
+        # Keep back a tail that could still grow into the marker
+        safe_end = len(self.raw)
+        for size in range(min(len(self.MARKER) - 1, len(self.raw) - self._emitted), 0, -1):
+            if self.MARKER.startswith(self.raw[-size:]):
+                safe_end = len(self.raw) - size
+                break
+
+        visible += self.raw[self._emitted:safe_end]
+        self._emitted = safe_end
+        return visible
+
+    def flush(self) -> str:
+        """Return any held-back text that turned out not to be an action.
+
+        A block that was opened but never closed is not an action either
+        (parse_action_from_response keeps it in the text), so it is
+        released as it came.
+        """
+        self._holding = False
+        visible = self.raw[self._emitted:]
+        self._emitted = len(self.raw)
+        return visible
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from services import metrics
+
+
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "86400"))  # seconds
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "500"))  # per chatbot
+
+# chatbot_id -> OrderedDict(entry_id -> entry), oldest first
+_caches: Dict[int, "OrderedDict[int, Dict]"] = {}
+_next_entry_id = 0
+_lock = threading.Lock()
+
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def lookup_answer(
+    chatbot_id: int,
+    config_version: int,
+    question_embedding: List[float],
+    chunk_ids: List[str],
+    threshold: float,
+) -> Optional[Tuple[str, Optional[Dict]]]:
+    """Return (response, action) for a similar past question with the same context.
+
+    Entries stored under another ``config_version`` are dropped. Other
+    workers' invalidate_answer_cache calls never reach this process, but
+    the configuration version they bumped does.
+    """
+    scope = tuple(sorted(chunk_ids))
+    vector = _normalize(question_embedding)
+    now = time.time()
+
+    with _lock:
+        cache = _caches.get(chatbot_id)
+        best_id, best_score = None, threshold
+        if cache:
+            for entry_id, entry in list(cache.items()):
+                if now - entry["created_at"] > ANSWER_CACHE_TTL or entry["config_version"] != config_version:
+                    del cache[entry_id]
+                    continue
+                if entry["scope"] != scope:
+                    continue
+                score = float(np.dot(vector, entry["embedding"]))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+        if best_id is None:
+            metrics.incr("answer_cache.misses")
+            return None
+
+        cache.move_to_end(best_id)
+        entry = cache[best_id]
+        metrics.incr("answer_cache.hits")
+        return entry["response"], entry["action"]
+
+
+def store_answer(
+    chatbot_id: int,
+    config_version: int,
+    question_embedding: List[float],
+    chunk_ids: List[str],
+    response: str,
+    action: Optional[Dict],
+):
+    """Remember an answer for later similar questions."""
+    global _next_entry_id
+    with _lock:
+        cache = _caches.setdefault(chatbot_id, OrderedDict())
+        _next_entry_id += 1
+        cache[_next_entry_id] = {
+            "embedding": _normalize(question_embedding),
+            "scope": tuple(sorted(chunk_ids)),
+            "config_version": config_version,
+            "response": response,
+            "action": action,
+            "created_at": time.time(),
+        }
+        while len(cache) > ANSWER_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+
+def invalidate_answer_cache(chatbot_id: int):
+    """Forget every cached answer of a chatbot (documents, actions or prompt changed)."""
+    with _lock:
+        if _caches.pop(chatbot_id, None) is not None:
+            metrics.incr("answer_cache.invalidations")
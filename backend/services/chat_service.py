@@ -1,125 +1,398 @@
-from typing import List, Dict, Optional
-from sqlalchemy.orm import Session
-from models.database import Chatbot, Conversation, Action, ApiKeySetting
-from services.llm.factory import get_llm_provider
-from services.rag_service import query_vectordb
-from services.action_service import build_action_prompt, parse_action_from_response
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Dict, List, Optional, AsyncIterator
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.database import AsyncSessionLocal, Conversation, ChatSession
+from services.llm.factory import get_llm_chain
+from services.retrieval import retrieve
+from services.rag_service import normalize_query
+from services.single_flight import SingleFlight
+from services.answer_cache import lookup_answer, store_answer
+from services.session_cache import get_session_state, append_session_messages, HISTORY_MESSAGES
+from services.session_summary import schedule_summary_update
+from services.prompt_builder import assemble_prompt
+from services.action_service import parse_action_from_response, build_deterministic_response, ActionStreamFilter
+from services.chatbot_config import get_chatbot_config
+from services.write_behind import WRITE_BEHIND, enqueue_insert
+from services.session_activity import record_conversations
+from services import metrics
 
+logger = logging.getLogger(__name__)
 
-def build_system_prompt(chatbot: Chatbot, context: str, actions: List[Action]) -> str:
-    """Build the full system prompt with context and action instructions."""
-    base_prompt = chatbot.system_prompt or ""
+# Time limits in seconds for the stages that run before the LLM call
+CONFIG_TIMEOUT = float(os.getenv("CHAT_CONFIG_TIMEOUT", "5"))
+HISTORY_TIMEOUT = float(os.getenv("CHAT_HISTORY_TIMEOUT", "5"))
+# A slower retrieval answers without reference documents instead of failing
+RETRIEVAL_TIMEOUT = float(os.getenv("CHAT_RETRIEVAL_TIMEOUT", "3"))
 
-    prompt = f"""You are '{chatbot.name}' chatbot. You serve the '{chatbot.department or "General"}' department.
-{base_prompt}
+# Identical questions in flight at the same time are retrieved and answered once
+_retrievals = SingleFlight("retrieval")
+_answers = SingleFlight("answer")
 
-Answer based on the following reference documents:
----
-{context if context else "No reference documents available."}
----
 
-Rules:
-1. If the answer is not in the documents, honestly say you don't know.
-2. Answer in the same language the user is using.
-3. Be helpful and concise.
-"""
+async def _load_session(chatbot_id: int, session_id: str, db: AsyncSession) -> Dict:
+    """Load the latest messages and the rolling summary of a session from the database."""
+    latest = (await db.execute(
+        select(Conversation)
+        .where(
+            Conversation.chatbot_id == chatbot_id,
+            Conversation.session_id == session_id,
+        )
+        .order_by(Conversation.created_at.desc(), Conversation.id.desc())
+        .limit(HISTORY_MESSAGES)
+    )).scalars().all()
+    chat_session = await db.scalar(
+        select(ChatSession).where(
+            ChatSession.chatbot_id == chatbot_id,
+            ChatSession.session_id == session_id,
+        )
+    )
+    return {
+        "messages": [
+            {"role": conv.role, "content": conv.content, "created_at": conv.created_at}
+            for conv in reversed(latest)
+        ],
+        "message_count": (chat_session.message_count or 0) if chat_session else 0,
+        "summary": chat_session.summary if chat_session else "",
+        "summary_until": chat_session.summary_until if chat_session else None,
+    }
 
-    action_prompt = build_action_prompt(actions)
-    if action_prompt:
-        prompt += action_prompt
 
-    return prompt
+async def _session_version(chatbot_id: int, session_id: str, db: AsyncSession):
+    """Read the stored (message_count, summary_until) of a session, or None if it has no row."""
+    row = (await db.execute(
+        select(ChatSession.message_count, ChatSession.summary_until).where(
+            ChatSession.chatbot_id == chatbot_id,
+            ChatSession.session_id == session_id,
+        )
+    )).first()
+    return (row.message_count or 0, row.summary_until) if row else None
 
 
-async def process_chat(
+async def _run_stage(name: str, timeout: float, awaitable: Awaitable):
+    """Await a stage with a time limit and record its duration."""
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        metrics.incr(f"chat.stage.{name}.timeouts")
+        raise TimeoutError(f"{name} stage timed out after {timeout:g}s")
+    finally:
+        metrics.observe(f"chat.stage.{name}_ms", (time.perf_counter() - started) * 1000)
+
+
+async def _retrieve(chatbot_id: int, message: str, embed_question: bool):
+    """Retrieve context, sharing the work with identical concurrent questions."""
+    result, _ = await _retrievals.run(
+        (chatbot_id, normalize_query(message), embed_question),
+        lambda: retrieve(chatbot_id, message, embed_question),
+    )
+    return result
+
+
+def _history_digest(session: Dict) -> str:
+    """Fingerprint of the history and summary a question is asked in."""
+    digest = hashlib.sha256(session["summary"].encode("utf-8"))
+    for m in session["messages"]:
+        digest.update(b"\0" + m["role"].encode("utf-8") + b"\0" + m["content"].encode("utf-8"))
+    return digest.hexdigest()
+
+
+async def _history(chatbot_id: int, session_id: str) -> Dict:
+    """Session state read through a session of its own (see _prepare_chat)."""
+    async with AsyncSessionLocal() as db:
+        return await get_session_state(
+            chatbot_id,
+            session_id,
+            lambda: _load_session(chatbot_id, session_id, db),
+            lambda: _session_version(chatbot_id, session_id, db),
+        )
+
+
+async def _prepare_chat(
     chatbot_id: int,
     message: str,
     session_id: str,
-    db: Session,
-) -> Dict:
-    """Process a chat message and return response with optional action."""
-    # Get chatbot
-    chatbot = db.query(Chatbot).filter(Chatbot.id == chatbot_id).first()
+    db: AsyncSession,
+):
+    """Load everything needed to answer a turn.
+
+    The config stage runs first on the request session. History and
+    retrieval then run concurrently, each with its own time limit; a failed
+    or slow retrieval degrades to no context. History reads through its own
+    session, so a query cancelled by its time limit never leaves the request
+    session mid-query.
+    Returns a dict with ``provider``, ``messages``, ``system_prompt`` and
+    ``context`` for the LLM call, plus ``cached`` holding a (response,
+    action) pair when the answer is known without the LLM: a deterministic
+    action matched, or the answer cache already has this question.
+    """
+    started = time.perf_counter()
+
+    # Get chatbot configuration (served from memory between changes)
+    chatbot = await _run_stage("config", CONFIG_TIMEOUT, get_chatbot_config(chatbot_id, db))
     if not chatbot:
         raise ValueError("Chatbot not found")
 
     if not chatbot.is_active:
         raise ValueError("Chatbot is not active")
 
-    # Get conversation history
-    history = (
-        db.query(Conversation)
-        .filter(
-            Conversation.chatbot_id == chatbot_id,
-            Conversation.session_id == session_id,
+    # Match trigger keywords locally; deterministic actions skip the LLM
+    candidates = chatbot.matcher.candidates(message)
+    metrics.observe("actions.matched_candidates", len(candidates["matched"]))
+    if candidates["deterministic"]:
+        metrics.incr("actions.deterministic_responses")
+        return {
+            "chatbot_id": chatbot_id,
+            "cached": build_deterministic_response(candidates["deterministic"]),
+            "answer_cache_key": None,
+        }
+
+    # Conversation history (served from memory for active sessions) and RAG context
+    session, retrieval = await asyncio.gather(
+        _run_stage("history", HISTORY_TIMEOUT, _history(chatbot_id, session_id)),
+        _run_stage("retrieval", RETRIEVAL_TIMEOUT, _retrieve(
+            chatbot_id, message, chatbot.answer_cache_enabled
+        )),
+        return_exceptions=True,
+    )
+    if isinstance(session, BaseException):
+        raise session
+    # Nothing else is read on the request session; release its connection
+    # while the LLM answers
+    await db.rollback()
+    if isinstance(retrieval, BaseException):
+        logger.warning("Answering chatbot %s without context: %s", chatbot_id, retrieval)
+        metrics.incr("chat.retrieval_degraded")
+        retrieval = ([], None)
+    context_chunks, question_embedding = retrieval
+    history = session["messages"]
+
+    # The answer cache only covers standalone questions: with history the
+    # same words can refer to something else.
+    use_answer_cache = question_embedding is not None and not history
+    chunk_ids = [chunk["id"] for chunk in context_chunks]
+
+    turn = {
+        "chatbot_id": chatbot_id,
+        "cached": None,
+        "answer_cache_key": (chatbot.config_version, question_embedding, chunk_ids) if use_answer_cache else None,
+    }
+    if use_answer_cache:
+        turn["cached"] = lookup_answer(
+            chatbot_id, chatbot.config_version, question_embedding, chunk_ids, chatbot.answer_cache_threshold
         )
-        .order_by(Conversation.created_at.asc())
-        .limit(20)  # Keep last 20 messages for context
-        .all()
+        if turn["cached"]:
+            return turn
+
+    # Fit persona, actions, context and history into the token budget
+    prompt = assemble_prompt(
+        chatbot,
+        message,
+        context_chunks,
+        candidates["matched"],
+        history,
+        session["summary"],
     )
 
-    # Query RAG for relevant context
-    context_chunks = query_vectordb(chatbot_id, message)
-    context = "\n\n".join(context_chunks) if context_chunks else ""
-
-    # Get active actions
-    actions = db.query(Action).filter(
-        Action.chatbot_id == chatbot_id,
-        Action.is_active == True,
-    ).all()
-
-    # Build system prompt
-    system_prompt = build_system_prompt(chatbot, context, actions)
-
-    # Build messages for LLM
-    messages = []
-    for conv in history:
-        messages.append({"role": conv.role, "content": conv.content})
-    messages.append({"role": "user", "content": message})
-
-    # Resolve API key: per-chatbot > DB settings > env var
-    api_key = chatbot.api_key if chatbot.api_key else None
-    if not api_key:
-        db_setting = db.query(ApiKeySetting).filter(
-            ApiKeySetting.provider == chatbot.llm_provider
-        ).first()
-        if db_setting:
-            api_key = db_setting.api_key
-
-    # Get LLM provider and generate response
-    provider = get_llm_provider(
-        provider=chatbot.llm_provider,
-        model=chatbot.llm_model,
-        api_key=api_key,
+    # Get LLM provider, hedged with the chatbot's fallbacks if it has any
+    provider = get_llm_chain([(chatbot.llm_provider, chatbot.llm_model, chatbot.api_key), *chatbot.fallbacks])
+
+    turn.update(
+        coalesce_key=(chatbot_id, chatbot.config_version, normalize_query(message), _history_digest(session)),
+        provider=provider,
+        messages=prompt["messages"],
+        system_prompt=prompt["system_prompt"],
+        context=prompt["context"],
+        summary_update=_summary_update(session, prompt["included_history"]),
     )
+    metrics.observe("chat.prepare_ms", (time.perf_counter() - started) * 1000)
+    return turn
+
+
+def _summary_update(session: Dict, included: int) -> Optional[Dict]:
+    """Decide whether older turns should be folded into the session summary.
+
+    Returns the arguments for the summary update, or None when every
+    message outside the prompt is already covered by the summary.
+    """
+    history = session["messages"]
+    if included == len(history) and len(history) < HISTORY_MESSAGES:
+        # The whole session fits the prompt verbatim
+        return None
+    fold_before = history[len(history) - included]["created_at"] if included else datetime.utcnow()
+    summary_until = session["summary_until"]
+    if summary_until is not None and fold_before <= summary_until:
+        return None
+    return {
+        "summary": session["summary"],
+        "summary_until": summary_until,
+        "fold_before": fold_before,
+    }
+
 
-    raw_response = await provider.chat(messages, system_prompt)
+def _schedule_summary(turn: Dict, session_id: str):
+    """Start the background summary update planned for a turn, if any."""
+    if turn.get("summary_update"):
+        schedule_summary_update(
+            turn["chatbot_id"], session_id, turn["provider"], **turn["summary_update"]
+        )
+
+
+def _remember_answer(turn: Dict, clean_text: str, action_data: Optional[Dict]):
+    """Store a freshly generated answer in the answer cache when enabled."""
+    if turn["answer_cache_key"] is None:
+        return
+    config_version, question_embedding, chunk_ids = turn["answer_cache_key"]
+    store_answer(turn["chatbot_id"], config_version, question_embedding, chunk_ids, clean_text, action_data)
+
+
+async def _save_turn(
+    chatbot_id: int,
+    session_id: str,
+    message: str,
+    clean_text: str,
+    action_data: Optional[Dict],
+    db: Optional[AsyncSession] = None,
+):
+    """Persist the user message and the assistant reply.
+
+    With write-behind enabled the rows are queued for the background writer
+    and the reply does not wait on the commit; otherwise they are committed
+    with ``db`` (or a session of their own when None).
+    """
+    # Timestamps are set here so the cached ring buffer matches the rows
+    created_at = datetime.utcnow()
+    rows = [
+        # User message
+        {
+            "chatbot_id": chatbot_id,
+            "session_id": session_id,
+            "role": "user",
+            "content": message,
+            "action_data": None,
+            "created_at": created_at,
+        },
+        # Assistant message
+        {
+            "chatbot_id": chatbot_id,
+            "session_id": session_id,
+            "role": "assistant",
+            "content": clean_text,
+            "action_data": action_data,
+            "created_at": created_at,
+        },
+    ]
+
+    if WRITE_BEHIND:
+        for row in rows:
+            enqueue_insert(Conversation, row)
+    elif db is not None:
+        await _commit_turn(db, rows)
+    else:
+        async with AsyncSessionLocal() as own_db:
+            await _commit_turn(own_db, rows)
+
+    append_session_messages(chatbot_id, session_id, [
+        {"role": row["role"], "content": row["content"], "created_at": created_at}
+        for row in rows
+    ])
+
+
+async def _commit_turn(db: AsyncSession, rows: List[Dict]):
+    db.add_all(Conversation(**row) for row in rows)
+    await db.run_sync(lambda session: record_conversations(session.connection(), rows))
+    await db.commit()
+
+
+async def _generate(turn: Dict):
+    """Ask the LLM and return the (clean text, action) of its answer."""
+    raw_response = await turn["provider"].chat(
+        turn["messages"], turn["system_prompt"], turn["context"]
+    )
 
     # Parse action from response
     clean_text, action_data = parse_action_from_response(raw_response)
+    _remember_answer(turn, clean_text, action_data)
+    return clean_text, action_data
 
-    # Save user message
-    user_conv = Conversation(
-        chatbot_id=chatbot_id,
-        session_id=session_id,
-        role="user",
-        content=message,
-    )
-    db.add(user_conv)
-
-    # Save assistant message
-    assistant_conv = Conversation(
-        chatbot_id=chatbot_id,
-        session_id=session_id,
-        role="assistant",
-        content=clean_text,
-        action_data=action_data,
-    )
-    db.add(assistant_conv)
-    db.commit()
+
+async def process_chat(
+    chatbot_id: int,
+    message: str,
+    session_id: str,
+    db: AsyncSession,
+) -> Dict:
+    """Process a chat message and return response with optional action."""
+    turn = await _prepare_chat(chatbot_id, message, session_id, db)
+
+    if turn["cached"]:
+        clean_text, action_data = turn["cached"]
+    else:
+        # Identical concurrent questions share one LLM call; each caller
+        # still saves its own turn below
+        (clean_text, action_data), _ = await _answers.run(turn["coalesce_key"], lambda: _generate(turn))
+
+    await _save_turn(chatbot_id, session_id, message, clean_text, action_data, db)
+    _schedule_summary(turn, session_id)
 
     return {
         "response": clean_text,
         "action": action_data,
         "session_id": session_id,
     }
+
+
+async def stream_chat(
+    chatbot_id: int,
+    message: str,
+    session_id: str,
+    db: AsyncSession,
+) -> AsyncIterator[Dict]:
+    """Prepare a chat turn and return an iterator of stream events.
+
+    Validation errors are raised here, before the first event, so callers
+    can still report them as regular HTTP errors. The iterator yields
+    ``{"type": "delta", "text": ...}`` events followed by one ``done`` event
+    carrying the final text and the parsed action. The turn is saved without
+    the request session because it may already be closed while the response
+    body is streaming.
+    """
+    turn = await _prepare_chat(chatbot_id, message, session_id, db)
+
+    async def events() -> AsyncIterator[Dict]:
+        if turn["cached"]:
+            clean_text, action_data = turn["cached"]
+            yield {"type": "delta", "text": clean_text}
+        else:
+            action_filter = ActionStreamFilter()
+            async for delta in turn["provider"].chat_stream(
+                turn["messages"], turn["system_prompt"], turn["context"]
+            ):
+                visible = action_filter.feed(delta)
+                if visible:
+                    yield {"type": "delta", "text": visible}
+            visible = action_filter.flush()
+            if visible:
+                yield {"type": "delta", "text": visible}
+
+            clean_text, action_data = parse_action_from_response(action_filter.raw)
+            _remember_answer(turn, clean_text, action_data)
+
+        # The request session may be closed by now
+        await _save_turn(chatbot_id, session_id, message, clean_text, action_data)
+        _schedule_summary(turn, session_id)
+
+        yield {
+            "type": "done",
+            "response": clean_text,
+            "action": action_data,
+            "session_id": session_id,
+        }
+
+    return events()
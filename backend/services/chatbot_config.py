@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models.database import Chatbot, Action, ApiKeySetting
+from services.action_matcher import ActionMatcher
+from services.prompt_builder import build_static_prompt
+from services.tokens import model_family, count_tokens
+from services import metrics
+
+
+# Seconds a snapshot is trusted before its version is checked against the
+# database; bounds how long other workers keep serving an old configuration.
+CONFIG_VERSION_CHECK_SECONDS = float(os.getenv("CONFIG_VERSION_CHECK_SECONDS", "5"))
+
+
+@dataclass(frozen=True)
+class ChatbotConfig:
+    """Immutable snapshot of everything a chat turn needs from the configuration."""
+
+    id: int
+    config_version: int
+    name: str
+    department: str
+    system_prompt: str
+    llm_provider: str
+    llm_model: str
+    api_key: Optional[str]  # resolved: per-chatbot > DB settings; None falls back to env vars
+    fallbacks: Tuple[Tuple[str, str, Optional[str]], ...]  # (provider, model, resolved api key)
+    is_active: bool
+    answer_cache_enabled: bool
+    answer_cache_threshold: float
+    prompt_token_budget: int
+    family: str
+    matcher: ActionMatcher
+    static_prompt: str
+    static_tokens: int
+
+
+# chatbot_id -> (snapshot, monotonic time of the last version check)
+_configs = {}
+_lock = threading.Lock()
+
+
+async def _build_config(chatbot: Chatbot, db: AsyncSession) -> ChatbotConfig:
+    actions = (await db.execute(
+        select(Action).where(
+            Action.chatbot_id == chatbot.id,
+            Action.is_active == True,
+        )
+    )).scalars().all()
+    matcher = ActionMatcher(actions)
+
+    # Resolve API key: per-chatbot > DB settings > env var (in the provider factory)
+    api_key = chatbot.api_key if chatbot.api_key else None
+    if not api_key:
+        api_key = await db.scalar(
+            select(ApiKeySetting.api_key).where(ApiKeySetting.provider == chatbot.llm_provider)
+        ) or None
+
+    # Fallback providers use the shared DB settings key (or the env var)
+    fallbacks = []
+    for entry in chatbot.fallback_providers or []:
+        fallback_key = await db.scalar(
+            select(ApiKeySetting.api_key).where(ApiKeySetting.provider == entry["provider"])
+        ) or None
+        fallbacks.append((entry["provider"], entry["model"], fallback_key))
+
+    family = model_family(chatbot.llm_provider, chatbot.llm_model)
+    static_prompt = build_static_prompt(chatbot, matcher.actions)
+    return ChatbotConfig(
+        id=chatbot.id,
+        config_version=chatbot.config_version or 0,
+        name=chatbot.name,
+        department=chatbot.department or "",
+        system_prompt=chatbot.system_prompt or "",
+        llm_provider=chatbot.llm_provider,
+        llm_model=chatbot.llm_model,
+        api_key=api_key,
+        fallbacks=tuple(fallbacks),
+        is_active=bool(chatbot.is_active),
+        answer_cache_enabled=bool(chatbot.answer_cache_enabled),
+        answer_cache_threshold=chatbot.answer_cache_threshold,
+        prompt_token_budget=chatbot.prompt_token_budget,
+        family=family,
+        matcher=matcher,
+        static_prompt=static_prompt,
+        static_tokens=count_tokens(static_prompt, family),
+    )
+
+
+async def get_chatbot_config(chatbot_id: int, db: AsyncSession) -> Optional[ChatbotConfig]:
+    """Return the configuration snapshot of a chatbot, or None if it does not exist.
+
+    Snapshots older than CONFIG_VERSION_CHECK_SECONDS are revalidated with a
+    single-column version read and rebuilt only when the version moved.
+    """
+    now = time.monotonic()
+    with _lock:
+        entry = _configs.get(chatbot_id)
+    if entry is not None:
+        config, checked_at = entry
+        if now - checked_at < CONFIG_VERSION_CHECK_SECONDS:
+            metrics.incr("chatbot_config.hits")
+            return config
+        version = await db.scalar(select(Chatbot.config_version).where(Chatbot.id == chatbot_id))
+        if version is not None and version == config.config_version:
+            metrics.incr("chatbot_config.revalidations")
+            with _lock:
+                _configs[chatbot_id] = (config, now)
+            return config
+
+    metrics.incr("chatbot_config.misses")
+    chatbot = await db.get(Chatbot, chatbot_id)
+    if not chatbot:
+        invalidate_chatbot_config(chatbot_id)
+        return None
+    config = await _build_config(chatbot, db)
+    with _lock:
+        _configs[chatbot_id] = (config, now)
+    return config
+
+
+def bump_config_version(db: Session, chatbot_id: int = None, provider: str = None):
+    """Mark chatbot configurations as changed in the caller's transaction.
+
+    Pass ``chatbot_id`` for one chatbot or ``provider`` for every chatbot
+    using that provider, directly or as a fallback (its shared API key
+    changed). Call
+    ``invalidate_chatbot_config`` after the commit.
+    """
+    query = db.query(Chatbot)
+    if chatbot_id is not None:
+        query = query.filter(Chatbot.id == chatbot_id)
+    if provider is not None:
+        query = query.filter(or_(Chatbot.llm_provider == provider, Chatbot.fallback_providers.isnot(None)))
+    query.update(
+        {Chatbot.config_version: Chatbot.config_version + 1},
+        synchronize_session=False,
+    )
+
+
+def invalidate_chatbot_config(chatbot_id: int = None):
+    """Drop this process's snapshot of a chatbot, or of all chatbots."""
+    with _lock:
+        if chatbot_id is None:
+            _configs.clear()
+        else:
+            _configs.pop(chatbot_id, None)
@@ -0,0 +1,22 @@
+from sqlalchemy import update
+from models.database import Chatbot
+
+# Denormalized per-chatbot counters kept on the chatbots table
+COUNTERS = ("document_count", "action_count", "total_chunks", "conversation_count")
+
+
+def bump_chatbot_counters(db, chatbot_id: int, **deltas: int):
+    """Add ``deltas`` to a chatbot's counters in the caller's transaction.
+
+    ``db`` is a Session or a Connection; the update is a single relative
+    UPDATE, so concurrent writers never lose increments.
+    """
+    values = {}
+    for name, delta in deltas.items():
+        if name not in COUNTERS:
+            raise ValueError(f"Unknown chatbot counter: {name}")
+        if delta:
+            column = Chatbot.__table__.c[name]
+            values[name] = column + delta
+    if values:
+        db.execute(update(Chatbot.__table__).where(Chatbot.__table__.c.id == chatbot_id).values(**values))
@@ -0,0 +1,198 @@
+import re
+from typing import Iterable, Iterator, List
+from services.document_parser import iter_chunks
+from services.tokens import count_tokens
+
+
+DEFAULT_CHUNK_STRATEGY = "structured"
+DEFAULT_CHUNK_MAX_TOKENS = 256
+DEFAULT_CHUNK_OVERLAP_TOKENS = 32
+
+# Sentence terminators, including closing quotes/brackets, followed by whitespace or end of text
+_SENTENCE_END = re.compile(r"[.!?。！？]+[\"'”’)\]]*(?=\s|$)")
+# Markdown headings, numbered headings ("1.2 Scope") and Korean article/chapter headings ("제3조 ...")
+_HEADING = re.compile(r"^(?:(#{1,6})\s+|(\d+(?:\.\d+)*)\.?\s+|제\s*\d+\s*([조장절편관])\b)")
+_HEADING_MAX_CHARS = 80
+# A heading title is short; "1. Refunds are available within 30 days." or
+# "제2조 직원은 연 15일의 유급 휴가를 가진다" are items of text, not headings
+_HEADING_MAX_WORDS = 6
+# A parenthesized article title right after the prefix, as in "제1조(목적)"
+_ARTICLE_TITLE = re.compile(r"^\s*\([^)]*\)")
+# Nesting depth of Korean statute divisions
+_KOREAN_LEVELS = {"편": 1, "장": 2, "절": 3, "관": 4, "조": 5}
+
+
+def _heading_level(line: str):
+    """Return (kind, depth) if the line is a heading, else None."""
+    if len(line) > _HEADING_MAX_CHARS:
+        return None
+    match = _HEADING.match(line)
+    if not match:
+        return None
+    markdown, number, division = match.groups()
+    if markdown:
+        return "markdown", len(markdown)
+    title = _ARTICLE_TITLE.sub("", line[match.end():])
+    if _SENTENCE_END.search(title) or len(title.split()) > _HEADING_MAX_WORDS:
+        return None
+    if number:
+        return "numbered", number.count(".") + 1
+    return "korean", _KOREAN_LEVELS[division]
+
+
+class _StructuredChunker:
+    """Single-pass splitter that packs whole sentences into token-limited chunks.
+
+    Headings always start a new chunk, paragraph breaks are preferred cut
+    points, and each chunk repeats up to ``overlap_tokens`` of trailing
+    sentences from the previous one.
+    """
+
+    def __init__(self, max_tokens: int, overlap_tokens: int):
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.sentences: List[tuple] = []  # (text, tokens, is_heading) of the current chunk
+        self.tokens = 0
+        self.has_body = False  # False while the chunk holds only headings/overlap
+        self.heading_level = None  # (kind, depth) of the last heading of a heading-only chunk
+        self.pending = ""  # text of an unfinished sentence
+
+    def feed_line(self, line: str) -> Iterator[str]:
+        stripped = line.strip()
+        if not stripped:
+            yield from self._flush_pending()
+            # Paragraph break: cut here if the chunk is already reasonably full
+            if self.tokens >= self.max_tokens * 3 // 4:
+                yield from self._emit(keep_overlap=True)
+            return
+
+        level = _heading_level(stripped)
+        if level:
+            yield from self._flush_pending()
+            if self.has_body or not self._is_subheading(level):
+                yield from self._emit(keep_overlap=False)
+            # Overlap from the previous section does not belong under a new heading
+            self.sentences = [entry for entry in self.sentences if entry[2]]
+            self.tokens = sum(entry[1] for entry in self.sentences)
+            yield from self._add_sentence(stripped, is_body=False)
+            self.heading_level = level
+            return
+
+        self.pending = f"{self.pending} {stripped}" if self.pending else stripped
+        last_end = 0
+        for match in _SENTENCE_END.finditer(self.pending):
+            yield from self._add_sentence(self.pending[last_end:match.end()].strip())
+            last_end = match.end()
+        self.pending = self.pending[last_end:].strip()
+        # Guard against text without any sentence punctuation (tables, lists)
+        if count_tokens(self.pending) > self.max_tokens:
+            yield from self._flush_pending()
+
+    def _is_subheading(self, level: tuple) -> bool:
+        """Whether a heading nests under the headings the chunk holds so far.
+
+        "# Guide" then "## Setup" stay together in front of their text; a
+        sibling or higher heading ends the run, which becomes a chunk.
+        """
+        if self.heading_level is None:
+            return True
+        kind, depth = self.heading_level
+        return kind != level[0] or level[1] > depth
+
+    def finish(self) -> Iterator[str]:
+        yield from self._flush_pending()
+        yield from self._emit(keep_overlap=False)
+
+    def _flush_pending(self) -> Iterator[str]:
+        if self.pending:
+            sentence, self.pending = self.pending, ""
+            yield from self._add_sentence(sentence)
+
+    def _add_sentence(self, sentence: str, is_body: bool = True) -> Iterator[str]:
+        if not sentence:
+            return
+        tokens = count_tokens(sentence)
+        if tokens > self.max_tokens:
+            for piece in self._split_long(sentence):
+                yield from self._add_sentence(piece, is_body)
+            return
+        if self.tokens + tokens > self.max_tokens:
+            yield from self._emit(keep_overlap=True)
+            # Drop overlap that would not leave room for this sentence
+            while self.sentences and self.tokens + tokens > self.max_tokens:
+                self.tokens -= self.sentences.pop(0)[1]
+        self.sentences.append((sentence, tokens, not is_body))
+        self.tokens += tokens
+        self.has_body = self.has_body or is_body
+
+    def _split_long(self, sentence: str) -> List[str]:
+        """Split an over-long sentence on spaces, or on characters for unspaced text."""
+        units = sentence.split(" ") if " " in sentence else list(sentence)
+        joiner = " " if " " in sentence else ""
+        pieces, current, current_tokens = [], [], 0
+        for unit in units:
+            unit_tokens = count_tokens(unit)
+            if current and current_tokens + unit_tokens > self.max_tokens:
+                pieces.append(joiner.join(current))
+                current, current_tokens = [], 0
+            current.append(unit)
+            current_tokens += unit_tokens
+        if current:
+            pieces.append(joiner.join(current))
+        return pieces
+
+    def _emit(self, keep_overlap: bool) -> Iterator[str]:
+        if not self.has_body and not any(entry[2] for entry in self.sentences):
+            # Only overlap from the previous chunk
+            return
+        yield " ".join(entry[0] for entry in self.sentences)
+
+        overlap, overlap_tokens = [], 0
+        if keep_overlap and self.overlap_tokens:
+            for entry in reversed(self.sentences):
+                if overlap_tokens + entry[1] > self.overlap_tokens:
+                    break
+                overlap.insert(0, (entry[0], entry[1], False))
+                overlap_tokens += entry[1]
+        self.sentences, self.tokens = overlap, overlap_tokens
+        self.has_body = False
+        self.heading_level = None
+
+
+def chunk_structured(blocks: Iterable[str], max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    """Sentence, paragraph and heading aware chunks limited to ``max_tokens``."""
+    chunker = _StructuredChunker(max_tokens, overlap_tokens)
+    tail = ""
+    for block in blocks:
+        lines = (tail + block).split("\n")
+        # The last piece may be continued by the next block
+        tail = lines.pop()
+        for line in lines:
+            yield from chunker.feed_line(line)
+    if tail:
+        yield from chunker.feed_line(tail)
+    yield from chunker.finish()
+
+
+def chunk_fixed(blocks: Iterable[str], max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    """Legacy 500/50 character slicing; token settings are ignored."""
+    return iter_chunks(blocks)
+
+
+CHUNK_STRATEGIES = {
+    "structured": chunk_structured,
+    "fixed": chunk_fixed,
+}
+
+
+def chunk_document(
+    blocks: Iterable[str],
+    strategy: str = DEFAULT_CHUNK_STRATEGY,
+    max_tokens: int = DEFAULT_CHUNK_MAX_TOKENS,
+    overlap_tokens: int = DEFAULT_CHUNK_OVERLAP_TOKENS,
+) -> Iterator[str]:
+    """Split a stream of text blocks into chunks with the given strategy."""
+    chunker = CHUNK_STRATEGIES.get(strategy)
+    if not chunker:
+        raise ValueError(f"Unsupported chunk strategy: {strategy}")
+    return chunker(blocks, max_tokens, overlap_tokens)
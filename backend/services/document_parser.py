@@ -0,0 +1,196 @@
+import gc
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List
+from pypdf import PdfReader
+from docx import Document as DocxDocument
+
+
+# Kept free of heavy imports (Chroma, embedding model) because PDF page
+# extraction runs this module inside spawned worker processes.
+
+def usable_cpus() -> int:
+    """CPUs this process may run on (its affinity mask, e.g. a container's cpuset)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", str(min(4, usable_cpus()))))
+# Pages per pool task, and how often pypdf's object cache is dropped
+PDF_PAGES_PER_TASK = 64
+# PDFs shorter than this are parsed in-process; spawning workers would cost more
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "256"))
+
+# The reader of the PDF this process is extracting, reused across tasks so a
+# worker parses the file's cross-reference table once rather than per task.
+# Readers are given an open file: given a path, pypdf loads the whole file
+# into memory.
+_reader = None
+_reader_file = None
+_reader_key = None
+
+
+def _open_reader(file_path: str) -> PdfReader:
+    global _reader, _reader_file, _reader_key
+    stat = os.stat(file_path)
+    key = (file_path, stat.st_mtime_ns, stat.st_size)
+    if _reader_key != key:
+        if _reader_file is not None:
+            _reader_file.close()
+        _reader_file = open(file_path, "rb")
+        _reader, _reader_key = PdfReader(_reader_file), key
+    return _reader
+
+
+def _release_page_objects(reader: PdfReader):
+    """Drop the objects pypdf cached for pages already extracted.
+
+    The reader keeps every resolved object (content streams, fonts) and
+    they form reference cycles, so without this its memory grows with the
+    number of pages read rather than staying within a window of pages.
+    """
+    reader.resolved_objects.clear()
+    gc.collect()
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF."""
+    reader = _open_reader(file_path)
+    texts = []
+    for index in range(start, end):
+        page_text = reader.pages[index].extract_text()
+        texts.append(page_text + "\n" if page_text else "")
+    _release_page_objects(reader)
+    return texts
+
+
+def _iter_pdf_pages_sequential(reader: PdfReader) -> Iterator[str]:
+    for index, page in enumerate(reader.pages, start=1):
+        page_text = page.extract_text()
+        yield page_text + "\n" if page_text else ""
+        if index % PDF_PAGES_PER_TASK == 0:
+            _release_page_objects(reader)
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """Yield the text of each PDF page in order.
+
+    Memory stays bounded by a window of pages rather than the document
+    size. Large PDFs are extracted across a process pool when more than
+    one CPU is available, with only a small window of page batches in
+    flight at once.
+    """
+    with open(file_path, "rb") as f:
+        reader = PdfReader(f)
+        page_count = len(reader.pages)
+        if page_count < PDF_PARALLEL_MIN_PAGES or PDF_PAGE_WORKERS <= 1 or usable_cpus() <= 1:
+            yield from _iter_pdf_pages_sequential(reader)
+            return
+    del reader
+
+    window = PDF_PAGE_WORKERS * 2
+    # Spawn rather than fork: the server process runs threads (ingestion, ONNX)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=PDF_PAGE_WORKERS, mp_context=context) as pool:
+        pending = deque()
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            end = min(start + PDF_PAGES_PER_TASK, page_count)
+            pending.append(pool.submit(_extract_pdf_pages, file_path, start, end))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+    """Yield the non-empty paragraphs of a Word document."""
+    doc = DocxDocument(file_path)
+    for paragraph in doc.paragraphs:
+        if paragraph.text.strip():
+            yield paragraph.text + "\n"
+
+
+def iter_txt_lines(file_path: str) -> Iterator[str]:
+    """Yield a plain text file line by line."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield from f
+
+
+def iter_document_blocks(file_path: str, file_type: str) -> Iterator[str]:
+    """Yield text blocks (pages, paragraphs or lines) of a document in order."""
+    parsers = {
+        "pdf": iter_pdf_pages,
+        "docx": iter_docx_paragraphs,
+        "txt": iter_txt_lines,
+    }
+    parser = parsers.get(file_type)
+    if not parser:
+        raise ValueError(f"Unsupported file type: {file_type}")
+    return parser(file_path)
+
+
+def count_document_blocks(file_path: str, file_type: str) -> int:
+    """Cheaply count the blocks iter_document_blocks will yield (for progress)."""
+    if file_type == "pdf":
+        with open(file_path, "rb") as f:
+            return len(PdfReader(f).pages)
+    if file_type == "docx":
+        return sum(1 for p in DocxDocument(file_path).paragraphs if p.text.strip())
+    with open(file_path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def parse_pdf(file_path: str) -> str:
+    """Extract text from a PDF file."""
+    return "".join(iter_pdf_pages(file_path))
+
+
+def parse_docx(file_path: str) -> str:
+    """Extract text from a Word document."""
+    return "".join(iter_docx_paragraphs(file_path))
+
+
+def parse_txt(file_path: str) -> str:
+    """Read a plain text file."""
+    with open(file_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def parse_document(file_path: str, file_type: str) -> str:
+    """Parse document based on its type."""
+    return "".join(iter_document_blocks(file_path, file_type))
+
+
+def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
+    """Split text into overlapping chunks."""
+    return list(iter_chunks([text], chunk_size, overlap))
+
+
+def iter_chunks(blocks: Iterable[str], chunk_size: int = 500, overlap: int = 50) -> Iterator[str]:
+    """Split a stream of text blocks into overlapping chunks.
+
+    Produces the same chunks as slicing the concatenated text, while only
+    holding the current block plus one chunk of carry-over in memory.
+    """
+    step = chunk_size - overlap
+    buffer = ""
+    for block in blocks:
+        buffer += block
+        pos = 0
+        while len(buffer) - pos >= chunk_size:
+            chunk = buffer[pos:pos + chunk_size].strip()
+            if chunk:
+                yield chunk
+            pos += step
+        buffer = buffer[pos:]
+
+    pos = 0
+    while pos < len(buffer):
+        chunk = buffer[pos:pos + chunk_size].strip()
+        if chunk:
+            yield chunk
+        pos += step
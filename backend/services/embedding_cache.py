@@ -0,0 +1,53 @@
+import hashlib
+import sqlite3
+import threading
+from array import array
+from typing import List, Optional
+
+
+class EmbeddingCache:
+    """Persistent store of chunk embeddings keyed by hash(model, text).
+
+    Identical chunks, e.g. from a re-uploaded manual or the same policy in
+    several bots, are embedded only once.
+    """
+
+    def __init__(self, path: str, model_name: str):
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Return the cached vector for each text, or None where missing."""
+        keys = [self._key(t) for t in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update(rows)
+
+        vectors = []
+        for key in keys:
+            blob = found.get(key)
+            vectors.append(array("f", blob).tolist() if blob is not None else None)
+        return vectors
+
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for texts."""
+        rows = [(self._key(t), array("f", v).tobytes()) for t, v in zip(texts, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
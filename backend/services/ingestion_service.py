@@ -0,0 +1,137 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from models.database import SessionLocal, Chatbot, Document, IngestionJob
+from services.rag_service import (
+    iter_document_blocks,
+    count_document_blocks,
+    add_document_to_vectordb,
+    delete_document_from_vectordb,
+)
+from services.answer_cache import invalidate_answer_cache
+from services.chatbot_counters import bump_chatbot_counters
+from services.chunking import DEFAULT_CHUNK_STRATEGY, DEFAULT_CHUNK_MAX_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on documents processed at once, so ingestion cannot starve chat traffic
+INGEST_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "2"))
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_CONCURRENCY, thread_name_prefix="ingest")
+
+
+def submit_ingestion_job(job_id: str):
+    """Queue a job for background processing."""
+    _executor.submit(_run_job, job_id)
+
+
+def resume_pending_jobs():
+    """Re-queue jobs that were still waiting or running when the server stopped."""
+    db = SessionLocal()
+    try:
+        jobs = db.query(IngestionJob).filter(IngestionJob.status.in_(["queued", "running"])).all()
+        for job in jobs:
+            job.status = "queued"
+        db.commit()
+        job_ids = [job.id for job in jobs]
+    finally:
+        db.close()
+
+    for job_id in job_ids:
+        submit_ingestion_job(job_id)
+    if job_ids:
+        logger.info("Resumed %d ingestion job(s)", len(job_ids))
+
+
+def shutdown_ingestion():
+    """Stop accepting work; unfinished jobs are resumed on the next start."""
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _update_job(db, job: IngestionJob, **fields):
+    for key, value in fields.items():
+        setattr(job, key, value)
+    db.commit()
+
+
+def _run_job(job_id: str):
+    db = SessionLocal()
+    try:
+        job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+        if not job or job.status not in ("queued", "running"):
+            return
+
+        try:
+            _update_job(db, job, status="running", stage="parsing", progress=0.0, error=None)
+
+            # A resumed job reuses its document record; chunks stored by the
+            # interrupted run are skipped during indexing
+            document = None
+            if job.document_id:
+                document = db.query(Document).filter(Document.id == job.document_id).first()
+            if not document:
+                document = Document(
+                    chatbot_id=job.chatbot_id,
+                    filename=job.filename,
+                    file_type=job.file_type,
+                    file_size=job.file_size,
+                )
+                db.add(document)
+                bump_chatbot_counters(db, job.chatbot_id, document_count=1)
+                db.commit()
+                db.refresh(document)
+                _update_job(db, job, document_id=document.id)
+
+            # Pages/paragraphs are parsed, chunked and embedded as a stream,
+            # so progress is measured by how many blocks have been consumed
+            total_blocks = count_document_blocks(job.file_path, job.file_type)
+            consumed_blocks = 0
+
+            def tracked_blocks():
+                nonlocal consumed_blocks
+                for block in iter_document_blocks(job.file_path, job.file_type):
+                    consumed_blocks += 1
+                    yield block
+
+            def report(chunks_done: int):
+                share = min(consumed_blocks / total_blocks, 1.0) if total_blocks else 1.0
+                _update_job(db, job, stage="embedding", progress=99.0 * share)
+
+            chatbot = db.query(Chatbot).filter(Chatbot.id == job.chatbot_id).first()
+            blocks = tracked_blocks()
+            chunk_count = add_document_to_vectordb(
+                job.chatbot_id,
+                document.id,
+                blocks,
+                progress=report,
+                chunk_strategy=chatbot.chunk_strategy or DEFAULT_CHUNK_STRATEGY,
+                chunk_max_tokens=chatbot.chunk_max_tokens or DEFAULT_CHUNK_MAX_TOKENS,
+                chunk_overlap_tokens=chatbot.chunk_overlap_tokens or 0,
+            )
+            # A resumed job recounts the document's chunks from scratch
+            bump_chatbot_counters(db, job.chatbot_id, total_chunks=chunk_count - (document.chunk_count or 0))
+            document.chunk_count = chunk_count
+            _update_job(db, job, status="completed", stage="done", progress=100.0)
+            invalidate_answer_cache(job.chatbot_id)
+        except Exception as e:
+            logger.exception("Ingestion job %s failed", job_id)
+            db.rollback()
+            _cleanup_failed_job(db, job)
+            _update_job(db, job, status="failed", error=str(e))
+    finally:
+        db.close()
+
+
+def _cleanup_failed_job(db, job: IngestionJob):
+    """Remove partial results of a failed job."""
+    if job.document_id:
+        delete_document_from_vectordb(job.chatbot_id, job.document_id)
+        document = db.query(Document).filter(Document.id == job.document_id).first()
+        if document:
+            db.delete(document)
+            bump_chatbot_counters(
+                db, job.chatbot_id, document_count=-1, total_chunks=-(document.chunk_count or 0)
+            )
+        job.document_id = None
+    if os.path.exists(job.file_path):
+        os.remove(job.file_path)
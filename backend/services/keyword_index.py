@@ -0,0 +1,248 @@
+import math
+import os
+import re
+import threading
+import zipfile
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+# Latin/digit runs may contain hyphens or underscores so form numbers and
+# product codes ("HR-2024-001") stay one term; Hangul runs are also indexed
+# as character bigrams so compound nouns match their parts.
+_TOKEN = re.compile(r"[가-힣]+|[a-z0-9]+(?:[-_][a-z0-9]+)*|[぀-ヿ一-鿿]")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> Iterator[str]:
+    """Yield index terms for Korean and English text."""
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        yield token
+        if "가" <= token[0] <= "힣":
+            if len(token) > 2:
+                for i in range(len(token) - 1):
+                    yield token[i:i + 2]
+        elif "-" in token or "_" in token:
+            yield from re.split(r"[-_]", token)
+
+
+class KeywordIndex:
+    """BM25 inverted index over one chatbot's chunks.
+
+    Postings are kept in typed arrays (document numbers and term
+    frequencies) rather than Python lists to keep the index compact, and
+    each document's term ids are kept so document frequencies can be
+    updated on removal instead of recounted per query. Removed chunks are
+    tombstoned and squeezed out by ``compact``.
+    """
+
+    def __init__(self):
+        self.chunk_ids: List[Optional[str]] = []  # doc number -> chunk id, None when removed
+        self.doc_numbers: Dict[str, int] = {}
+        self.doc_lengths = array("I")
+        # Term ids of document d: doc_terms[doc_offsets[d]:doc_offsets[d + 1]]
+        self.doc_terms = array("I")
+        self.doc_offsets = array("Q", [0])
+        self.term_ids: Dict[str, int] = {}
+        self.postings: List[Tuple[array, array]] = []  # by term id
+        self.df = array("I")  # live documents per term id
+        self.total_length = 0
+        self.removed = 0
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_numbers)
+
+    def add(self, chunk_id: str, text: str):
+        """Index a chunk, replacing an earlier version with the same id."""
+        with self.lock:
+            if chunk_id in self.doc_numbers:
+                self._remove(chunk_id)
+            terms = Counter(tokenize(text))
+            doc_number = len(self.chunk_ids)
+            self.chunk_ids.append(chunk_id)
+            self.doc_numbers[chunk_id] = doc_number
+            length = sum(terms.values())
+            self.doc_lengths.append(length)
+            self.total_length += length
+            term_ids, postings, df = self.term_ids, self.postings, self.df
+            doc_term_ids = array("I")
+            for term, tf in terms.items():
+                term_id = term_ids.get(term)
+                if term_id is None:
+                    term_id = term_ids[term] = len(postings)
+                    postings.append((array("I"), array("H")))
+                    df.append(0)
+                docs, tfs = postings[term_id]
+                docs.append(doc_number)
+                tfs.append(tf if tf < 65535 else 65535)
+                df[term_id] += 1
+                doc_term_ids.append(term_id)
+            self.doc_terms.extend(doc_term_ids)
+            self.doc_offsets.append(len(self.doc_terms))
+            if self.removed > len(self.doc_numbers):
+                self._compact()
+
+    def remove(self, chunk_ids: List[str]):
+        """Remove chunks from the index."""
+        with self.lock:
+            for chunk_id in chunk_ids:
+                if chunk_id in self.doc_numbers:
+                    self._remove(chunk_id)
+            if self.removed > len(self.doc_numbers):
+                self._compact()
+
+    def _remove(self, chunk_id: str):
+        doc_number = self.doc_numbers.pop(chunk_id)
+        self.chunk_ids[doc_number] = None
+        self.total_length -= self.doc_lengths[doc_number]
+        for term_id in self.doc_terms[self.doc_offsets[doc_number]:self.doc_offsets[doc_number + 1]]:
+            self.df[term_id] -= 1
+        self.removed += 1
+
+    def _compact(self):
+        """Rebuild postings without tombstoned documents and unused terms."""
+        renumber = {}
+        for old, chunk_id in enumerate(self.chunk_ids):
+            if chunk_id is not None:
+                renumber[old] = len(renumber)
+        term_ids, postings, new_term_id = {}, [], {}
+        for term, old_id in self.term_ids.items():
+            if not self.df[old_id]:
+                continue
+            new_docs, new_tfs = array("I"), array("H")
+            for doc_number, tf in zip(*self.postings[old_id]):
+                if doc_number in renumber:
+                    new_docs.append(renumber[doc_number])
+                    new_tfs.append(tf)
+            new_term_id[old_id] = term_ids[term] = len(postings)
+            postings.append((new_docs, new_tfs))
+        doc_terms, doc_offsets = array("I"), array("Q", [0])
+        for old in renumber:
+            terms = self.doc_terms[self.doc_offsets[old]:self.doc_offsets[old + 1]]
+            doc_terms.extend(new_term_id[term_id] for term_id in terms)
+            doc_offsets.append(len(doc_terms))
+        self.term_ids = term_ids
+        self.postings = postings
+        self.df = array("I", (len(docs) for docs, _ in postings))
+        self.doc_terms, self.doc_offsets = doc_terms, doc_offsets
+        self.doc_lengths = array("I", (self.doc_lengths[old] for old in renumber))
+        self.chunk_ids = [self.chunk_ids[old] for old in renumber]
+        self.doc_numbers = {chunk_id: number for number, chunk_id in enumerate(self.chunk_ids)}
+        self.removed = 0
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, float]]:
+        """Return up to n_results (chunk_id, BM25 score) pairs, best first."""
+        with self.lock:
+            live = len(self.doc_numbers)
+            if not live:
+                return []
+            avg_length = self.total_length / live or 1.0
+            scores: Dict[int, float] = {}
+            for term in set(tokenize(query)):
+                term_id = self.term_ids.get(term)
+                if term_id is None or not self.df[term_id]:
+                    continue
+                df = self.df[term_id]
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                for doc_number, tf in zip(*self.postings[term_id]):
+                    if self.chunk_ids[doc_number] is None:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_number] / avg_length)
+                    scores[doc_number] = scores.get(doc_number, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+            return [(self.chunk_ids[doc_number], score) for doc_number, score in best]
+
+    def save(self, path: str):
+        """Persist the index atomically as plain arrays (an .npz file).
+
+        Nothing in the file is executable, unlike a pickle: chunk ids and
+        terms are newline-separated UTF-8 (neither can contain a newline),
+        with an empty id for a removed chunk.
+        """
+        with self.lock:
+            terms = sorted(self.term_ids, key=self.term_ids.get)
+            data = {
+                "chunk_ids": _encode_strings([chunk_id or "" for chunk_id in self.chunk_ids]),
+                "doc_lengths": np.frombuffer(self.doc_lengths, dtype=np.uint32).copy(),
+                "doc_terms": np.frombuffer(self.doc_terms, dtype=np.uint32).copy(),
+                "doc_offsets": np.frombuffer(self.doc_offsets, dtype=np.uint64).copy(),
+                "terms": _encode_strings(terms),
+                "df": np.frombuffer(self.df, dtype=np.uint32).copy(),
+                "posting_offsets": np.cumsum([0] + [len(docs) for docs, _ in self.postings], dtype=np.uint64),
+                "posting_docs": _concat([docs for docs, _ in self.postings], np.uint32),
+                "posting_tfs": _concat([tfs for _, tfs in self.postings], np.uint16),
+            }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path: str) -> Optional["KeywordIndex"]:
+        """Load a persisted index, or None if there is none (or it is unreadable)."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                index = KeywordIndex()
+                index.chunk_ids = [chunk_id or None for chunk_id in _decode_strings(data["chunk_ids"])]
+                index.doc_numbers = {
+                    chunk_id: number for number, chunk_id in enumerate(index.chunk_ids) if chunk_id is not None
+                }
+                index.removed = len(index.chunk_ids) - len(index.doc_numbers)
+                index.doc_lengths = _to_array("I", data["doc_lengths"])
+                index.doc_terms = _to_array("I", data["doc_terms"])
+                index.doc_offsets = _to_array("Q", data["doc_offsets"])
+                terms = _decode_strings(data["terms"])
+                index.term_ids = {term: term_id for term_id, term in enumerate(terms)}
+                offsets = data["posting_offsets"].tolist()
+                docs, tfs = data["posting_docs"], data["posting_tfs"]
+                index.postings = [
+                    (_to_array("I", docs[start:end]), _to_array("H", tfs[start:end]))
+                    for start, end in zip(offsets, offsets[1:])
+                ]
+                index.df = _to_array("I", data["df"])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+        if not (len(index.doc_lengths) == len(index.chunk_ids) == len(index.doc_offsets) - 1
+                and len(index.postings) == len(index.df) == len(terms)):
+            return None
+        index.total_length = sum(
+            length for length, chunk_id in zip(index.doc_lengths, index.chunk_ids) if chunk_id is not None
+        )
+        return index
+
+
+def _encode_strings(values: List[str]) -> np.ndarray:
+    return np.frombuffer("\n".join(values).encode("utf-8"), dtype=np.uint8)
+
+
+def _decode_strings(data: np.ndarray) -> List[str]:
+    text = data.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
+def _concat(arrays: List[array], dtype) -> np.ndarray:
+    if not arrays:
+        return np.zeros(0, dtype=dtype)
+    return np.concatenate([np.frombuffer(values, dtype=dtype) for values in arrays])
+
+
+def _to_array(typecode: str, values: np.ndarray) -> array:
+    result = array(typecode)
+    result.frombytes(values.astype(np.dtype(typecode)).tobytes())
+    return result
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Fuse ranked id lists; ids ranked high in any list come first."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -1,13 +1,68 @@
+import httpx
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, AsyncIterator
+from services import metrics
+
+
+def create_http_client(http2: bool = True, timeout: float = 120.0) -> httpx.AsyncClient:
+    """Create a long-lived HTTP client with a keep-alive connection pool."""
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(timeout, connect=10.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0),
+    )
+
+
+def usage_field(obj, name: str, default=0):
+    """Read a field from a usage object or dict; SDKs expose newer fields only as extras."""
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        value = obj.get(name, default)
+    else:
+        value = getattr(obj, name, default)
+    return default if value is None else value
+
+
+def record_usage(provider: str, latency_ms: float, input_tokens: int, cached_tokens: int = 0, cache_write_tokens: int = 0):
+    """Record prompt token usage and latency of one LLM call.
+
+    Latency is kept separately for calls that did and did not read from the
+    provider's prompt cache, so the savings show up in /api/metrics.
+    """
+    metrics.incr(f"llm.{provider}.requests")
+    metrics.incr(f"llm.{provider}.input_tokens", input_tokens)
+    metrics.incr(f"llm.{provider}.cached_tokens", cached_tokens)
+    metrics.incr(f"llm.{provider}.cache_write_tokens", cache_write_tokens)
+    cache_state = "cached" if cached_tokens else "uncached"
+    metrics.observe(f"llm.{provider}.latency_ms.{cache_state}", latency_ms)
 
 
 class BaseLLMProvider(ABC):
+    """LLM chat provider.
+
+    ``system_prompt`` is the static, per-chatbot part of the instructions and
+    is sent first so providers can reuse it from their prefix caches.
+    ``context`` holds the per-request part (retrieved documents, session
+    summary) and is placed after it.
+    """
+
     @abstractmethod
-    async def chat(self, messages: List[Dict], system_prompt: str) -> str:
+    async def chat(self, messages: List[Dict], system_prompt: str, context: str = "") -> str:
         """Send messages and return response text."""
         pass
 
+    async def chat_stream(self, messages: List[Dict], system_prompt: str, context: str = "") -> AsyncIterator[str]:
+        """Send messages and yield response text deltas as they arrive.
+
+        Providers without native streaming fall back to a single delta.
+        """
+        yield await self.chat(messages, system_prompt, context)
+
+    async def aclose(self):
+        """Release pooled connections held by this provider."""
+        pass
+
     @abstractmethod
     def get_model_list(self) -> List[str]:
         """Return list of available models for this provider."""
@@ -1,24 +1,66 @@
+import time
 import anthropic
-from typing import List, Dict
-from .base import BaseLLMProvider
+from typing import List, Dict, AsyncIterator
+from .base import BaseLLMProvider, create_http_client, record_usage, usage_field
 
 
 class ClaudeProvider(BaseLLMProvider):
     def __init__(self, model: str, api_key: str = None):
         self.model = model
-        self.client = anthropic.Anthropic(api_key=api_key)
+        self.client = anthropic.AsyncAnthropic(api_key=api_key, http_client=create_http_client())
+        # Prompt caching is still a beta API in this SDK version
+        self.messages = self.client.beta.prompt_caching.messages
 
-    async def chat(self, messages: List[Dict], system_prompt: str) -> str:
+    def _system_blocks(self, system_prompt: str, context: str) -> List[Dict]:
+        """Mark the static system prompt as a cacheable prefix."""
+        blocks = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        if context:
+            blocks.append({"type": "text", "text": context})
+        return blocks
+
+    def _record_usage(self, usage, started: float):
+        cached = usage_field(usage, "cache_read_input_tokens")
+        written = usage_field(usage, "cache_creation_input_tokens")
+        record_usage(
+            "claude",
+            (time.perf_counter() - started) * 1000,
+            usage_field(usage, "input_tokens") + cached + written,
+            cached,
+            written,
+        )
+
+    async def chat(self, messages: List[Dict], system_prompt: str, context: str = "") -> str:
         try:
-            response = self.client.messages.create(
+            started = time.perf_counter()
+            response = await self.messages.create(
                 model=self.model,
                 max_tokens=4096,
-                system=system_prompt,
+                system=self._system_blocks(system_prompt, context),
                 messages=messages,
             )
+            self._record_usage(response.usage, started)
             return response.content[0].text
         except Exception as e:
             raise Exception(f"Claude API error: {str(e)}")
 
+    async def chat_stream(self, messages: List[Dict], system_prompt: str, context: str = "") -> AsyncIterator[str]:
+        try:
+            started = time.perf_counter()
+            async with self.messages.stream(
+                model=self.model,
+                max_tokens=4096,
+                system=self._system_blocks(system_prompt, context),
+                messages=messages,
+            ) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                final = await stream.get_final_message()
+            self._record_usage(final.usage, started)
+        except Exception as e:
+            raise Exception(f"Claude API error: {str(e)}")
+
+    async def aclose(self):
+        await self.client.close()
+
     def get_model_list(self) -> List[str]:
         return ["claude-sonnet-4-5-20250929", "claude-haiku-4-5-20251001"]
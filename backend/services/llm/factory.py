@@ -1,35 +1,158 @@
+import asyncio
+import hashlib
+import logging
 import os
+from collections import OrderedDict
+from typing import List, Optional, Tuple
 from .base import BaseLLMProvider
 from .claude import ClaudeProvider
 from .openai_provider import OpenAIProvider
 from .gemini import GeminiProvider
 from .ollama import OllamaProvider
 from .groq import GroqProvider
+from .limiter import LimitedProvider, get_limiter
+from .failover import FailoverProvider
+
+
+logger = logging.getLogger(__name__)
+
+# Providers own pooled HTTP clients, so they are kept alive and reused
+# across chat turns instead of being rebuilt per message.
+MAX_CACHED_PROVIDERS = int(os.getenv("LLM_CLIENT_CACHE_SIZE", "32"))
+# A dropped provider is closed once it had no call for this many seconds,
+# which also covers callers that fetched it just before it was dropped
+RETIRE_GRACE_SECONDS = 10.0
+
+_provider_cache: "OrderedDict[tuple, LimitedProvider]" = OrderedDict()
+# Dropped providers waiting to be closed, and the tasks closing them
+_retiring = set()
+_tasks = set()
+# Loop the cached providers' clients belong to
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _hash_api_key(api_key: Optional[str]) -> str:
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+
+
+PROVIDERS = {
+    "claude": ClaudeProvider,
+    "openai": OpenAIProvider,
+    "gemini": GeminiProvider,
+    "ollama": OllamaProvider,
+    "groq": GroqProvider,
+}
+
+# Used as fallback when no api_key is provided
+ENV_KEYS = {
+    "claude": "ANTHROPIC_API_KEY",
+    "openai": "OPENAI_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+    "groq": "GROQ_API_KEY",
+}
+
+
+def _resolve_api_key(provider: str, api_key: Optional[str]) -> Optional[str]:
+    if not api_key and provider in ENV_KEYS:
+        return os.getenv(ENV_KEYS[provider])
+    return api_key
 
 
 def get_llm_provider(provider: str, model: str, api_key: str = None) -> BaseLLMProvider:
-    """Create and return the appropriate LLM provider instance."""
-
-    # Use environment variable as fallback if no api_key provided
-    env_keys = {
-        "claude": "ANTHROPIC_API_KEY",
-        "openai": "OPENAI_API_KEY",
-        "gemini": "GEMINI_API_KEY",
-        "groq": "GROQ_API_KEY",
-    }
-
-    if not api_key and provider in env_keys:
-        api_key = os.getenv(env_keys[provider])
-
-    providers = {
-        "claude": ClaudeProvider,
-        "openai": OpenAIProvider,
-        "gemini": GeminiProvider,
-        "ollama": OllamaProvider,
-        "groq": GroqProvider,
-    }
-
-    if provider not in providers:
+    """Return a cached LLM provider instance, creating it on first use."""
+    api_key = _resolve_api_key(provider, api_key)
+
+    if provider not in PROVIDERS:
         raise ValueError(f"Unsupported provider: {provider}")
 
-    return providers[provider](model=model, api_key=api_key)
+    global _loop
+    try:
+        _loop = asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    cache_key = (provider, model, _hash_api_key(api_key))
+    instance = _provider_cache.get(cache_key)
+    if instance is not None:
+        _provider_cache.move_to_end(cache_key)
+        return instance
+
+    # Calls to one provider account share an adaptive concurrency limit
+    instance = LimitedProvider(
+        PROVIDERS[provider](model=model, api_key=api_key),
+        get_limiter(provider, cache_key[2]),
+    )
+    _provider_cache[cache_key] = instance
+    while len(_provider_cache) > MAX_CACHED_PROVIDERS:
+        _retire(_provider_cache.popitem(last=False)[1])
+    return instance
+
+
+def get_llm_chain(chain: List[Tuple[str, str, Optional[str]]]) -> BaseLLMProvider:
+    """Return the provider for a (provider, model, api_key) chain, primary first.
+
+    A single entry is the plain cached provider; longer chains hedge and
+    fail over along the chain (see failover.py).
+    """
+    if len(chain) == 1:
+        return get_llm_provider(*chain[0])
+    members = []
+    for provider, model, api_key in chain:
+        key_hash = _hash_api_key(_resolve_api_key(provider, api_key))
+        members.append((f"{provider}:{model}:{key_hash[:8]}", get_llm_provider(provider, model, api_key)))
+    return FailoverProvider(members)
+
+
+def invalidate_llm_providers(provider: str = None, api_key: str = None):
+    """Drop cached providers, optionally only those for a provider and/or API key."""
+    key_hash = _hash_api_key(api_key) if api_key is not None else None
+    for cache_key in list(_provider_cache):
+        if provider is not None and cache_key[0] != provider:
+            continue
+        if key_hash is not None and cache_key[2] != key_hash:
+            continue
+        _retire(_provider_cache.pop(cache_key))
+
+
+def _retire(instance: LimitedProvider):
+    """Close a dropped provider once the calls still using its pool are done.
+
+    Invalidation also runs in sync routes (threadpool), so closing is
+    handed to the event loop that owns the provider's clients.
+    """
+    loop = _loop
+    if loop is None or loop.is_closed():
+        return
+    _retiring.add(instance)
+    loop.call_soon_threadsafe(_schedule_close, instance)
+
+
+def _schedule_close(instance: LimitedProvider):
+    task = asyncio.get_running_loop().create_task(_close_when_idle(instance))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _close_when_idle(instance: LimitedProvider):
+    await asyncio.sleep(RETIRE_GRACE_SECONDS)
+    while instance.active:
+        await asyncio.sleep(RETIRE_GRACE_SECONDS)
+    if instance not in _retiring:
+        # Already closed by close_llm_providers()
+        return
+    _retiring.discard(instance)
+    try:
+        await instance.aclose()
+    except Exception as e:
+        logger.warning("Closing a dropped LLM provider failed: %s", e)
+
+
+async def close_llm_providers():
+    """Close every cached or dropped provider's connection pool (used on shutdown)."""
+    instances = [*_provider_cache.values(), *_retiring]
+    _provider_cache.clear()
+    _retiring.clear()
+    for instance in instances:
+        try:
+            await instance.aclose()
+        except Exception:
+            pass
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from services import metrics
+from .base import BaseLLMProvider
+from .limiter import LLMOverloaded
+
+# A call that has not answered (or, when streaming, produced its first
+# delta) within the provider's observed p95 latency is hedged to the next
+# provider of the chain. Until HEDGE_MIN_SAMPLES calls were seen the
+# default delay is used.
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("LLM_HEDGE_DELAY_MS", "10000"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "250"))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Consecutive failures that open a provider's circuit, and seconds it stays
+# open before a single trial call may close it again
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+
+class ProviderHealth:
+    """Recent latencies and circuit breaker state of one provider in a chain."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._latencies = {"chat": deque(maxlen=LATENCY_WINDOW), "stream": deque(maxlen=LATENCY_WINDOW)}
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self.opened_at >= BREAKER_COOLDOWN:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may be sent now; claims the trial call of a half-open circuit."""
+        if self.opened_at is None:
+            return True
+        if self._probing or time.monotonic() - self.opened_at < BREAKER_COOLDOWN:
+            return False
+        self._probing = True
+        return True
+
+    def hedge_delay(self, kind: str) -> float:
+        """Seconds to wait for this provider before hedging."""
+        latencies = self._latencies[kind]
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            delay_ms = HEDGE_DEFAULT_DELAY_MS
+        else:
+            ordered = sorted(latencies)
+            delay_ms = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return max(delay_ms, HEDGE_MIN_DELAY_MS) / 1000
+
+    def record_success(self, kind: str, latency_ms: float):
+        self._latencies[kind].append(latency_ms)
+        self.failures = 0
+        if self.opened_at is not None:
+            metrics.incr(f"llm.breaker.{self.name}.closed")
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self, error: Exception):
+        if isinstance(error, LLMOverloaded):
+            # Our own queue was full; the provider itself is fine
+            self.record_cancelled()
+            return
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.failures >= BREAKER_FAILURES):
+            metrics.incr(f"llm.breaker.{self.name}.opened")
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def record_cancelled(self):
+        """Release the trial call of a half-open circuit without a verdict."""
+        self._probing = False
+
+    def record_censored(self, kind: str, elapsed_ms: float):
+        """Record a call cancelled after ``elapsed_ms`` as lasting at least the hedge delay.
+
+        Only winners would otherwise be sampled, and a provider that is
+        slow often loses, which would pull its p95 down and hedge it sooner.
+        """
+        self._latencies[kind].append(max(elapsed_ms, self.hedge_delay(kind) * 1000))
+        self.record_cancelled()
+
+    def stats(self) -> Dict:
+        latencies = self._latencies["chat"]
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "hedge_delay_ms": round(self.hedge_delay("chat") * 1000, 1),
+            "samples": len(latencies),
+        }
+
+
+_health: Dict[str, ProviderHealth] = {}
+
+
+def get_health(name: str) -> ProviderHealth:
+    health = _health.get(name)
+    if health is None:
+        health = _health[name] = ProviderHealth(name)
+    return health
+
+
+def get_breaker_stats() -> Dict:
+    """Circuit breaker state and hedge delay of every provider used in a chain."""
+    return {name: health.stats() for name, health in _health.items()}
+
+
+def _consume(task: asyncio.Future):
+    if not task.cancelled():
+        # Mark the error of a losing call as seen
+        task.exception()
+
+
+class FailoverProvider(BaseLLMProvider):
+    """Send a call to a chain of providers, hedging slow ones and skipping broken ones.
+
+    ``providers`` is an ordered list of (name, provider) pairs; ``name``
+    keys the shared latency and breaker state, so tests can pass local
+    fake providers with scripted latencies. The primary is called first.
+    When it fails, the next provider is called at once; when it is merely
+    slower than its p95, the next provider is called as well and the first
+    success wins. The calls still running are cancelled, which also frees
+    their limiter slots.
+    """
+
+    def __init__(self, providers: List[Tuple[str, BaseLLMProvider]]):
+        self.providers = [(name, provider, get_health(name)) for name, provider in providers]
+
+    async def chat(self, messages: List[Dict], system_prompt: str, context: str = "") -> str:
+        return await self._race("chat", lambda provider: provider.chat(messages, system_prompt, context))
+
+    async def chat_stream(self, messages: List[Dict], system_prompt: str, context: str = "") -> AsyncIterator[str]:
+        # Providers race to their first delta; the rest of the winner's stream
+        # follows. Errors after the first delta are not retried elsewhere.
+        async def first_delta(provider: BaseLLMProvider):
+            stream = provider.chat_stream(messages, system_prompt, context).__aiter__()
+            try:
+                return await stream.__anext__(), stream
+            except StopAsyncIteration:
+                return None, stream
+
+        delta, stream = await self._race("stream", first_delta, discard=lambda result: result[1].aclose())
+        if delta is None:
+            return
+        yield delta
+        async for delta in stream:
+            yield delta
+
+    async def _race(self, kind: str, call, discard=None):
+        """Return the first successful result of ``call(provider)`` along the chain.
+
+        ``discard`` releases a result that completed but lost the race.
+        """
+        remaining = list(self.providers)
+        running: Dict[asyncio.Future, Tuple[ProviderHealth, float]] = {}
+        winner = None
+        losers = []
+        errors = []
+
+        def start(provider: BaseLLMProvider, health: ProviderHealth):
+            running[asyncio.ensure_future(call(provider))] = (health, time.monotonic())
+            return health
+
+        def launch() -> Optional[ProviderHealth]:
+            while remaining:
+                name, provider, health = remaining.pop(0)
+                if health.allow():
+                    return start(provider, health)
+                metrics.incr(f"llm.failover.{name}.skipped")
+            return None
+
+        newest = launch()
+        if newest is None:
+            # Every circuit is open: try the primary rather than fail outright
+            _, provider, health = self.providers[0]
+            newest = start(provider, health)
+
+        try:
+            while running:
+                timeout = newest.hedge_delay(kind) if remaining else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    metrics.incr("llm.failover.hedges")
+                    newest = launch() or newest
+                    continue
+                for task in done:
+                    health, started = running.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        health.record_failure(error)
+                        errors.append(error)
+                        metrics.incr("llm.failover.failures")
+                        continue
+                    health.record_success(kind, (time.monotonic() - started) * 1000)
+                    if winner is None:
+                        winner = task
+                        if health is not self.providers[0][2]:
+                            metrics.incr("llm.failover.fallback_wins")
+                    else:
+                        losers.append(task)
+                if winner is not None:
+                    return winner.result()
+                if remaining:
+                    newest = launch() or newest
+        finally:
+            for task, (health, started) in running.items():
+                task.cancel()
+                task.add_done_callback(_consume)
+                if winner is not None:
+                    health.record_censored(kind, (time.monotonic() - started) * 1000)
+                else:
+                    # The caller gave up; this says nothing about the provider
+                    health.record_cancelled()
+            if discard is not None:
+                for task in losers:
+                    await discard(task.result())
+
+        if len(errors) == 1 or all(isinstance(e, LLMOverloaded) for e in errors):
+            # Shedding along the whole chain stays an LLMOverloaded (503)
+            raise errors[0]
+        raise Exception("All LLM providers failed: " + "; ".join(str(e) for e in errors))
+
+    async def aclose(self):
+        # The chained providers are owned by the provider cache
+        pass
+
+    def get_model_list(self) -> List[str]:
+        return self.providers[0][1].get_model_list()
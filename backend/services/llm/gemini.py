@@ -1,34 +1,83 @@
+import time
 import google.generativeai as genai
-from typing import List, Dict
-from .base import BaseLLMProvider
+from google.generativeai import client as genai_client
+from typing import List, Dict, AsyncIterator
+from .base import BaseLLMProvider, record_usage, usage_field
 
 
 class GeminiProvider(BaseLLMProvider):
     def __init__(self, model: str, api_key: str = None):
         self.model_name = model
-        if api_key:
-            genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel(model)
+        self.api_key = api_key
+        self._client = None
 
-    async def chat(self, messages: List[Dict], system_prompt: str) -> str:
-        try:
-            history = []
-            last_user_msg = ""
+    def _ensure_client(self):
+        """Give the model a client bound to this provider's API key.
+
+        genai.configure() sets one key for the whole process, so it cannot
+        serve providers cached side by side for different keys. The gRPC
+        channel needs the running loop, hence it is created on first use.
+        """
+        if self.api_key and self._client is None:
+            manager = genai_client._ClientManager()
+            manager.configure(api_key=self.api_key)
+            self._client = self.model._async_client = manager.make_client("generative_async")
+
+    def _start_chat(self, messages: List[Dict], system_prompt: str, context: str):
+        """Split messages into Gemini chat history and the final prompt."""
+        self._ensure_client()
+        history = []
+        last_user_msg = ""
 
-            for msg in messages:
-                role = "user" if msg["role"] == "user" else "model"
-                if msg == messages[-1] and role == "user":
-                    last_user_msg = msg["content"]
-                else:
-                    history.append({"role": role, "parts": [msg["content"]]})
+        for msg in messages:
+            role = "user" if msg["role"] == "user" else "model"
+            if msg == messages[-1] and role == "user":
+                last_user_msg = msg["content"]
+            else:
+                history.append({"role": role, "parts": [msg["content"]]})
 
-            chat = self.model.start_chat(history=history)
+        chat = self.model.start_chat(history=history)
 
-            prompt = f"System instruction: {system_prompt}\n\nUser: {last_user_msg}"
-            response = chat.send_message(prompt)
+        prompt = f"System instruction: {system_prompt}\n\n"
+        if context:
+            prompt += f"{context}\n\n"
+        prompt += f"User: {last_user_msg}"
+        return chat, prompt
+
+    def _record_usage(self, usage, started: float):
+        if usage is None:
+            return
+        record_usage(
+            "gemini",
+            (time.perf_counter() - started) * 1000,
+            usage_field(usage, "prompt_token_count"),
+            usage_field(usage, "cached_content_token_count"),
+        )
+
+    async def chat(self, messages: List[Dict], system_prompt: str, context: str = "") -> str:
+        try:
+            started = time.perf_counter()
+            chat, prompt = self._start_chat(messages, system_prompt, context)
+            response = await chat.send_message_async(prompt)
+            self._record_usage(getattr(response, "usage_metadata", None), started)
             return response.text
         except Exception as e:
             raise Exception(f"Gemini API error: {str(e)}")
 
+    async def chat_stream(self, messages: List[Dict], system_prompt: str, context: str = "") -> AsyncIterator[str]:
+        try:
+            chat, prompt = self._start_chat(messages, system_prompt, context)
+            response = await chat.send_message_async(prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise Exception(f"Gemini API error: {str(e)}")
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.transport.close()
+
     def get_model_list(self) -> List[str]:
         return ["gemini-1.5-pro", "gemini-1.5-flash"]
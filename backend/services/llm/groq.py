@@ -1,33 +1,66 @@
+import time
 import openai
-from typing import List, Dict
-from .base import BaseLLMProvider
+from typing import List, Dict, AsyncIterator
+from .base import BaseLLMProvider, create_http_client, record_usage, usage_field
 
 
 class GroqProvider(BaseLLMProvider):
     def __init__(self, model: str, api_key: str = None):
         self.model = model
-        self.client = openai.OpenAI(
+        self.client = openai.AsyncOpenAI(
             api_key=api_key,
             base_url="https://api.groq.com/openai/v1",
+            http_client=create_http_client(),
         )
 
-    async def chat(self, messages: List[Dict], system_prompt: str) -> str:
-        try:
-            formatted_messages = [{"role": "system", "content": system_prompt}]
-            for msg in messages:
-                formatted_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"],
-                })
+    def _format_messages(self, messages: List[Dict], system_prompt: str, context: str) -> List[Dict]:
+        # Static system prompt first so Groq's prefix cache can match it
+        formatted_messages = [{"role": "system", "content": system_prompt}]
+        if context:
+            formatted_messages.append({"role": "system", "content": context})
+        for msg in messages:
+            formatted_messages.append({
+                "role": msg["role"],
+                "content": msg["content"],
+            })
+        return formatted_messages
 
-            response = self.client.chat.completions.create(
+    async def chat(self, messages: List[Dict], system_prompt: str, context: str = "") -> str:
+        try:
+            started = time.perf_counter()
+            response = await self.client.chat.completions.create(
                 model=self.model,
-                messages=formatted_messages,
+                messages=self._format_messages(messages, system_prompt, context),
                 max_tokens=4096,
             )
+            if response.usage:
+                details = usage_field(response.usage, "prompt_tokens_details", None)
+                record_usage(
+                    "groq",
+                    (time.perf_counter() - started) * 1000,
+                    usage_field(response.usage, "prompt_tokens"),
+                    usage_field(details, "cached_tokens"),
+                )
             return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"Groq API error: {str(e)}")
 
+    async def chat_stream(self, messages: List[Dict], system_prompt: str, context: str = "") -> AsyncIterator[str]:
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self._format_messages(messages, system_prompt, context),
+                max_tokens=4096,
+                stream=True,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            raise Exception(f"Groq API error: {str(e)}")
+
+    async def aclose(self):
+        await self.client.close()
+
     def get_model_list(self) -> List[str]:
         return ["llama-3.3-70b-versatile", "llama-3.1-8b-instant", "mixtral-8x7b-32768", "gemma2-9b-it"]
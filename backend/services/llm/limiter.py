@@ -0,0 +1,278 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+from services import metrics
+from .base import BaseLLMProvider
+
+# Lower values are served first. Chat turns run at the default interactive
+# priority; background work (session summaries, evaluations) opts into
+# PRIORITY_BATCH with llm_priority().
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Concurrency per (provider, API key) starts at INITIAL and moves between
+# MIN and MAX: +1 per limit's worth of successful calls, halved on a 429,
+# and cut to DECREASE x limit when a stream's first delta takes
+# LATENCY_TOLERANCE times the usual time. The duration of a whole
+# completion depends on the length of the answer, so non-streaming calls
+# only lower the limit on a 429. Providers that fall over early get lower
+# ceilings; any of them can be set with LLM_MAX_CONCURRENCY_<PROVIDER>.
+#
+# Limiters live in each process, so the ceilings are for the whole
+# deployment and every one of the WEB_WORKERS API workers gets an equal
+# share (at least one call).
+MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "4"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+_DEFAULT_PROVIDER_MAX = {"ollama": 4, "groq": 8}
+WEB_WORKERS = max(1, int(os.getenv("WEB_WORKERS", "1")))
+LATENCY_TOLERANCE = float(os.getenv("LLM_LATENCY_TOLERANCE", "2.5"))
+LATENCY_DECREASE = float(os.getenv("LLM_LATENCY_DECREASE", "0.8"))
+RATE_LIMIT_DECREASE = 0.5
+# Calls observed before latency is trusted to lower the limit
+LATENCY_WARMUP = 10
+# Callers waiting for a slot; beyond this the lowest priority waiter is rejected
+QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "100"))
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+class LLMOverloaded(Exception):
+    """Raised when a provider's wait queue is full."""
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """Run the LLM calls made inside the block at the given priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether an error (or the SDK error it wraps) is an HTTP 429.
+
+    Only typed errors count: the status code of an Anthropic/OpenAI/Groq
+    or httpx error, or Gemini's ResourceExhausted. Matching "429" in
+    messages also caught timeouts and 400s that echo token counts.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+            return True
+        status = getattr(error, "status_code", None)
+        response = getattr(error, "response", None)
+        if status is None and response is not None:
+            status = getattr(response, "status_code", None)
+        if status == 429:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit with a bounded priority wait queue."""
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.max_concurrency = max(max_concurrency, MIN_CONCURRENCY)
+        self.limit = float(min(INITIAL_CONCURRENCY, self.max_concurrency))
+        self.in_flight = 0
+        self._waiters: List = []
+        self._seq = itertools.count()
+        self._loop = None
+        self._baseline_ms: Optional[float] = None
+        self._samples = 0
+        # Calls started before the last decrease do not decrease again
+        self._decreased_at = 0.0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one concurrency slot for the duration of a call.
+
+        Yields a dict; streaming callers set ``latency_ms`` to the time to
+        the first delta, which is compared to the usual latency. Calls that
+        leave it unset only count as successes.
+        """
+        await self._acquire(_priority.get())
+        started = time.monotonic()
+        call = {"latency_ms": None, "cancelled": False}
+        error = None
+        try:
+            yield call
+        except (asyncio.CancelledError, GeneratorExit):
+            call["cancelled"] = True
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._release(started, error, call)
+
+    async def _acquire(self, priority: int):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (old waiters belong to a dead loop)
+            self._loop, self._waiters, self.in_flight = loop, [], 0
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            metrics.observe(f"llm.{self.name}.queue_wait_ms", 0.0)
+            return
+
+        if len(self._waiters) >= QUEUE_SIZE:
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                metrics.incr(f"llm.{self.name}.rejected")
+                raise LLMOverloaded(f"{self.name} is overloaded, try again shortly")
+            # Make room by rejecting the newest waiter of the lowest priority
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            worst[2].set_exception(LLMOverloaded(f"{self.name} is overloaded, try again shortly"))
+            metrics.incr(f"llm.{self.name}.rejected")
+
+        future = loop.create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        metrics.observe(f"llm.{self.name}.queue_depth", len(self._waiters))
+        queued_at = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller gave up
+                self.in_flight -= 1
+                self._wake()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+        metrics.observe(f"llm.{self.name}.queue_wait_ms", (time.monotonic() - queued_at) * 1000)
+
+    def _release(self, started: float, error: Optional[Exception], call: Dict):
+        if asyncio.get_running_loop() is self._loop:
+            self.in_flight -= 1
+        if error is not None:
+            if is_rate_limited(error):
+                metrics.incr(f"llm.{self.name}.rate_limited")
+                self._decrease(started, RATE_LIMIT_DECREASE)
+        elif call["cancelled"]:
+            # A cancelled call says nothing about the provider
+            pass
+        elif call["latency_ms"] is not None:
+            self._observe_latency(started, call["latency_ms"])
+        else:
+            self._grow()
+        self._wake()
+
+    def _observe_latency(self, started: float, latency_ms: float):
+        self._samples += 1
+        baseline = self._baseline_ms
+        self._baseline_ms = latency_ms if baseline is None else baseline + 0.05 * (latency_ms - baseline)
+        if baseline is not None and self._samples > LATENCY_WARMUP and latency_ms > LATENCY_TOLERANCE * baseline:
+            metrics.incr(f"llm.{self.name}.slow_calls")
+            self._decrease(started, LATENCY_DECREASE)
+        else:
+            self._grow()
+
+    def _grow(self):
+        if self._waiters or self.in_flight + 1 >= int(self.limit):
+            # Only grow while the current limit is actually in use
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def _decrease(self, started: float, factor: float):
+        if started < self._decreased_at:
+            return
+        self.limit = max(MIN_CONCURRENCY, self.limit * factor)
+        self._decreased_at = time.monotonic()
+        metrics.incr(f"llm.{self.name}.limit_decreases")
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "baseline_latency_ms": round(self._baseline_ms, 1) if self._baseline_ms is not None else None,
+        }
+
+
+class LimitedProvider(BaseLLMProvider):
+    """Provider wrapper that sends every call through a limiter."""
+
+    def __init__(self, provider: BaseLLMProvider, limiter: AdaptiveLimiter):
+        self.provider = provider
+        self.limiter = limiter
+        # Calls and open streams, waiting or running; the factory closes an
+        # evicted provider only once this drops to zero
+        self.active = 0
+
+    async def chat(self, messages: List[Dict], system_prompt: str, context: str = "") -> str:
+        self.active += 1
+        try:
+            async with self.limiter.slot():
+                return await self.provider.chat(messages, system_prompt, context)
+        finally:
+            self.active -= 1
+
+    async def chat_stream(self, messages: List[Dict], system_prompt: str, context: str = "") -> AsyncIterator[str]:
+        self.active += 1
+        try:
+            # The slot is held until the stream ends; latency is time to first delta
+            async with self.limiter.slot() as call:
+                started = time.monotonic()
+                async for delta in self.provider.chat_stream(messages, system_prompt, context):
+                    if call["latency_ms"] is None:
+                        call["latency_ms"] = (time.monotonic() - started) * 1000
+                    yield delta
+        finally:
+            self.active -= 1
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+    def get_model_list(self) -> List[str]:
+        return self.provider.get_model_list()
+
+
+_limiters: Dict[tuple, AdaptiveLimiter] = {}
+
+
+def get_limiter(provider: str, key_hash: str) -> AdaptiveLimiter:
+    """Return the limiter shared by every model of one provider account."""
+    limiter = _limiters.get((provider, key_hash))
+    if limiter is None:
+        env_max = os.getenv(f"LLM_MAX_CONCURRENCY_{provider.upper()}")
+        max_concurrency = int(env_max) if env_max else _DEFAULT_PROVIDER_MAX.get(provider, MAX_CONCURRENCY)
+        max_concurrency = max(1, max_concurrency // WEB_WORKERS)
+        limiter = _limiters[(provider, key_hash)] = AdaptiveLimiter(provider, max_concurrency)
+    return limiter
+
+
+def get_limiter_stats() -> Dict:
+    """Current limit, in-flight calls and queue depth per provider account."""
+    return {
+        f"{provider}:{key_hash[:8]}": limiter.stats()
+        for (provider, key_hash), limiter in _limiters.items()
+    }
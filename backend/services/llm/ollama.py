@@ -1,49 +1,99 @@
 import httpx
+import json
 import os
-from typing import List, Dict
-from .base import BaseLLMProvider
+import time
+from typing import List, Dict, AsyncIterator
+from .base import BaseLLMProvider, create_http_client, record_usage
+
+# How long Ollama keeps the model loaded after a request. While it stays
+# loaded, the KV cache of the shared system prompt prefix is reused.
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
 
 
 class OllamaProvider(BaseLLMProvider):
     def __init__(self, model: str, api_key: str = None):
         self.model = model
         self.base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        # Ollama speaks plain HTTP/1.1; the pool still saves a connect per call
+        self.client = create_http_client(http2=False)
 
-    async def chat(self, messages: List[Dict], system_prompt: str) -> str:
-        try:
-            formatted_messages = [{"role": "system", "content": system_prompt}]
-            for msg in messages:
-                formatted_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"],
-                })
-
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/api/chat",
-                    json={
-                        "model": self.model,
-                        "messages": formatted_messages,
-                        "stream": False,
-                    },
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data["message"]["content"]
-        except httpx.ConnectError:
-            raise Exception(
+    def _format_messages(self, messages: List[Dict], system_prompt: str, context: str) -> List[Dict]:
+        formatted_messages = [{"role": "system", "content": system_prompt}]
+        if context:
+            formatted_messages.append({"role": "system", "content": context})
+        for msg in messages:
+            formatted_messages.append({
+                "role": msg["role"],
+                "content": msg["content"],
+            })
+        return formatted_messages
+
+    def _wrap_error(self, e: Exception) -> Exception:
+        """Translate httpx errors into user-facing messages."""
+        if isinstance(e, httpx.ConnectError):
+            return Exception(
                 f"Ollama 서버({self.base_url})에 연결할 수 없습니다. "
                 "Ollama가 실행 중인지 확인해주세요."
             )
-        except httpx.HTTPStatusError as e:
+        if isinstance(e, httpx.HTTPStatusError):
             if e.response.status_code == 404:
-                raise Exception(
+                return Exception(
                     f"Ollama 모델 '{self.model}'을 찾을 수 없습니다. "
                     f"터미널에서 'ollama pull {self.model}'을 실행해주세요."
                 )
-            raise Exception(f"Ollama API 오류 (HTTP {e.response.status_code}): {e.response.text}")
+            return Exception(f"Ollama API 오류 (HTTP {e.response.status_code}): {e.response.text}")
+        return Exception(f"Ollama API error: {str(e)}")
+
+    async def chat(self, messages: List[Dict], system_prompt: str, context: str = "") -> str:
+        try:
+            started = time.perf_counter()
+            response = await self.client.post(
+                f"{self.base_url}/api/chat",
+                json={
+                    "model": self.model,
+                    "messages": self._format_messages(messages, system_prompt, context),
+                    "stream": False,
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
+                },
+            )
+            response.raise_for_status()
+            data = response.json()
+            # prompt_eval_count only covers tokens not served from the KV cache
+            record_usage("ollama", (time.perf_counter() - started) * 1000, data.get("prompt_eval_count", 0))
+            return data["message"]["content"]
+        except Exception as e:
+            raise self._wrap_error(e)
+
+    async def chat_stream(self, messages: List[Dict], system_prompt: str, context: str = "") -> AsyncIterator[str]:
+        try:
+            async with self.client.stream(
+                "POST",
+                f"{self.base_url}/api/chat",
+                json={
+                    "model": self.model,
+                    "messages": self._format_messages(messages, system_prompt, context),
+                    "stream": True,
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
+                },
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+                # Ollama streams newline-delimited JSON objects
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    content = data.get("message", {}).get("content")
+                    if content:
+                        yield content
+                    if data.get("done"):
+                        break
         except Exception as e:
-            raise Exception(f"Ollama API error: {str(e)}")
+            raise self._wrap_error(e)
+
+    async def aclose(self):
+        await self.client.aclose()
 
     def get_model_list(self) -> List[str]:
         return ["llama3", "mistral", "gemma3"]
@@ -1,30 +1,71 @@
+import time
 import openai
-from typing import List, Dict
-from .base import BaseLLMProvider
+from typing import List, Dict, AsyncIterator
+from .base import BaseLLMProvider, create_http_client, record_usage, usage_field
 
 
 class OpenAIProvider(BaseLLMProvider):
     def __init__(self, model: str, api_key: str = None):
         self.model = model
-        self.client = openai.OpenAI(api_key=api_key)
+        self.client = openai.AsyncOpenAI(api_key=api_key, http_client=create_http_client())
 
-    async def chat(self, messages: List[Dict], system_prompt: str) -> str:
+    def _format_messages(self, messages: List[Dict], system_prompt: str, context: str) -> List[Dict]:
+        # OpenAI caches matching prompt prefixes automatically, so the static
+        # system prompt goes first and the per-request context after it.
+        formatted_messages = [{"role": "system", "content": system_prompt}]
+        if context:
+            formatted_messages.append({"role": "system", "content": context})
+        for msg in messages:
+            formatted_messages.append({
+                "role": msg["role"],
+                "content": msg["content"],
+            })
+        return formatted_messages
+
+    def _record_usage(self, usage, started: float):
+        if usage is None:
+            return
+        details = usage_field(usage, "prompt_tokens_details", None)
+        record_usage(
+            "openai",
+            (time.perf_counter() - started) * 1000,
+            usage_field(usage, "prompt_tokens"),
+            usage_field(details, "cached_tokens"),
+        )
+
+    async def chat(self, messages: List[Dict], system_prompt: str, context: str = "") -> str:
         try:
-            formatted_messages = [{"role": "system", "content": system_prompt}]
-            for msg in messages:
-                formatted_messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"],
-                })
-
-            response = self.client.chat.completions.create(
+            started = time.perf_counter()
+            response = await self.client.chat.completions.create(
                 model=self.model,
-                messages=formatted_messages,
+                messages=self._format_messages(messages, system_prompt, context),
                 max_tokens=4096,
             )
+            self._record_usage(response.usage, started)
             return response.choices[0].message.content
         except Exception as e:
             raise Exception(f"OpenAI API error: {str(e)}")
 
+    async def chat_stream(self, messages: List[Dict], system_prompt: str, context: str = "") -> AsyncIterator[str]:
+        try:
+            started = time.perf_counter()
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self._format_messages(messages, system_prompt, context),
+                max_tokens=4096,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+                if chunk.usage:
+                    self._record_usage(chunk.usage, started)
+        except Exception as e:
+            raise Exception(f"OpenAI API error: {str(e)}")
+
+    async def aclose(self):
+        await self.client.close()
+
     def get_model_list(self) -> List[str]:
         return ["gpt-4o", "gpt-4o-mini"]
@@ -0,0 +1,38 @@
+import threading
+from collections import defaultdict
+from typing import Dict
+
+
+# Process-local counters and value summaries exposed through GET /api/metrics
+_counters: Dict[str, int] = defaultdict(int)
+_summaries: Dict[str, Dict[str, float]] = {}
+_lock = threading.Lock()
+
+
+def incr(name: str, value: int = 1):
+    """Increase a named counter."""
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, value: float):
+    """Record one observation of a named value (count, sum and max are kept)."""
+    with _lock:
+        summary = _summaries.get(name)
+        if summary is None:
+            summary = _summaries[name] = {"count": 0, "sum": 0.0, "max": value}
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["max"] = max(summary["max"], value)
+
+
+def get_metrics() -> Dict:
+    """Return a snapshot of all counters and summaries."""
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "summaries": {
+                name: {**summary, "avg": summary["sum"] / summary["count"]}
+                for name, summary in _summaries.items()
+            },
+        }
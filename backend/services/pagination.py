@@ -0,0 +1,55 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+
+# Page sizes accepted by the list endpoints
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Encode the sort key of the last row of a page as an opaque cursor."""
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, timestamp_fields: int = 1) -> List:
+    """Decode a cursor made by ``encode_cursor``.
+
+    The first ``timestamp_fields`` values are parsed back into datetimes.
+    Raises ValueError for cursors this server did not issue.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(payload, list):
+            raise ValueError
+        for i in range(timestamp_fields):
+            payload[i] = datetime.fromisoformat(payload[i]) if payload[i] is not None else None
+        return payload
+    except (ValueError, TypeError, IndexError):
+        raise ValueError("Invalid cursor")
+
+
+def after_cursor(columns: Sequence, values: Sequence, descending: bool):
+    """Build the keyset condition selecting rows that sort after ``values``.
+
+    Expands (a, b) > (x, y) into a OR of ANDs, which every backend can
+    serve from a composite index.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        beyond = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, beyond))
+    return or_(*clauses)
+
+
+def split_page(rows: List, limit: int, key) -> Tuple[List, Optional[str]]:
+    """Split ``limit + 1`` fetched rows into the page and the next cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
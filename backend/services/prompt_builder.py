@@ -0,0 +1,163 @@
+import logging
+from typing import List, Dict
+
+from models.database import Chatbot, Action
+from services.action_service import build_action_prompt, build_matched_actions_prompt
+from services.tokens import count_tokens
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT_TOKEN_BUDGET = 6000
+# Per-message overhead of chat formats (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def build_static_prompt(chatbot: Chatbot, actions: List[Action]) -> str:
+    """Build the per-chatbot part of the system prompt: persona, rules and actions.
+
+    It must not depend on the request so providers can cache it as a prefix;
+    it is compiled once per chatbot configuration version (see
+    ``services.chatbot_config``).
+    """
+    base_prompt = chatbot.system_prompt or ""
+
+    prompt = f"""You are '{chatbot.name}' chatbot. You serve the '{chatbot.department or "General"}' department.
+{base_prompt}
+
+Answer based on the reference documents that follow these instructions.
+
+Rules:
+1. If the answer is not in the documents, honestly say you don't know.
+2. Answer in the same language the user is using.
+3. Be helpful and concise.
+"""
+
+    action_prompt = build_action_prompt(actions)
+    if action_prompt:
+        prompt += action_prompt
+
+    return prompt
+
+
+def build_context_prompt(context: str, summary: str = "", matched_actions: List[Action] = None) -> str:
+    """Build the per-request part of the system prompt."""
+    prompt = build_matched_actions_prompt(matched_actions or [])
+    if prompt:
+        prompt += "\n"
+    prompt += f"""Reference documents:
+---
+{context if context else "No reference documents available."}
+---
+"""
+    if summary:
+        prompt += f"\nSummary of the earlier conversation:\n{summary}\n"
+    return prompt
+
+
+def _message_tokens(content: str, family: str) -> int:
+    return count_tokens(content, family) + MESSAGE_OVERHEAD_TOKENS
+
+
+def assemble_prompt(
+    chatbot,
+    message: str,
+    chunks: List[Dict],
+    matched_actions: List[Action],
+    history: List[Dict],
+    summary: str,
+) -> Dict:
+    """Fit a turn into the chatbot's prompt token budget.
+
+    ``chatbot`` is a ``ChatbotConfig`` snapshot carrying the compiled static
+    prompt. The user message, the static prompt (persona, rules, actions)
+    and the keyword-matched candidate actions are always sent. The rest of
+    the budget goes to retrieved chunks in rank order, then to the session
+    summary and the most recent turns, newest first. Returns the static
+    ``system_prompt``, the per-request ``context`` and the ``messages`` to
+    send, ``included_history`` (how many of the trailing history messages
+    made it) and token ``stats``.
+    """
+    budget = chatbot.prompt_token_budget or DEFAULT_PROMPT_TOKEN_BUDGET
+
+    family = chatbot.family
+    system_prompt = chatbot.static_prompt
+    fixed_tokens = chatbot.static_tokens + count_tokens(
+        build_context_prompt("", matched_actions=matched_actions), family
+    )
+    message_tokens = _message_tokens(message, family)
+    used = fixed_tokens + message_tokens
+
+    context_chunks = []
+    context_tokens = 0
+    for chunk in chunks:
+        tokens = count_tokens(chunk["text"], family) + 1
+        if used + tokens > budget:
+            continue
+        context_chunks.append(chunk)
+        context_tokens += tokens
+        used += tokens
+
+    summary_tokens = count_tokens(summary, family) + 10 if summary else 0
+    if summary_tokens and used + summary_tokens > budget:
+        summary, summary_tokens = "", 0
+    used += summary_tokens
+
+    start = len(history)
+    history_tokens = 0
+    for index in range(len(history) - 1, -1, -1):
+        tokens = _message_tokens(history[index]["content"], family)
+        if used + history_tokens + tokens > budget:
+            break
+        history_tokens += tokens
+        start = index
+    # Chat APIs expect the conversation to start with a user message
+    while start < len(history) and history[start]["role"] != "user":
+        history_tokens -= _message_tokens(history[start]["content"], family)
+        start += 1
+    used += history_tokens
+    included = len(history) - start
+
+    context = "\n\n".join(chunk["text"] for chunk in context_chunks)
+    messages = [{"role": conv["role"], "content": conv["content"]} for conv in history[start:]]
+    messages.append({"role": "user", "content": message})
+
+    stats = {
+        "budget": budget,
+        "total": used,
+        "fixed": fixed_tokens,
+        "message": message_tokens,
+        "context": context_tokens,
+        "summary": summary_tokens,
+        "history": history_tokens,
+        "dropped_chunks": len(chunks) - len(context_chunks),
+        "dropped_messages": len(history) - included,
+    }
+    _record_stats(chatbot.id, stats)
+
+    return {
+        "system_prompt": system_prompt,
+        "context": build_context_prompt(context, summary, matched_actions),
+        "messages": messages,
+        "context_chunks": context_chunks,
+        "included_history": included,
+        "stats": stats,
+    }
+
+
+def _record_stats(chatbot_id: int, stats: Dict):
+    """Log and record the token breakdown of one prompt."""
+    logger.info(
+        "Prompt for chatbot %s: %d/%d tokens (fixed %d, message %d, context %d, "
+        "summary %d, history %d; dropped %d chunks, %d messages)",
+        chatbot_id, stats["total"], stats["budget"], stats["fixed"], stats["message"],
+        stats["context"], stats["summary"], stats["history"],
+        stats["dropped_chunks"], stats["dropped_messages"],
+    )
+    metrics.incr("prompt.requests")
+    for part in ("total", "fixed", "context", "summary", "history"):
+        metrics.observe(f"prompt.{part}_tokens", stats[part])
+    if stats["total"] > stats["budget"]:
+        metrics.incr("prompt.over_budget")
+    metrics.incr("prompt.dropped_chunks", stats["dropped_chunks"])
+    metrics.incr("prompt.dropped_messages", stats["dropped_messages"])
@@ -1,118 +1,413 @@
+import logging
 import os
+import re
+import threading
+import time
+from itertools import islice
 import chromadb
-from pypdf import PdfReader
-from docx import Document as DocxDocument
-from typing import List
+from chromadb.utils import embedding_functions
+from typing import List, Dict, Optional, Callable, Iterable, Tuple, Union
+from collections import OrderedDict
+from services import metrics
+from services.embedding_cache import EmbeddingCache
+from services.keyword_index import KeywordIndex, reciprocal_rank_fusion
+from services.document_parser import (
+    parse_document,
+    iter_document_blocks,
+    count_document_blocks,
+    chunk_text,
+    usable_cpus,
+)
+from services.chunking import (
+    chunk_document,
+    DEFAULT_CHUNK_STRATEGY,
+    DEFAULT_CHUNK_MAX_TOKENS,
+    DEFAULT_CHUNK_OVERLAP_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
 
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads"))
 CHROMA_DIR = os.getenv("CHROMA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "chroma_db"))
 
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+KEYWORD_INDEX_DIR = os.path.join(CHROMA_DIR, "keyword_index")
+
 os.makedirs(CHROMA_DIR, exist_ok=True)
+os.makedirs(KEYWORD_INDEX_DIR, exist_ok=True)
 
-chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
+# Opened on first use, so processes that only import this module (API workers
+# in multi-worker mode) never touch the Chroma directory
+_chroma_client = None
+_embedding_cache = None
+_clients_lock = threading.Lock()
 
+# Same model Chroma uses by default; kept explicit so queries can be embedded once and reused
+embedding_function = embedding_functions.DefaultEmbeddingFunction()
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
 
-def _get_collection_name(chatbot_id: int) -> str:
-    return f"chatbot_{chatbot_id}"
+# Chunks embedded and written per batch; scales with cores since the embedding
+# model parallelizes across them, while keeping memory per batch bounded
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", str(min(256, 32 * usable_cpus()))))
 
 
-def parse_pdf(file_path: str) -> str:
-    """Extract text from a PDF file."""
-    reader = PdfReader(file_path)
-    text = ""
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text
-
-
-def parse_docx(file_path: str) -> str:
-    """Extract text from a Word document."""
-    doc = DocxDocument(file_path)
-    text = ""
-    for paragraph in doc.paragraphs:
-        if paragraph.text.strip():
-            text += paragraph.text + "\n"
-    return text
-
-
-def parse_txt(file_path: str) -> str:
-    """Read a plain text file."""
-    with open(file_path, "r", encoding="utf-8") as f:
-        return f.read()
-
-
-def parse_document(file_path: str, file_type: str) -> str:
-    """Parse document based on its type."""
-    parsers = {
-        "pdf": parse_pdf,
-        "docx": parse_docx,
-        "txt": parse_txt,
-    }
-    parser = parsers.get(file_type)
-    if not parser:
-        raise ValueError(f"Unsupported file type: {file_type}")
-    return parser(file_path)
-
-
-def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-    """Split text into overlapping chunks."""
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        if chunk.strip():
-            chunks.append(chunk.strip())
-        start = end - overlap
-    return chunks
-
-
-def add_document_to_vectordb(chatbot_id: int, document_id: int, text: str) -> int:
-    """Add document chunks to ChromaDB and return chunk count."""
-    collection = chroma_client.get_or_create_collection(
-        name=_get_collection_name(chatbot_id)
-    )
+def _get_chroma_client():
+    global _chroma_client
+    with _clients_lock:
+        if _chroma_client is None:
+            _chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
+        return _chroma_client
 
-    chunks = chunk_text(text)
-    if not chunks:
-        return 0
 
-    ids = [f"doc_{document_id}_chunk_{i}" for i in range(len(chunks))]
-    metadatas = [{"document_id": document_id, "chunk_index": i} for i in range(len(chunks))]
+def _get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    with _clients_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(os.path.join(CHROMA_DIR, "embedding_cache.sqlite3"), EMBEDDING_MODEL_NAME)
+        return _embedding_cache
 
-    collection.add(
-        documents=chunks,
-        ids=ids,
-        metadatas=metadatas,
-    )
 
-    return len(chunks)
+# Retrieval results keyed by (chatbot_id, generation, normalized query, n_results).
+# Every write to a collection bumps its generation, so stale entries are never
+# looked up again and simply age out of the LRU.
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "2048"))
 
+_retrieval_cache: "OrderedDict[tuple, List[Dict]]" = OrderedDict()
+_generations: Dict[int, int] = {}
+_chunk_counts: Dict[int, int] = {}  # known collection sizes; missing means unknown
+_cache_lock = threading.Lock()
+
+# BM25 keyword search fused with dense results via reciprocal rank fusion
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+# Each ranking contributes this many candidates per requested result
+HYBRID_CANDIDATE_FACTOR = 2
+
+# Keyword indexes are written to disk at most this often (seconds), not
+# after every upload; an index that missed its save is rebuilt on load
+KEYWORD_INDEX_SAVE_DELAY = float(os.getenv("KEYWORD_INDEX_SAVE_DELAY", "30"))
+
+_keyword_indexes: Dict[int, KeywordIndex] = {}
+_keyword_lock = threading.Lock()
+_keyword_dirty = set()
+_keyword_save_timer: Optional[threading.Timer] = None
+
+
+def _get_collection_name(chatbot_id: int) -> str:
+    return f"chatbot_{chatbot_id}"
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, punctuation and spacing so near-duplicate questions share a cache key."""
+    return " ".join(re.findall(r"\w+", query.casefold()))
+
+
+def _keyword_index_path(chatbot_id: int) -> str:
+    return os.path.join(KEYWORD_INDEX_DIR, f"chatbot_{chatbot_id}.npz")
+
+
+def _get_keyword_index(chatbot_id: int, collection=None) -> KeywordIndex:
+    """Return the chatbot's keyword index, loading it from disk on first use.
+
+    An index missing on disk or out of step with the collection (data
+    indexed before hybrid search existed, a save lost to a crash) is
+    rebuilt once from the collection.
+    """
+    with _keyword_lock:
+        index = _keyword_indexes.get(chatbot_id)
+        if index is not None:
+            return index
+
+        # Older versions pickled the index; never unpickle, just rebuild
+        legacy_path = os.path.join(KEYWORD_INDEX_DIR, f"chatbot_{chatbot_id}.pkl")
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        index = KeywordIndex.load(_keyword_index_path(chatbot_id))
+        count = collection.count() if collection is not None else None
+        if index is None or (count is not None and len(index) != count):
+            index = KeywordIndex()
+            if count:
+                data = collection.get(include=["documents"])
+                for chunk_id, text in zip(data["ids"], data["documents"]):
+                    index.add(chunk_id, text)
+                index.save(_keyword_index_path(chatbot_id))
+        _keyword_indexes[chatbot_id] = index
+        return index
+
+
+def _schedule_keyword_save(chatbot_id: int):
+    """Save the chatbot's keyword index within KEYWORD_INDEX_SAVE_DELAY seconds."""
+    global _keyword_save_timer
+    with _keyword_lock:
+        _keyword_dirty.add(chatbot_id)
+        if _keyword_save_timer is None:
+            _keyword_save_timer = threading.Timer(KEYWORD_INDEX_SAVE_DELAY, save_keyword_indexes)
+            _keyword_save_timer.daemon = True
+            _keyword_save_timer.start()
+
+
+def save_keyword_indexes():
+    """Write every keyword index changed since its last save (also used on shutdown)."""
+    global _keyword_save_timer
+    with _keyword_lock:
+        if _keyword_save_timer is not None:
+            _keyword_save_timer.cancel()
+            _keyword_save_timer = None
+        dirty = [(chatbot_id, _keyword_indexes[chatbot_id]) for chatbot_id in _keyword_dirty
+                 if chatbot_id in _keyword_indexes]
+        _keyword_dirty.clear()
+    for chatbot_id, index in dirty:
+        try:
+            index.save(_keyword_index_path(chatbot_id))
+        except OSError as e:
+            logger.warning("Saving the keyword index of chatbot %s failed: %s", chatbot_id, e)
+
+
+def _bump_generation(chatbot_id: int, count: Optional[int] = None):
+    """Invalidate cached retrievals of a chatbot and record its new chunk count, if known."""
+    with _cache_lock:
+        _generations[chatbot_id] = _generations.get(chatbot_id, 0) + 1
+        if count is None:
+            _chunk_counts.pop(chatbot_id, None)
+        else:
+            _chunk_counts[chatbot_id] = count
+
+
+def add_document_to_vectordb(
+    chatbot_id: int,
+    document_id: int,
+    text: Union[str, Iterable[str]],
+    progress: Optional[Callable[[int], None]] = None,
+    chunk_strategy: str = DEFAULT_CHUNK_STRATEGY,
+    chunk_max_tokens: int = DEFAULT_CHUNK_MAX_TOKENS,
+    chunk_overlap_tokens: int = DEFAULT_CHUNK_OVERLAP_TOKENS,
+) -> int:
+    """Add document chunks to ChromaDB and return chunk count.
+
+    ``text`` is either the full text or a stream of blocks from
+    ``iter_document_blocks``. Chunks are embedded and upserted in batches of
+    ``INGEST_BATCH_SIZE`` with deterministic ids, so re-running an
+    interrupted document skips chunks that are already stored.
+    ``progress(chunks_done)`` is called after each batch.
+    """
+    collection = _get_chroma_client().get_or_create_collection(
+        name=_get_collection_name(chatbot_id),
+        embedding_function=embedding_function,
+    )
+    keyword_index = _get_keyword_index(chatbot_id, collection)
+
+    blocks = [text] if isinstance(text, str) else text
+    chunks = chunk_document(blocks, chunk_strategy, chunk_max_tokens, chunk_overlap_tokens)
+
+    started = time.perf_counter()
+    chunk_count = 0
+    cache_hits = 0
+    skipped = 0
+    while True:
+        batch = list(islice(chunks, INGEST_BATCH_SIZE))
+        if not batch:
+            break
+
+        ids = [f"doc_{document_id}_chunk_{chunk_count + i}" for i in range(len(batch))]
+        stored = collection.get(ids=ids, include=["documents"])
+        already_stored = dict(zip(stored["ids"], stored["documents"]))
+        pending = [i for i, chunk_id in enumerate(ids) if already_stored.get(chunk_id) != batch[i]]
+        skipped += len(batch) - len(pending)
+
+        if pending:
+            pending_chunks = [batch[i] for i in pending]
+            embeddings, hits = embed_chunks(pending_chunks)
+            cache_hits += hits
+            collection.upsert(
+                documents=pending_chunks,
+                embeddings=embeddings,
+                ids=[ids[i] for i in pending],
+                metadatas=[{"document_id": document_id, "chunk_index": chunk_count + i} for i in pending],
+            )
+        for chunk_id, chunk in zip(ids, batch):
+            keyword_index.add(chunk_id, chunk)
+
+        chunk_count += len(batch)
+        if progress:
+            progress(chunk_count)
+
+    # Drop leftovers of an earlier, longer run of the same document
+    leftovers = collection.get(
+        where={"$and": [{"document_id": document_id}, {"chunk_index": {"$gte": chunk_count}}]},
+        include=[],
+    )["ids"]
+    if leftovers:
+        collection.delete(ids=leftovers)
+        keyword_index.remove(leftovers)
+    _schedule_keyword_save(chatbot_id)
+    _bump_generation(chatbot_id, collection.count())
+
+    elapsed = time.perf_counter() - started
+    if chunk_count:
+        logger.info(
+            "Indexed document %s for chatbot %s: %d chunks in %.1fs (%.1f chunks/s), "
+            "%d already stored, embedding cache hit ratio %.0f%%",
+            document_id, chatbot_id, chunk_count, elapsed, chunk_count / elapsed if elapsed else 0.0,
+            skipped, 100.0 * cache_hits / max(chunk_count - skipped, 1),
+        )
+    return chunk_count
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Embed texts with the collection embedding model."""
+    return [list(map(float, e)) for e in embedding_function(texts)]
+
+
+def embed_chunks(chunks: List[str]):
+    """Embed document chunks through the persistent embedding cache.
+
+    Returns (embeddings, cache_hits).
+    """
+    embeddings = _get_embedding_cache().get_many(chunks)
+    missing = [i for i, e in enumerate(embeddings) if e is None]
+    if missing:
+        new_embeddings = embed_texts([chunks[i] for i in missing])
+        _get_embedding_cache().put_many([chunks[i] for i in missing], new_embeddings)
+        for i, embedding in zip(missing, new_embeddings):
+            embeddings[i] = embedding
+
+    cache_hits = len(chunks) - len(missing)
+    metrics.incr("embedding_cache.hits", cache_hits)
+    metrics.incr("embedding_cache.misses", len(missing))
+    return embeddings, cache_hits
+
+
+def search_vectordb(
+    chatbot_id: int,
+    query: str,
+    n_results: int = 5,
+    query_embedding: Optional[List[float]] = None,
+) -> List[Dict]:
+    """Query ChromaDB and return relevant chunks as {"id", "text"} dicts.
+
+    Pass ``query_embedding`` when the caller has already embedded the query.
+    Results are served from the retrieval cache when possible, which skips
+    both the embedding and the ANN search.
+    """
+    with _cache_lock:
+        generation = _generations.get(chatbot_id, 0)
+        count = _chunk_counts.get(chatbot_id)
+        cache_key = (chatbot_id, generation, normalize_query(query), n_results)
+        cached = _retrieval_cache.get(cache_key)
+        if cached is not None:
+            _retrieval_cache.move_to_end(cache_key)
+    if cached is not None:
+        metrics.incr("retrieval_cache.hits")
+        return list(cached)
+    metrics.incr("retrieval_cache.misses")
+
+    if count == 0:
+        return []
 
-def query_vectordb(chatbot_id: int, query: str, n_results: int = 5) -> List[str]:
-    """Query ChromaDB and return relevant document chunks."""
     collection_name = _get_collection_name(chatbot_id)
 
     try:
-        collection = chroma_client.get_collection(name=collection_name)
+        collection = _get_chroma_client().get_collection(
+            name=collection_name,
+            embedding_function=embedding_function,
+        )
     except Exception:
-        return []
+        collection = None
 
-    if collection.count() == 0:
-        return []
+    if count is None:
+        count = collection.count() if collection is not None else 0
+        with _cache_lock:
+            if _generations.get(chatbot_id, 0) == generation:
+                _chunk_counts[chatbot_id] = count
 
+    chunks = []
+    if collection is not None and count > 0:
+        chunks = _hybrid_search(chatbot_id, collection, count, query, n_results, query_embedding)
+
+    with _cache_lock:
+        _retrieval_cache[cache_key] = chunks
+        while len(_retrieval_cache) > RETRIEVAL_CACHE_SIZE:
+            _retrieval_cache.popitem(last=False)
+    return list(chunks)
+
+
+def _is_cached(chatbot_id: int, query: str, n_results: int) -> bool:
+    """Whether search_vectordb can answer without embedding the query."""
+    with _cache_lock:
+        generation = _generations.get(chatbot_id, 0)
+        cache_key = (chatbot_id, generation, normalize_query(query), n_results)
+        return cache_key in _retrieval_cache or _chunk_counts.get(chatbot_id) == 0
+
+
+def search_batch(requests: List[Tuple[int, str, int, bool]]) -> List:
+    """Serve several searches with a single embedding-model call.
+
+    Each request is (chatbot_id, query, n_results, want_embedding). Queries
+    missing from the retrieval cache, or whose embedding is wanted, are
+    embedded together. Returns a (chunks, embedding or None) pair per
+    request, or the exception raised for that request.
+    """
+    to_embed = [
+        i for i, (chatbot_id, query, n_results, want_embedding) in enumerate(requests)
+        if want_embedding or not _is_cached(chatbot_id, query, n_results)
+    ]
+    embeddings = {}
+    if to_embed:
+        embeddings = dict(zip(to_embed, embed_texts([requests[i][1] for i in to_embed])))
+    metrics.observe("retrieval.batch_size", len(requests))
+    metrics.observe("retrieval.batch_embedded", len(to_embed))
+
+    results = []
+    for i, (chatbot_id, query, n_results, want_embedding) in enumerate(requests):
+        try:
+            chunks = search_vectordb(chatbot_id, query, n_results, query_embedding=embeddings.get(i))
+        except Exception as e:
+            results.append(e)
+            continue
+        results.append((chunks, embeddings.get(i) if want_embedding else None))
+    return results
+
+
+def _hybrid_search(
+    chatbot_id: int,
+    collection,
+    count: int,
+    query: str,
+    n_results: int,
+    query_embedding: Optional[List[float]],
+) -> List[Dict]:
+    """Dense search, fused with BM25 keyword search when HYBRID_SEARCH is on."""
+    if query_embedding is None:
+        query_embedding = embed_texts([query])[0]
+
+    candidates = n_results * HYBRID_CANDIDATE_FACTOR if HYBRID_SEARCH else n_results
     results = collection.query(
-        query_texts=[query],
-        n_results=min(n_results, collection.count()),
+        query_embeddings=[query_embedding],
+        n_results=min(candidates, count),
     )
-
+    texts = {}
+    dense_ids = []
     if results and results["documents"]:
-        return results["documents"][0]
-    return []
+        texts = dict(zip(results["ids"][0], results["documents"][0]))
+        dense_ids = results["ids"][0]
+
+    if not HYBRID_SEARCH:
+        return [{"id": chunk_id, "text": texts[chunk_id]} for chunk_id in dense_ids]
+
+    keyword_hits = _get_keyword_index(chatbot_id, collection).search(query, candidates)
+    keyword_ids = [chunk_id for chunk_id, _ in keyword_hits]
+    fused_ids = reciprocal_rank_fusion([dense_ids, keyword_ids])[:n_results]
+
+    missing = [chunk_id for chunk_id in fused_ids if chunk_id not in texts]
+    if missing:
+        fetched = collection.get(ids=missing, include=["documents"])
+        texts.update(zip(fetched["ids"], fetched["documents"]))
+    return [{"id": chunk_id, "text": texts[chunk_id]} for chunk_id in fused_ids if chunk_id in texts]
+
+
+def query_vectordb(chatbot_id: int, query: str, n_results: int = 5) -> List[str]:
+    """Query ChromaDB and return relevant document chunks."""
+    return [chunk["text"] for chunk in search_vectordb(chatbot_id, query, n_results)]
 
 
 def delete_document_from_vectordb(chatbot_id: int, document_id: int):
@@ -120,21 +415,31 @@ def delete_document_from_vectordb(chatbot_id: int, document_id: int):
     collection_name = _get_collection_name(chatbot_id)
 
     try:
-        collection = chroma_client.get_collection(name=collection_name)
+        collection = _get_chroma_client().get_collection(name=collection_name)
         # Get all IDs that belong to this document
         all_data = collection.get(
             where={"document_id": document_id}
         )
         if all_data["ids"]:
             collection.delete(ids=all_data["ids"])
+            keyword_index = _get_keyword_index(chatbot_id, collection)
+            keyword_index.remove(all_data["ids"])
+            _schedule_keyword_save(chatbot_id)
     except Exception:
         pass
+    _bump_generation(chatbot_id)
 
 
 def delete_chatbot_collection(chatbot_id: int):
     """Delete entire collection for a chatbot."""
     collection_name = _get_collection_name(chatbot_id)
     try:
-        chroma_client.delete_collection(name=collection_name)
+        _get_chroma_client().delete_collection(name=collection_name)
     except Exception:
         pass
+    with _keyword_lock:
+        _keyword_indexes.pop(chatbot_id, None)
+        _keyword_dirty.discard(chatbot_id)
+        if os.path.exists(_keyword_index_path(chatbot_id)):
+            os.remove(_keyword_index_path(chatbot_id))
+    _bump_generation(chatbot_id, 0)
@@ -0,0 +1,138 @@
+import asyncio
+import itertools
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+from services import rag_service
+from services.ingestion_service import submit_ingestion_job as _submit_local_job
+from services import retrieval_protocol as protocol
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Multi-worker mode: API workers send retrieval, index deletions and
+# ingestion to the retrieval server (retrieval_server.py) listening on this
+# Unix socket, which alone opens Chroma and loads the embedding model.
+# Unset, everything runs in-process.
+RETRIEVAL_SOCKET = os.getenv("RETRIEVAL_SOCKET", "")
+REMOTE = bool(RETRIEVAL_SOCKET) and os.getenv("RETRIEVAL_SERVER") != "1"
+# Seconds allowed for index deletions and job hand-offs; searches use the chat stage timeout
+RETRIEVAL_CALL_TIMEOUT = float(os.getenv("RETRIEVAL_CALL_TIMEOUT", "30"))
+
+SEARCH_RESULTS = 5
+
+
+class _Connection:
+    """One multiplexed connection to the retrieval server per event loop."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._loop = None
+        self._writer = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._connect_lock = None
+        self._reader_task = None
+
+    async def request(self, op: int, payload: bytes) -> bytes:
+        await self._ensure_connected()
+        request_id = next(self._ids) & 0xFFFFFFFF
+        future = self._loop.create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(protocol.frame(request_id, op, payload))
+            await self._writer.drain()
+            return await future
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _ensure_connected(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (the old connection belongs to a dead loop)
+            self._loop, self._writer, self._pending = loop, None, {}
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is None or self._writer.is_closing():
+                reader, self._writer = await asyncio.open_unix_connection(self._path)
+                self._reader_task = loop.create_task(self._read_responses(reader, self._writer))
+
+    async def _read_responses(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        error = ConnectionError("Retrieval server closed the connection")
+        try:
+            while True:
+                request_id, _, status, payload = await protocol.read_frame(reader)
+                future = self._pending.get(request_id)
+                if future is None or future.done():
+                    continue
+                if status == protocol.STATUS_OK:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(Exception(f"Retrieval server error: {payload.decode('utf-8', 'replace')}"))
+        except asyncio.IncompleteReadError:
+            pass
+        except Exception as e:
+            logger.warning("Retrieval server connection failed: %s", e)
+            error = e
+        writer.close()
+        if self._writer is writer:
+            self._writer = None
+        for future in list(self._pending.values()):
+            if not future.done():
+                future.set_exception(error)
+
+
+_connection = _Connection(RETRIEVAL_SOCKET) if REMOTE else None
+
+
+def _search_local(chatbot_id: int, query: str, embed_question: bool) -> Tuple[List[Dict], Optional[List[float]]]:
+    question_embedding = rag_service.embed_texts([query])[0] if embed_question else None
+    chunks = rag_service.search_vectordb(chatbot_id, query, SEARCH_RESULTS, query_embedding=question_embedding)
+    return chunks, question_embedding
+
+
+async def retrieve(chatbot_id: int, query: str, embed_question: bool) -> Tuple[List[Dict], Optional[List[float]]]:
+    """Return the context chunks and, when requested, the question embedding.
+
+    The question is embedded up front when the answer cache may need it, so
+    retrieval reuses the same vector. In multi-worker mode the retrieval
+    server batches this with concurrent queries from every worker.
+    """
+    if not REMOTE:
+        return await asyncio.to_thread(_search_local, chatbot_id, query, embed_question)
+    payload = await _connection.request(
+        protocol.OP_SEARCH,
+        protocol.encode_search_request(chatbot_id, query, SEARCH_RESULTS, embed_question),
+    )
+    metrics.incr("retrieval.remote_requests")
+    return protocol.decode_search_response(payload)
+
+
+def delete_document_from_vectordb(chatbot_id: int, document_id: int):
+    """Remove all chunks of a document from the index."""
+    if not REMOTE:
+        return rag_service.delete_document_from_vectordb(chatbot_id, document_id)
+    protocol.call_blocking(
+        RETRIEVAL_SOCKET, protocol.OP_DELETE_DOCUMENT,
+        protocol.encode_ids(chatbot_id, document_id), RETRIEVAL_CALL_TIMEOUT,
+    )
+
+
+def delete_chatbot_collection(chatbot_id: int):
+    """Delete the whole index of a chatbot."""
+    if not REMOTE:
+        return rag_service.delete_chatbot_collection(chatbot_id)
+    protocol.call_blocking(
+        RETRIEVAL_SOCKET, protocol.OP_DELETE_COLLECTION,
+        protocol.encode_ids(chatbot_id), RETRIEVAL_CALL_TIMEOUT,
+    )
+
+
+def submit_ingestion_job(job_id: str):
+    """Queue an ingestion job where the index lives."""
+    if not REMOTE:
+        return _submit_local_job(job_id)
+    protocol.call_blocking(
+        RETRIEVAL_SOCKET, protocol.OP_INGEST, protocol.encode_string(job_id), RETRIEVAL_CALL_TIMEOUT,
+    )
@@ -0,0 +1,142 @@
+import asyncio
+import socket
+import struct
+from typing import Dict, List, Optional, Tuple
+
+# Frames between API workers and the retrieval server: a fixed header
+#   request id (uint32) | op (uint8) | status (uint8) | payload length (uint32)
+# followed by an op-specific payload. Strings are length-prefixed UTF-8 and
+# vectors length-prefixed float32 arrays, all big-endian. Responses echo the
+# request id, so one connection carries many requests at once; an error
+# response carries the message as its payload.
+HEADER = struct.Struct("!IBBI")
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+OP_SEARCH = 1
+OP_DELETE_DOCUMENT = 2
+OP_DELETE_COLLECTION = 3
+OP_INGEST = 4
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_SEARCH_REQUEST = struct.Struct("!IHB")  # chatbot id, n_results, flags
+_FLAG_WANT_EMBEDDING = 1
+_COUNT = struct.Struct("!I")
+
+
+class _Reader:
+    def __init__(self, payload: bytes):
+        self._view = memoryview(payload)
+        self._pos = 0
+
+    def unpack(self, fmt: struct.Struct) -> Tuple:
+        values = fmt.unpack_from(self._view, self._pos)
+        self._pos += fmt.size
+        return values
+
+    def string(self) -> str:
+        (length,) = self.unpack(_COUNT)
+        value = bytes(self._view[self._pos:self._pos + length]).decode("utf-8")
+        self._pos += length
+        return value
+
+    def floats(self) -> Optional[List[float]]:
+        (length,) = self.unpack(_COUNT)
+        if not length:
+            return None
+        values = struct.unpack_from(f"!{length}f", self._view, self._pos)
+        self._pos += 4 * length
+        return list(values)
+
+
+def _string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _COUNT.pack(len(data)) + data
+
+
+def _floats(values: Optional[List[float]]) -> bytes:
+    values = values or []
+    return _COUNT.pack(len(values)) + struct.pack(f"!{len(values)}f", *values)
+
+
+def frame(request_id: int, op: int, payload: bytes, status: int = STATUS_OK) -> bytes:
+    return HEADER.pack(request_id, op, status, len(payload)) + payload
+
+
+# Payloads
+
+def encode_search_request(chatbot_id: int, query: str, n_results: int, want_embedding: bool) -> bytes:
+    flags = _FLAG_WANT_EMBEDDING if want_embedding else 0
+    return _SEARCH_REQUEST.pack(chatbot_id, n_results, flags) + _string(query)
+
+
+def decode_search_request(payload: bytes) -> Tuple[int, str, int, bool]:
+    reader = _Reader(payload)
+    chatbot_id, n_results, flags = reader.unpack(_SEARCH_REQUEST)
+    return chatbot_id, reader.string(), n_results, bool(flags & _FLAG_WANT_EMBEDDING)
+
+
+def encode_search_response(chunks: List[Dict], embedding: Optional[List[float]]) -> bytes:
+    parts = [_COUNT.pack(len(chunks))]
+    for chunk in chunks:
+        parts.append(_string(chunk["id"]))
+        parts.append(_string(chunk["text"]))
+    parts.append(_floats(embedding))
+    return b"".join(parts)
+
+
+def decode_search_response(payload: bytes) -> Tuple[List[Dict], Optional[List[float]]]:
+    reader = _Reader(payload)
+    (count,) = reader.unpack(_COUNT)
+    chunks = [{"id": reader.string(), "text": reader.string()} for _ in range(count)]
+    return chunks, reader.floats()
+
+
+def encode_ids(*ids: int) -> bytes:
+    return b"".join(_COUNT.pack(value) for value in ids)
+
+
+def decode_ids(payload: bytes) -> Tuple[int, ...]:
+    return struct.unpack(f"!{len(payload) // 4}I", payload)
+
+
+def encode_string(value: str) -> bytes:
+    return _string(value)
+
+
+def decode_string(payload: bytes) -> str:
+    return _Reader(payload).string()
+
+
+# Transport
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, int, int, bytes]:
+    """Read one frame; raises IncompleteReadError at end of stream."""
+    request_id, op, status, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    if length > MAX_PAYLOAD:
+        raise ValueError(f"Frame payload too large: {length} bytes")
+    return request_id, op, status, await reader.readexactly(length)
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Retrieval server closed the connection")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def call_blocking(path: str, op: int, payload: bytes, timeout: float) -> bytes:
+    """Send one request over a fresh connection and return the response payload."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(frame(0, op, payload))
+        _, _, status, length = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+        response = _recv_exactly(sock, length)
+    if status != STATUS_OK:
+        raise Exception(f"Retrieval server error: {response.decode('utf-8', 'replace')}")
+    return response
@@ -0,0 +1,56 @@
+from typing import Dict, List
+
+from sqlalchemy import insert, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+from models.database import ChatSession
+from services.chatbot_counters import bump_chatbot_counters
+
+
+def record_conversations(conn: Connection, conversation_rows: List[Dict]):
+    """Bump the session and chatbot counters for newly inserted conversation rows.
+
+    Runs in the caller's transaction, next to the conversation inserts, and
+    creates the chat_sessions row of a new session.
+    """
+    per_chatbot = {}
+    for row in conversation_rows:
+        per_chatbot[row["chatbot_id"]] = per_chatbot.get(row["chatbot_id"], 0) + 1
+    for chatbot_id, count in per_chatbot.items():
+        bump_chatbot_counters(conn, chatbot_id, conversation_count=count)
+
+    sessions = {}
+    for row in conversation_rows:
+        key = (row["chatbot_id"], row["session_id"])
+        count, last = sessions.get(key, (0, row["created_at"]))
+        sessions[key] = (count + 1, max(last, row["created_at"]))
+
+    for (chatbot_id, session_id), (count, last_activity) in sessions.items():
+        if _bump(conn, chatbot_id, session_id, count, last_activity):
+            continue
+        try:
+            with conn.begin_nested():
+                conn.execute(insert(ChatSession).values(
+                    chatbot_id=chatbot_id,
+                    session_id=session_id,
+                    summary="",
+                    message_count=count,
+                    last_activity=last_activity,
+                    created_at=last_activity,
+                    updated_at=last_activity,
+                ))
+        except IntegrityError:
+            # Created concurrently (e.g. by the summary job)
+            _bump(conn, chatbot_id, session_id, count, last_activity)
+
+
+def _bump(conn: Connection, chatbot_id: int, session_id: str, count: int, last_activity) -> bool:
+    result = conn.execute(
+        update(ChatSession)
+        .where(ChatSession.chatbot_id == chatbot_id, ChatSession.session_id == session_id)
+        .values(
+            message_count=ChatSession.message_count + count,
+            last_activity=last_activity,
+        )
+    )
+    return result.rowcount > 0
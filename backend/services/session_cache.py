@@ -0,0 +1,119 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services import metrics
+
+
+# Messages of context kept per session (the prompt budget may send fewer)
+HISTORY_MESSAGES = int(os.getenv("CHAT_HISTORY_MESSAGES", "20"))
+# Active sessions whose recent messages are kept in memory
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "2000"))
+# Check cached sessions against the database before use; needed when several
+# workers serve the same sessions (on by default in multi-worker mode)
+SESSION_CACHE_REVALIDATE = os.getenv(
+    "SESSION_CACHE_REVALIDATE", "1" if os.getenv("RETRIEVAL_SOCKET") else "0"
+) == "1"
+
+# (chatbot_id, session_id) -> {"messages": ring buffer, "message_count",
+# "summary", "summary_until"}, least recently used first
+_sessions: "OrderedDict[tuple, Dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _snapshot(state: Dict) -> Dict:
+    return {
+        "messages": list(state["messages"]),
+        "summary": state["summary"],
+        "summary_until": state["summary_until"],
+    }
+
+
+async def get_session_state(
+    chatbot_id: int,
+    session_id: str,
+    loader: Callable[[], Awaitable[Dict]],
+    version_reader: Optional[Callable[[], Awaitable[Optional[Tuple[int, Optional[datetime]]]]]] = None,
+) -> Dict:
+    """Return a session's latest messages and rolling summary.
+
+    ``loader`` is only awaited on a cache miss and must return a dict with
+    ``messages`` (oldest first, each with role, content and created_at),
+    ``message_count``, ``summary`` and ``summary_until``. With
+    SESSION_CACHE_REVALIDATE, ``version_reader`` returns the stored
+    (message_count, summary_until) and a cached session that another worker
+    has moved past is loaded again.
+    """
+    key = (chatbot_id, session_id)
+    with _lock:
+        state = _sessions.get(key)
+        if state is not None:
+            _sessions.move_to_end(key)
+            cached = _snapshot(state)
+            seen = _version(state)
+    if state is not None:
+        if not (SESSION_CACHE_REVALIDATE and version_reader):
+            return cached
+        version = await version_reader()
+        if version is None or not _is_behind(seen, version):
+            return cached
+        metrics.incr("session_cache.stale")
+
+    loaded = await loader()
+    with _lock:
+        state = _sessions.get(key)
+        if state is None or _is_behind(_version(state), _version(loaded)):
+            state = {
+                "messages": deque(loaded["messages"], maxlen=HISTORY_MESSAGES),
+                "message_count": loaded["message_count"],
+                "summary": loaded["summary"],
+                "summary_until": loaded["summary_until"],
+            }
+            _sessions[key] = state
+            while len(_sessions) > SESSION_CACHE_SIZE:
+                _sessions.popitem(last=False)
+        return _snapshot(state)
+
+
+def _version(state: Dict) -> Tuple[int, Optional[datetime]]:
+    return state["message_count"], state["summary_until"]
+
+
+def _is_behind(seen: Tuple, stored: Tuple) -> bool:
+    """Whether the database holds messages or a summary the cached copy lacks."""
+    count, summary_until = seen
+    stored_count, stored_until = stored
+    if stored_count > count:
+        return True
+    return stored_until is not None and (summary_until is None or stored_until > summary_until)
+
+
+def append_session_messages(chatbot_id: int, session_id: str, messages: List[Dict]):
+    """Write saved messages through to a cached session.
+
+    Sessions that are not cached are left alone; their next read loads the
+    tail from the database, which already includes these messages.
+    """
+    with _lock:
+        state = _sessions.get((chatbot_id, session_id))
+        if state is not None:
+            state["messages"].extend(messages)
+            state["message_count"] += len(messages)
+
+
+def set_session_summary(chatbot_id: int, session_id: str, summary: str, summary_until: Optional[datetime]):
+    """Write an updated rolling summary through to a cached session."""
+    with _lock:
+        state = _sessions.get((chatbot_id, session_id))
+        if state is not None:
+            state["summary"] = summary
+            state["summary_until"] = summary_until
+
+
+def invalidate_chatbot_sessions(chatbot_id: int):
+    """Forget cached sessions of a chatbot."""
+    with _lock:
+        for key in [k for k in _sessions if k[0] == chatbot_id]:
+            del _sessions[key]
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from models.database import AsyncSessionLocal, Conversation, ChatSession
+from services.llm.base import BaseLLMProvider
+from services.llm.limiter import llm_priority, PRIORITY_BATCH
+from services.session_cache import set_session_summary
+from services.write_behind import wait_for_writes
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Unsummarized messages that must pile up outside the prompt before the
+# summary is refreshed; fewer are simply not sent for a few turns.
+SUMMARY_MIN_MESSAGES = int(os.getenv("CHAT_SUMMARY_MIN_MESSAGES", "6"))
+# Messages folded into the summary per LLM call
+SUMMARY_MAX_MESSAGES = int(os.getenv("CHAT_SUMMARY_MAX_MESSAGES", "40"))
+
+SUMMARY_PROMPT = """You maintain the running summary of a conversation between a user and an assistant.
+Update the current summary with the new messages. Keep names, numbers, decisions, requests and open questions; drop small talk.
+Write the summary in the language of the conversation, at most 200 words, and answer with the summary only."""
+
+_in_flight = set()
+_tasks = set()
+
+
+def schedule_summary_update(
+    chatbot_id: int,
+    session_id: str,
+    provider: BaseLLMProvider,
+    summary: str,
+    summary_until: Optional[datetime],
+    fold_before: datetime,
+):
+    """Fold messages older than ``fold_before`` into the session summary in the background."""
+    key = (chatbot_id, session_id)
+    if key in _in_flight:
+        return
+    _in_flight.add(key)
+    task = asyncio.create_task(
+        _update_summary(chatbot_id, session_id, provider, summary, summary_until, fold_before)
+    )
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    task.add_done_callback(lambda _: _in_flight.discard(key))
+
+
+async def _update_summary(
+    chatbot_id: int,
+    session_id: str,
+    provider: BaseLLMProvider,
+    summary: str,
+    summary_until: Optional[datetime],
+    fold_before: datetime,
+):
+    # Queued turns older than fold_before must be in the table before it is
+    # read; folding a partial history would lose them from the summary for good
+    if not await asyncio.to_thread(wait_for_writes):
+        metrics.incr("session_summary.skipped")
+        logger.warning("Summary of session %s skipped: queued messages not written yet", session_id)
+        return
+    async with AsyncSessionLocal() as db:
+        try:
+            query = select(Conversation).where(
+                Conversation.chatbot_id == chatbot_id,
+                Conversation.session_id == session_id,
+                Conversation.created_at < fold_before,
+            )
+            if summary_until is not None:
+                query = query.where(Conversation.created_at > summary_until)
+            rows = (await db.execute(
+                query.order_by(Conversation.created_at, Conversation.id).limit(SUMMARY_MAX_MESSAGES)
+            )).scalars().all()
+            if len(rows) == SUMMARY_MAX_MESSAGES:
+                # Never split messages sharing a timestamp across two updates
+                rows = [row for row in rows if row.created_at < rows[-1].created_at] or rows
+            if len(rows) < SUMMARY_MIN_MESSAGES:
+                return
+
+            transcript = "\n".join(f"{row.role}: {row.content}" for row in rows)
+            new_until = rows[-1].created_at
+            folded = len(rows)
+            # Give the connection back to the pool for the duration of the LLM call
+            await db.rollback()
+
+            # Summaries wait behind interactive chat for a provider slot
+            with llm_priority(PRIORITY_BATCH):
+                new_summary = await provider.chat(
+                    [{
+                        "role": "user",
+                        "content": f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}",
+                    }],
+                    SUMMARY_PROMPT,
+                )
+            new_summary = new_summary.strip()
+
+            chat_session = await db.scalar(
+                select(ChatSession).where(
+                    ChatSession.chatbot_id == chatbot_id,
+                    ChatSession.session_id == session_id,
+                )
+            )
+            if chat_session is None:
+                chat_session = ChatSession(chatbot_id=chatbot_id, session_id=session_id)
+                db.add(chat_session)
+            chat_session.summary = new_summary
+            chat_session.summary_until = new_until
+            await db.commit()
+
+            set_session_summary(chatbot_id, session_id, new_summary, new_until)
+            metrics.incr("prompt.summary_updates")
+            metrics.incr("prompt.summarized_messages", folded)
+        except Exception as e:
+            await db.rollback()
+            metrics.incr("prompt.summary_errors")
+            logger.warning("Summary update for session %s of chatbot %s failed: %s", session_id, chatbot_id, e)
@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+from services import metrics
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one computation.
+
+    The first caller for a key starts the computation as a task; callers
+    arriving while it runs await that task instead of starting their own.
+    The task is shielded, so a caller that is cancelled or times out does
+    not cancel it for the others. Saved calls are counted as
+    ``single_flight.<name>.saved``.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """Return (result, shared); ``shared`` is True when another caller computed it."""
+        task = self._tasks.get(key)
+        shared = task is not None
+        if shared:
+            metrics.incr(f"single_flight.{self.name}.saved")
+        else:
+            metrics.incr(f"single_flight.{self.name}.computed")
+            task = asyncio.ensure_future(compute())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Mark the error as seen even if every caller has given up waiting
+            task.exception()
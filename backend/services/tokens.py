@@ -0,0 +1,41 @@
+import math
+import re
+
+
+# Hangul, kana and CJK ideographs come out at roughly one token per
+# character; other scripts average a few characters per token.
+_CJK_CHARS = re.compile(r"[ᄀ-ᇿ぀-ヿ㄰-㆏㐀-鿿가-힯豈-﫿]")
+
+# Model family -> (characters per token for other scripts, tokens per CJK character)
+_FAMILY_RATES = {
+    "claude": (3.5, 1.2),
+    "openai": (4.0, 1.0),
+    "gemini": (4.0, 1.0),
+    "llama": (3.8, 1.5),
+}
+_DEFAULT_RATES = (4.0, 1.0)
+
+_PROVIDER_FAMILIES = {
+    "claude": "claude",
+    "openai": "openai",
+    "gemini": "gemini",
+    "groq": "llama",
+    "ollama": "llama",
+}
+
+
+def model_family(provider: str, model: str = "") -> str:
+    """Map a provider/model to the tokenizer family used for estimates."""
+    if model and "gemma" in model.lower():
+        return "gemini"
+    return _PROVIDER_FAMILIES.get(provider, "")
+
+
+def count_tokens(text: str, family: str = "") -> int:
+    """Estimate the number of LLM tokens in text without a model tokenizer."""
+    if not text:
+        return 0
+    chars_per_token, tokens_per_cjk = _FAMILY_RATES.get(family, _DEFAULT_RATES)
+    cjk = len(_CJK_CHARS.findall(text))
+    other = len(text) - cjk - text.count(" ")
+    return math.ceil(cjk * tokens_per_cjk + max(other, 0) / chars_per_token)
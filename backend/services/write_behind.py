@@ -0,0 +1,142 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import insert
+from models.database import engine, IS_SQLITE, Conversation
+from services.session_activity import record_conversations
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Conversation turns are written by a single background thread in grouped
+# transactions, so chat requests neither wait on a commit nor compete for
+# the SQLite write lock. Defaults to on for SQLite. Writes the user is told
+# succeeded (form submissions, edits) stay on the request's own commit.
+WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "1" if IS_SQLITE else "0") == "1"
+# Longest time in seconds a queued row waits before its batch is committed
+FLUSH_INTERVAL = float(os.getenv("DB_WRITE_FLUSH_INTERVAL", "0.05"))
+# Rows committed per transaction at most
+BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "500"))
+# Seconds to wait for queued rows to be written on shutdown
+SHUTDOWN_TIMEOUT = float(os.getenv("DB_WRITE_SHUTDOWN_TIMEOUT", "10"))
+
+_STOP = object()
+
+_queue = queue.Queue()
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def start_write_behind():
+    """Start the writer thread when write-behind is enabled."""
+    global _thread
+    if not WRITE_BEHIND:
+        return
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="db-writer", daemon=True)
+            _thread.start()
+
+
+def stop_write_behind():
+    """Write everything still queued, then stop the writer thread."""
+    global _thread
+    with _lock:
+        thread, _thread = _thread, None
+    if thread is None:
+        return
+    _queue.put(_STOP)
+    thread.join(SHUTDOWN_TIMEOUT)
+    if thread.is_alive():
+        logger.warning("Write-behind queue not drained after %gs; %d row(s) lost", SHUTDOWN_TIMEOUT, _queue.qsize())
+
+
+def enqueue_insert(model, values: Dict):
+    """Queue one row for insertion; returns immediately."""
+    start_write_behind()
+    _queue.put((model, values, time.perf_counter()))
+    metrics.observe("write_behind.queue_depth", _queue.qsize())
+
+
+def wait_for_writes(timeout: float = 5.0) -> bool:
+    """Block until every row queued so far is committed (or dropped).
+
+    Readers that must see their own recent writes call this first and
+    get False when the rows were still queued after ``timeout`` seconds.
+    """
+    if _thread is None:
+        return True
+    done = threading.Event()
+    _queue.put(done)
+    return done.wait(timeout)
+
+
+def _run():
+    stopping = False
+    while not stopping:
+        batch: List = []
+        barriers: List[threading.Event] = []
+        item = _queue.get()
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        while True:
+            if item is _STOP:
+                stopping = True
+            elif isinstance(item, threading.Event):
+                barriers.append(item)
+            else:
+                batch.append(item)
+            if len(batch) >= BATCH_SIZE:
+                break
+            # Once stopping, drain whatever is left without waiting
+            remaining = 0 if stopping else deadline - time.monotonic()
+            try:
+                item = _queue.get(timeout=remaining) if remaining > 0 else _queue.get_nowait()
+            except queue.Empty:
+                break
+        if batch:
+            _write_batch(batch)
+        for barrier in barriers:
+            barrier.set()
+
+
+def _write_batch(batch: List):
+    started = time.perf_counter()
+    grouped: Dict = {}
+    for model, values, _ in batch:
+        grouped.setdefault(model, []).append(values)
+    try:
+        with engine.begin() as conn:
+            for model, rows in grouped.items():
+                _insert(conn, model, rows)
+    except Exception as e:
+        # One bad row (e.g. its chatbot was deleted) must not drop the batch
+        logger.warning("Batched insert of %d row(s) failed, retrying one by one: %s", len(batch), e)
+        _write_rows_individually(batch)
+    else:
+        metrics.incr("write_behind.rows", len(batch))
+    now = time.perf_counter()
+    metrics.incr("write_behind.batches")
+    metrics.observe("write_behind.batch_size", len(batch))
+    metrics.observe("write_behind.commit_ms", (now - started) * 1000)
+    metrics.observe("write_behind.lag_ms", (now - batch[0][2]) * 1000)
+
+
+def _insert(conn, model, rows: List[Dict]):
+    conn.execute(insert(model), rows)
+    if model is Conversation:
+        record_conversations(conn, rows)
+
+
+def _write_rows_individually(batch: List):
+    for model, values, _ in batch:
+        try:
+            with engine.begin() as conn:
+                _insert(conn, model, [values])
+            metrics.incr("write_behind.rows")
+        except Exception as e:
+            metrics.incr("write_behind.dropped_rows")
+            logger.error("Dropped %s row: %s", model.__tablename__, e)
@@ -0,0 +1,35 @@
+#!/bin/sh
+# WEB_WORKERS=1 (default) runs everything in one process. With more workers,
+# a retrieval server owning Chroma, the embedding model and ingestion is
+# started first and the API workers reach it over RETRIEVAL_SOCKET.
+set -e
+
+WEB_WORKERS="${WEB_WORKERS:-1}"
+
+if [ "$WEB_WORKERS" -gt 1 ]; then
+    export RETRIEVAL_SOCKET="${RETRIEVAL_SOCKET:-/tmp/chatbot-retrieval.sock}"
+    rm -f "$RETRIEVAL_SOCKET"
+    python retrieval_server.py &
+    RETRIEVAL_PID=$!
+    # The server migrates the schema before it listens
+    while [ ! -S "$RETRIEVAL_SOCKET" ]; do
+        kill -0 "$RETRIEVAL_PID" 2>/dev/null || { echo "retrieval server failed to start" >&2; exit 1; }
+        sleep 0.2
+    done
+    uvicorn main:app --host 0.0.0.0 --port 8000 --workers "$WEB_WORKERS" &
+    WEB_PID=$!
+
+    trap 'kill -TERM "$WEB_PID" "$RETRIEVAL_PID" 2>/dev/null; wait; exit 0' TERM INT
+    # Without the retrieval server every chat loses its context and uploads
+    # fail, so when either process dies the container exits and the restart
+    # policy brings both back
+    while kill -0 "$RETRIEVAL_PID" 2>/dev/null && kill -0 "$WEB_PID" 2>/dev/null; do
+        sleep 1
+    done
+    echo "retrieval server or API workers exited; stopping" >&2
+    kill -TERM "$WEB_PID" "$RETRIEVAL_PID" 2>/dev/null || true
+    wait || true
+    exit 1
+fi
+
+exec uvicorn main:app --host 0.0.0.0 --port 8000
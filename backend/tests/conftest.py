@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# Tests import the backend packages (models, services, routers) directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep any database the app opens out of the working tree
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test.db")
@@ -0,0 +1,41 @@
+from services.action_service import ActionStreamFilter, parse_action_from_response
+
+ACTION = '[ACTION]{"action_type": "SHOW_FORM", "action_id": 1}[/ACTION]'
+
+
+def _stream(deltas):
+    """Visible text the filter releases for a stream of deltas, flush included."""
+    action_filter = ActionStreamFilter()
+    visible = "".join(action_filter.feed(delta) for delta in deltas) + action_filter.flush()
+    return visible, action_filter.raw
+
+
+def _split_every(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_action_block_is_hidden_and_following_text_is_streamed():
+    visible, raw = _stream(["Please fill in the form. ", ACTION, " Thanks!"])
+    assert visible == "Please fill in the form.  Thanks!"
+    assert parse_action_from_response(raw)[1] == {"action_type": "SHOW_FORM", "action_id": 1}
+
+
+def test_markers_split_across_deltas():
+    text = "Here you go " + ACTION + " and more"
+    for size in (1, 2, 3, 5, 7):
+        visible, _ = _stream(_split_every(text, size))
+        assert visible == "Here you go  and more"
+
+
+def test_text_resembling_a_marker_prefix_is_released():
+    visible, _ = _stream(["Use the [ACT", "ION key] or [A"])
+    assert visible == "Use the [ACTION key] or [A"
+
+
+def test_unterminated_action_block_is_released_at_the_end():
+    text = 'Sure. [ACTION]{"action_type": "SHOW_FORM"'
+    for size in (1, 4, len(text)):
+        visible, raw = _stream(_split_every(text, size))
+        # Same text as the saved answer, which keeps an unclosed block
+        assert visible == text
+        assert parse_action_from_response(raw) == (text, None)
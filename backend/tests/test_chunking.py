@@ -0,0 +1,45 @@
+from services.chunking import chunk_structured
+
+
+def _chunks(text, max_tokens=256, overlap_tokens=32):
+    return list(chunk_structured([text], max_tokens, overlap_tokens))
+
+
+def _indexed(chunks):
+    return " ".join(chunks)
+
+
+def test_numbered_list_after_intro_is_kept():
+    chunks = _chunks(
+        "Intro text here.\n\n1. Refunds are available within 30 days.\n2. Shipping is free over 50 dollars.\n"
+    )
+    assert "Refunds are available within 30 days." in _indexed(chunks)
+    assert "Shipping is free over 50 dollars." in _indexed(chunks)
+
+
+def test_pure_numbered_list_is_kept():
+    chunks = _chunks("1. Apples\n2. Pears\n3. Plums\n")
+    for item in ("1. Apples", "2. Pears", "3. Plums"):
+        assert item in _indexed(chunks)
+
+
+def test_one_line_korean_articles_are_kept():
+    articles = [
+        "제1조 이 규정은 회사의 휴가 제도를 정함을 목적으로 한다.",
+        "제2조 직원은 연 15일의 유급 휴가를 가진다.",
+        "제3조 휴가는 사전에 신청한다",
+    ]
+    chunks = _chunks("\n".join(articles) + "\n")
+    for article in articles:
+        assert article in _indexed(chunks)
+
+
+def test_headings_stay_with_their_text():
+    chunks = _chunks("# Guide\n## Setup\nInstall it first. Then run it.\n## Usage\nCall the API.\n")
+    assert chunks == ["# Guide ## Setup Install it first. Then run it.", "## Usage Call the API."]
+
+
+def test_article_titles_start_new_chunks():
+    chunks = _chunks("제1장 총칙\n제1조(목적) 이 규정은 휴가를 정한다.\n제2조(정의)\n휴가란 유급 휴가를 말한다.\n")
+    assert chunks[-1] == "제2조(정의) 휴가란 유급 휴가를 말한다."
+    assert "제1조(목적) 이 규정은 휴가를 정한다." in chunks[0]
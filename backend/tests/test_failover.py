@@ -0,0 +1,199 @@
+import asyncio
+import time
+
+import pytest
+
+from services.llm import failover
+from services.llm.base import BaseLLMProvider
+from services.llm.failover import FailoverProvider
+from services.llm.limiter import AdaptiveLimiter, LimitedProvider, LLMOverloaded
+
+
+class _ScriptedProvider(BaseLLMProvider):
+    """Answers ``(delay, outcome)`` per call, the last entry repeating.
+
+    An exception outcome is raised after the delay; a text outcome is
+    returned by chat() and streamed word by word by chat_stream().
+    """
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.started = []
+        self.cancelled = 0
+
+    async def _answer(self):
+        delay, outcome = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        self.started.append(time.monotonic())
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def chat(self, messages, system_prompt, context=""):
+        return await self._answer()
+
+    async def chat_stream(self, messages, system_prompt, context=""):
+        for word in (await self._answer()).split():
+            yield word
+
+    def get_model_list(self):
+        return []
+
+
+@pytest.fixture(autouse=True)
+def fresh_health(monkeypatch):
+    monkeypatch.setattr(failover, "_health", {})
+    monkeypatch.setattr(failover, "HEDGE_MIN_DELAY_MS", 1)
+
+
+async def _settle():
+    # Let cancelled losers run their cleanup
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def _chat(chain):
+    return asyncio.run(chain.chat([], ""))
+
+
+def test_hedges_after_p95():
+    for _ in range(failover.HEDGE_MIN_SAMPLES):
+        failover.get_health("primary").record_success("chat", 50)
+    primary = _ScriptedProvider((1, "primary"))
+    fallback = _ScriptedProvider((0.01, "fallback"))
+    chain = FailoverProvider([("primary", primary), ("fallback", fallback)])
+
+    started = time.monotonic()
+    assert _chat(chain) == "fallback"
+    assert time.monotonic() - started < 0.5
+    assert fallback.started[0] - primary.started[0] >= 0.045
+    assert primary.cancelled == 1
+
+
+def test_cancelled_loser_is_recorded_as_at_least_the_hedge_delay():
+    health = failover.get_health("primary")
+    for _ in range(failover.HEDGE_MIN_SAMPLES):
+        health.record_success("chat", 50)
+    chain = FailoverProvider([
+        ("primary", _ScriptedProvider((1, "primary"))),
+        ("fallback", _ScriptedProvider((0.001, "fallback"))),
+    ])
+
+    for _ in range(10):
+        _chat(chain)
+    # Every lost race counts, so the p95 cannot drift below the hedge delay
+    assert health.stats()["samples"] == failover.HEDGE_MIN_SAMPLES + 10
+    assert health.hedge_delay("chat") * 1000 >= 50
+
+
+def test_fails_over_at_once_on_error():
+    primary = _ScriptedProvider((0.01, Exception("Claude API error: overloaded")))
+    fallback = _ScriptedProvider((0.01, "fallback"))
+    chain = FailoverProvider([("primary", primary), ("fallback", fallback)])
+
+    started = time.monotonic()
+    assert _chat(chain) == "fallback"
+    # Far below the default hedge delay
+    assert time.monotonic() - started < 1
+
+
+def test_raises_every_error_when_the_chain_fails():
+    chain = FailoverProvider([
+        ("primary", _ScriptedProvider((0, Exception("Claude API error: a")))),
+        ("fallback", _ScriptedProvider((0, Exception("OpenAI API error: b")))),
+    ])
+
+    with pytest.raises(Exception, match="Claude API error: a; OpenAI API error: b"):
+        _chat(chain)
+
+
+def test_overload_along_the_whole_chain_stays_overloaded():
+    chain = FailoverProvider([
+        ("primary", _ScriptedProvider((0, LLMOverloaded("primary is overloaded")))),
+        ("fallback", _ScriptedProvider((0, LLMOverloaded("fallback is overloaded")))),
+    ])
+
+    with pytest.raises(LLMOverloaded):
+        _chat(chain)
+
+
+def test_breaker_opens_half_opens_and_closes(monkeypatch):
+    monkeypatch.setattr(failover, "BREAKER_FAILURES", 2)
+    monkeypatch.setattr(failover, "BREAKER_COOLDOWN", 0.05)
+    error = (0, Exception("Claude API error: overloaded"))
+    primary = _ScriptedProvider(error, error, (0, "primary"), error, error, error, (0, "primary"))
+    chain = FailoverProvider([("primary", primary), ("fallback", _ScriptedProvider((0, "fallback")))])
+    health = failover.get_health("primary")
+
+    assert _chat(chain) == "fallback"
+    assert health.state == "closed"
+    assert _chat(chain) == "fallback"
+    assert health.state == "open"
+
+    # Open: the primary is skipped
+    assert _chat(chain) == "fallback"
+    assert len(primary.started) == 2
+
+    # Half-open: one trial call, which succeeds and closes the circuit
+    time.sleep(0.06)
+    assert health.state == "half_open"
+    assert _chat(chain) == "primary"
+    assert health.state == "closed"
+
+    # Opened again, and a failed trial call reopens it at once
+    _chat(chain)
+    _chat(chain)
+    assert health.state == "open"
+    time.sleep(0.06)
+    assert _chat(chain) == "fallback"
+    assert health.state == "open"
+    assert len(primary.started) == 6
+
+    time.sleep(0.06)
+    assert _chat(chain) == "primary"
+    assert health.state == "closed"
+
+
+def test_cancelled_loser_releases_its_limiter_slot(monkeypatch):
+    monkeypatch.setattr(failover, "HEDGE_DEFAULT_DELAY_MS", 20)
+    gate = AdaptiveLimiter("test", 4)
+    primary = _ScriptedProvider((10, "primary"))
+    chain = FailoverProvider([
+        ("primary", LimitedProvider(primary, gate)),
+        ("fallback", _ScriptedProvider((0.01, "fallback"))),
+    ])
+
+    async def run():
+        assert await chain.chat([], "") == "fallback"
+        await _settle()
+        # Checked before the event loop shuts down and cancels what is left
+        assert primary.cancelled == 1
+        assert gate.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_stream_races_to_the_first_delta(monkeypatch):
+    monkeypatch.setattr(failover, "HEDGE_DEFAULT_DELAY_MS", 20)
+    gate = AdaptiveLimiter("test", 4)
+    primary = _ScriptedProvider((10, "from the primary"))
+    fallback = _ScriptedProvider((0.01, "from the fallback"))
+    chain = FailoverProvider([
+        ("primary", LimitedProvider(primary, gate)),
+        ("fallback", fallback),
+    ])
+
+    async def run():
+        deltas = [delta async for delta in chain.chat_stream([], "")]
+        await _settle()
+        assert primary.cancelled == 1
+        assert gate.in_flight == 0
+        return deltas
+
+    started = time.monotonic()
+    assert asyncio.run(run()) == ["from", "the", "fallback"]
+    assert time.monotonic() - started < 1
@@ -0,0 +1,101 @@
+import math
+import pickle
+from collections import Counter
+
+import pytest
+
+from services.keyword_index import BM25_B, BM25_K1, KeywordIndex, tokenize
+
+CHUNKS = {
+    "a": "Annual leave is 15 days. Leave requests are filed in the HR portal.",
+    "b": "Reset your password in the IT portal or call the help desk.",
+    "c": "연차 휴가는 15일이며 휴가 신청은 인사 포털에서 합니다.",
+    "d": "Form HR-2024-001 covers parental leave.",
+    "e": "The help desk answers password questions on weekdays.",
+}
+
+
+def _bm25(chunks, query):
+    """Scores computed from scratch, to check the incremental index against."""
+    docs = {chunk_id: Counter(tokenize(text)) for chunk_id, text in chunks.items()}
+    avg_length = sum(sum(terms.values()) for terms in docs.values()) / len(docs)
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(1 for terms in docs.values() if term in terms)
+        if not df:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for chunk_id, terms in docs.items():
+            tf = terms.get(term)
+            if tf:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(terms.values()) / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+    return scores
+
+
+def _assert_matches(index, chunks):
+    for query in ("leave days", "password help desk", "휴가 신청", "HR-2024-001", "portal"):
+        expected = _bm25(chunks, query)
+        found = dict(index.search(query, 10))
+        assert found.keys() == expected.keys()
+        for chunk_id, score in expected.items():
+            assert found[chunk_id] == pytest.approx(score)
+
+
+def _index(chunks):
+    index = KeywordIndex()
+    for chunk_id, text in chunks.items():
+        index.add(chunk_id, text)
+    return index
+
+
+def test_scores_follow_adds_replacements_and_removals():
+    chunks = dict(CHUNKS)
+    index = _index(chunks)
+    _assert_matches(index, chunks)
+
+    chunks["b"] = "Passwords expire every 90 days."
+    index.add("b", chunks["b"])
+    index.remove(["e"])
+    del chunks["e"]
+    _assert_matches(index, chunks)
+
+    # Enough removals to compact the index
+    index.remove(["a", "c", "d"])
+    for chunk_id in ("a", "c", "d"):
+        del chunks[chunk_id]
+    assert index.removed == 0
+    _assert_matches(index, chunks)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    chunks = dict(CHUNKS)
+    index = _index(chunks)
+    index.remove(["d"])
+    del chunks["d"]
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+
+    loaded = KeywordIndex.load(path)
+    assert len(loaded) == len(chunks)
+    _assert_matches(loaded, chunks)
+    # A loaded index keeps its document frequencies up to date
+    loaded.remove(["a"])
+    del chunks["a"]
+    _assert_matches(loaded, chunks)
+
+
+_unpickled = []
+
+
+class _Payload:
+    def __reduce__(self):
+        return _unpickled.append, ("ran",)
+
+
+def test_load_never_unpickles(tmp_path):
+    path = tmp_path / "index.npz"
+    path.write_bytes(pickle.dumps(_Payload()))
+    assert KeywordIndex.load(str(path)) is None
+    assert _unpickled == []
+    assert KeywordIndex.load(str(tmp_path / "missing.npz")) is None
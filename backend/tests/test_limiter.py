@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from services.llm import limiter
+from services.llm.base import BaseLLMProvider
+
+
+class _ScriptedProvider(BaseLLMProvider):
+    """Answers after ``delays`` seconds, one entry per call (the last one repeats)."""
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+
+    def _next_delay(self):
+        return self.delays.pop(0) if len(self.delays) > 1 else self.delays[0]
+
+    async def chat(self, messages, system_prompt, context=""):
+        await asyncio.sleep(self._next_delay())
+        return "answer"
+
+    async def chat_stream(self, messages, system_prompt, context=""):
+        await asyncio.sleep(self._next_delay())
+        yield "answer"
+
+    def get_model_list(self):
+        return []
+
+
+async def _drain(stream):
+    return [delta async for delta in stream]
+
+
+def test_ceilings_are_shared_between_workers(monkeypatch):
+    monkeypatch.setattr(limiter, "_limiters", {})
+    monkeypatch.setattr(limiter, "WEB_WORKERS", 4)
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY_CLAUDE", "20")
+
+    assert limiter.get_limiter("claude", "key").max_concurrency == 5
+    assert limiter.get_limiter("groq", "key").max_concurrency == 2
+    assert limiter.get_limiter("ollama", "key").max_concurrency == 1
+
+
+def _limit_around_slow_call(call):
+    """Limit before and after a call that takes far longer than the ten before it."""
+    gate = limiter.AdaptiveLimiter("test", 32)
+    provider = limiter.LimitedProvider(_ScriptedProvider([0.001] * 10 + [0.2]), gate)
+
+    async def run():
+        for _ in range(10):
+            await call(provider)
+        before = gate.limit
+        await call(provider)
+        return before, gate.limit
+
+    return asyncio.run(run())
+
+
+def test_long_completions_do_not_lower_the_limit():
+    before, after = _limit_around_slow_call(lambda provider: provider.chat([], ""))
+    assert after >= before
+
+
+def test_slow_first_delta_lowers_the_limit():
+    before, after = _limit_around_slow_call(lambda provider: _drain(provider.chat_stream([], "")))
+    assert after < before
+
+
+def _wrapped(error):
+    """The error as providers raise it: a plain Exception chained to the SDK error."""
+    try:
+        try:
+            raise error
+        except Exception as e:
+            raise Exception(f"API error: {e}")
+    except Exception as e:
+        return e
+
+
+_REQUEST = httpx.Request("POST", "https://llm.test")
+
+
+@pytest.mark.parametrize("error, expected", [
+    (openai.RateLimitError("slow down", response=httpx.Response(429, request=_REQUEST), body=None), True),
+    (httpx.HTTPStatusError("busy", request=_REQUEST, response=httpx.Response(429, request=_REQUEST)), True),
+    (google_exceptions.ResourceExhausted("RESOURCE_EXHAUSTED"), True),
+    (openai.BadRequestError(
+        "prompt is 4290 tokens, see rate limit docs", response=httpx.Response(400, request=_REQUEST), body=None,
+    ), False),
+    (TimeoutError("no answer after 429 ms"), False),
+])
+def test_only_real_429s_count_as_rate_limited(error, expected):
+    assert limiter.is_rate_limited(_wrapped(error)) is expected
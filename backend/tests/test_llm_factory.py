@@ -0,0 +1,57 @@
+import asyncio
+import threading
+
+import pytest
+
+from services.llm import factory
+from services.llm.base import BaseLLMProvider
+
+
+class _FakeProvider(BaseLLMProvider):
+    closed = []
+
+    def __init__(self, model, api_key=None):
+        self.model = model
+
+    async def chat(self, messages, system_prompt, context=""):
+        await asyncio.sleep(0.2)
+        return self.model
+
+    async def aclose(self):
+        self.closed.append(self.model)
+
+    def get_model_list(self):
+        return []
+
+
+@pytest.fixture(autouse=True)
+def fake_providers(monkeypatch):
+    monkeypatch.setitem(factory.PROVIDERS, "fake", _FakeProvider)
+    monkeypatch.setattr(factory, "MAX_CACHED_PROVIDERS", 2)
+    monkeypatch.setattr(factory, "RETIRE_GRACE_SECONDS", 0.05)
+    _FakeProvider.closed = []
+
+
+def test_dropped_providers_are_closed_once_idle():
+    async def run():
+        busy = factory.get_llm_provider("fake", "a", "key")
+        call = asyncio.create_task(busy.chat([], ""))
+        await asyncio.sleep(0)
+        # Evicts the provider while its call is still running
+        factory.get_llm_provider("fake", "b", "key")
+        factory.get_llm_provider("fake", "c", "key")
+        await asyncio.sleep(0.1)
+        assert _FakeProvider.closed == []
+        assert await call == "a"
+        await asyncio.sleep(0.15)
+        assert _FakeProvider.closed == ["a"]
+
+        # Sync routes invalidate from the threadpool
+        worker = threading.Thread(target=factory.invalidate_llm_providers, args=("fake",))
+        worker.start()
+        worker.join()
+        await asyncio.sleep(0.15)
+        assert sorted(_FakeProvider.closed) == ["a", "b", "c"]
+        await factory.close_llm_providers()
+
+    asyncio.run(run())
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from main import app
+from services.llm.claude import ClaudeProvider
+from services.llm.gemini import GeminiProvider
+from services.llm.groq import GroqProvider
+from services.llm.ollama import OllamaProvider
+from services.llm.openai_provider import OpenAIProvider
+
+LLM_SECONDS = 2
+CALLS = 50
+
+
+async def _slow(result):
+    await asyncio.sleep(LLM_SECONDS)
+    return result
+
+
+class _FakeCreate:
+    def __init__(self, result):
+        self.result = result
+
+    async def create(self, **kwargs):
+        return await _slow(self.result)
+
+
+def _claude():
+    provider = ClaudeProvider("claude-test", api_key="test")
+    response = SimpleNamespace(content=[SimpleNamespace(text="claude")], usage=SimpleNamespace(input_tokens=1))
+    provider.messages = _FakeCreate(response)
+    return provider
+
+
+def _openai_style(cls, text):
+    provider = cls("model-test", api_key="test")
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(prompt_tokens=1),
+    )
+    provider.client = SimpleNamespace(chat=SimpleNamespace(completions=_FakeCreate(response)))
+    return provider
+
+
+def _gemini():
+    provider = GeminiProvider("gemini-test", api_key="test")
+    response = SimpleNamespace(text="gemini", usage_metadata=None)
+
+    class Chat:
+        async def send_message_async(self, prompt, stream=False):
+            return await _slow(response)
+
+    provider.model = SimpleNamespace(start_chat=lambda history: Chat())
+    return provider
+
+
+def _ollama():
+    provider = OllamaProvider("llama-test")
+    response = SimpleNamespace(
+        raise_for_status=lambda: None,
+        json=lambda: {"message": {"content": "ollama"}, "prompt_eval_count": 1},
+    )
+
+    class Client:
+        async def post(self, url, json):
+            return await _slow(response)
+
+    provider.client = Client()
+    return provider
+
+
+def test_event_loop_stays_responsive_during_llm_calls():
+    providers = [
+        _claude(),
+        _openai_style(OpenAIProvider, "openai"),
+        _openai_style(GroqProvider, "groq"),
+        _gemini(),
+        _ollama(),
+    ]
+
+    async def scenario():
+        started = time.perf_counter()
+        calls = [
+            asyncio.ensure_future(providers[i % len(providers)].chat(
+                [{"role": "user", "content": "hi"}], "You are a test bot."
+            ))
+            for i in range(CALLS)
+        ]
+        await asyncio.sleep(0.2)
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            health_started = time.perf_counter()
+            response = await client.get("/api/health")
+            health_ms = (time.perf_counter() - health_started) * 1000
+
+        assert response.status_code == 200
+        assert not any(call.done() for call in calls), "LLM calls finished before the health check"
+        results = await asyncio.gather(*calls)
+        return health_ms, time.perf_counter() - started, results
+
+    health_ms, total_seconds, results = asyncio.run(scenario())
+
+    assert health_ms < 100
+    # All calls were in flight together rather than one after another
+    assert total_seconds < LLM_SECONDS * 2
+    assert set(results) == {"claude", "openai", "groq", "gemini", "ollama"}
@@ -5,7 +5,7 @@ const api = axios.create({
 })
 
 // Chatbot APIs
-export const listChatbots = () => api.get('/chatbots')
+export const listChatbots = (params) => api.get('/chatbots', { params })
 export const getChatbot = (id) => api.get(`/chatbots/${id}`)
 export const createChatbot = (data) => api.post('/chatbots', data)
 export const updateChatbot = (id, data) => api.put(`/chatbots/${id}`, data)
@@ -22,6 +22,7 @@ export const uploadDocument = (chatbotId, file) => {
     headers: { 'Content-Type': 'multipart/form-data' },
   })
 }
+export const getDocumentJob = (jobId) => api.get(`/documents/jobs/${jobId}`)
 export const listDocuments = (chatbotId) => api.get(`/documents/${chatbotId}`)
 export const deleteDocument = (id) => api.delete(`/documents/${id}`)
 
@@ -34,8 +35,8 @@ export const submitAction = (data) => api.post('/actions/submit', data)
 
 // Chat APIs
 export const sendMessage = (data) => api.post('/chat', data)
-export const getChatHistory = (chatbotId, sessionId) =>
-  api.get(`/chat/history/${chatbotId}/${sessionId}`)
+export const getChatHistory = (chatbotId, sessionId, params) =>
+  api.get(`/chat/history/${chatbotId}/${sessionId}`, { params })
 
 // Settings APIs
 export const getApiKeys = () => api.get('/settings/api-keys')
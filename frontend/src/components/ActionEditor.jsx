@@ -25,6 +25,9 @@ const DEFAULT_CONFIGS = {
   NOTIFY: { message: 'Customer needs assistance', recipient: 'manager' },
 }
 
+// Action types that can fire on a keyword match without an LLM call
+const DETERMINISTIC_TYPES = ['SHOW_FORM', 'REDIRECT']
+
 export default function ActionEditor({ chatbotId, actions, onUpdate }) {
   const { t } = useTranslation()
   const [showForm, setShowForm] = useState(false)
@@ -35,6 +38,7 @@ export default function ActionEditor({ chatbotId, actions, onUpdate }) {
     trigger_keywords: '',
     description: '',
     config: DEFAULT_CONFIGS.SHOW_FORM,
+    is_deterministic: false,
   })
 
   const ACTION_TYPES = [
@@ -51,13 +55,19 @@ export default function ActionEditor({ chatbotId, actions, onUpdate }) {
       trigger_keywords: '',
       description: '',
       config: DEFAULT_CONFIGS.SHOW_FORM,
+      is_deterministic: false,
     })
     setShowForm(false)
     setEditingId(null)
   }
 
   const handleTypeChange = (type) => {
-    setForm({ ...form, action_type: type, config: DEFAULT_CONFIGS[type] })
+    setForm({
+      ...form,
+      action_type: type,
+      config: DEFAULT_CONFIGS[type],
+      is_deterministic: DETERMINISTIC_TYPES.includes(type) && form.is_deterministic,
+    })
   }
 
   const handleSave = async () => {
@@ -91,6 +101,7 @@ export default function ActionEditor({ chatbotId, actions, onUpdate }) {
       trigger_keywords: action.trigger_keywords,
       description: action.description,
       config: action.config || DEFAULT_CONFIGS[action.action_type],
+      is_deterministic: !!action.is_deterministic,
     })
     setEditingId(action.id)
     setShowForm(true)
@@ -189,6 +200,18 @@ export default function ActionEditor({ chatbotId, actions, onUpdate }) {
             className="w-full px-3 py-2 border border-gray-300 rounded-lg text-sm focus:ring-2 focus:ring-blue-500"
           />
 
+          {DETERMINISTIC_TYPES.includes(form.action_type) && (
+            <label className="flex items-center gap-2 text-sm text-gray-700">
+              <input
+                type="checkbox"
+                checked={form.is_deterministic}
+                onChange={(e) => setForm({ ...form, is_deterministic: e.target.checked })}
+                className="rounded border-gray-300"
+              />
+              {t('actions.deterministic')}
+            </label>
+          )}
+
           {/* Config editor for SHOW_FORM */}
           {form.action_type === 'SHOW_FORM' && (
             <div className="bg-white p-3 rounded border border-gray-200">
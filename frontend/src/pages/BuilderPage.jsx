@@ -5,7 +5,7 @@ import {
 } from 'lucide-react'
 import {
   listChatbots, createChatbot, getChatbot, updateChatbot, deleteChatbot,
-  uploadDocument, listDocuments, deleteDocument, listActions
+  uploadDocument, getDocumentJob, listDocuments, deleteDocument, listActions
 } from '../api'
 import { useTranslation } from 'react-i18next'
 import LLMSelector from '../components/LLMSelector'
@@ -44,8 +44,15 @@ export default function BuilderPage() {
 
   const fetchChatbots = async () => {
     try {
-      const res = await listChatbots()
-      setChatbots(res.data.data)
+      // The list is paginated; the builder shows every chatbot
+      const all = []
+      let cursor = null
+      do {
+        const res = await listChatbots(cursor ? { cursor, limit: 200 } : { limit: 200 })
+        all.push(...res.data.data)
+        cursor = res.data.next_cursor
+      } while (cursor)
+      setChatbots(all)
     } catch (err) {
       console.error('Failed to fetch chatbots', err)
     }
@@ -127,7 +134,14 @@ export default function BuilderPage() {
     if (!file || !selectedId) return
     setUploading(true)
     try {
-      await uploadDocument(selectedId, file)
+      const res = await uploadDocument(selectedId, file)
+      // Documents are indexed in the background; poll the job until it finishes
+      let job = res.data.data
+      while (job.status !== 'completed' && job.status !== 'failed') {
+        await new Promise((resolve) => setTimeout(resolve, 1000))
+        job = (await getDocumentJob(job.job_id)).data.data
+      }
+      if (job.status === 'failed') throw new Error(job.error)
       fetchChatbotDetail(selectedId)
     } catch (err) {
       alert(t('builder.failedUpload') + (err.response?.data?.detail || err.message))